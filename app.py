@@ -8,6 +8,9 @@ import dash_bootstrap_components as dbc
 
 from components.navbar import create_navbar
 from components.sidebar import create_sidebar
+from services.export import export_blueprint
+from services.export_jobs import jobs_blueprint
+from services.metrics import instrument_app
 
 # Инициализация приложения
 app = Dash(
@@ -24,6 +27,9 @@ app = Dash(
 )
 
 server = app.server
+# Потоковая выгрузка файлов (CSV/XLSX) -- отдельные Flask-маршруты
+server.register_blueprint(export_blueprint)
+server.register_blueprint(jobs_blueprint)
 
 # Глобальный обработчик ошибок -- показываем понятные сообщения
 app.config.suppress_callback_exceptions = True
@@ -202,6 +208,10 @@ def apply_role_checks_page(role):
     return {}, False
 
 
+# Метрики колбэков (/metrics) -- после регистрации всех колбэков, включаются DQT_METRICS=1
+instrument_app(app)
+
+
 if __name__ == "__main__":
     print("\n" + "="*60)
     print("DQT - Data Quality Tool Demo")
@@ -215,4 +225,10 @@ if __name__ == "__main__":
     print("\nRezhim razrabotki s hot reload")
     print("="*60 + "\n")
     
+    # При hot reload код выполняется и в процессе-наблюдателе, и в обслуживающем;
+    # планировщик нужен только в обслуживающем
+    import os
+    if os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        import mock_data
+        mock_data.start_scheduler()
     app.run(debug=True, host="0.0.0.0", port=8050)
@@ -0,0 +1,28 @@
+// Бесконечная прокрутка: кнопка «Показать ещё» (класс dqt-load-more) нажимается,
+// когда доходит до видимой области. Следующая страница запрашивается только после
+// того, как кнопка снова появится, -- запросы не накладываются друг на друга.
+(function () {
+    if (!("IntersectionObserver" in window)) {
+        return;
+    }
+    var observer = new IntersectionObserver(function (entries) {
+        entries.forEach(function (entry) {
+            if (entry.isIntersecting && entry.target.offsetParent !== null && !entry.target.disabled) {
+                entry.target.click();
+            }
+        });
+    }, {rootMargin: "200px"});
+    var observed = new WeakSet();
+
+    function observeButtons() {
+        document.querySelectorAll(".dqt-load-more").forEach(function (button) {
+            if (!observed.has(button)) {
+                observed.add(button);
+                observer.observe(button);
+            }
+        });
+    }
+
+    new MutationObserver(observeButtons).observe(document.documentElement, {childList: true, subtree: true});
+    observeButtons();
+})();
@@ -0,0 +1,230 @@
+"""
+Нагрузочный замер колбэков страниц на мок-данных разного масштаба.
+
+Каждый масштаб (число проверок x дней истории) запускается в отдельном
+процессе: мок-данные генерируются при импорте приложения по переменным
+DQT_MOCK_CHECKS / DQT_MOCK_DAYS / DQT_MOCK_ALERTS / DQT_MOCK_SEED, после
+чего реальные функции колбэков вызываются напрямую с типичными
+сочетаниями фильтров. Для каждого сценария считаются p50/p99 задержки и
+размер ответа в JSON, для процесса -- пиковый RSS и время генерации данных.
+
+Примеры:
+    python benchmarks/bench_callbacks.py --scales 50x30,5000x90 --output baseline.json
+    python benchmarks/bench_callbacks.py --scales 50x30,5000x90 --compare baseline.json
+
+При --compare процесс завершается с кодом 1, если p50 какого-либо
+сценария вырос больше, чем в --threshold раз.
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DEFAULT_SCALES = "50x30,5000x90,50000x365"
+
+
+def _peak_rss_mb():
+    # ru_maxrss -- в килобайтах на Linux и в байтах на macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+# ============================================================
+# Замер в дочернем процессе
+# ============================================================
+def _scenarios():
+    """Сценарии: имя -> функция без аргументов, возвращающая ответ колбэка."""
+    import dash
+    from dash._callback_context import context_value
+    from dash._utils import AttributeDict
+
+    import mock_data
+    from pages import alerts, check_detail, checks, dashboard, results
+
+    def triggered(prop_id, func, *args):
+        def call():
+            context_value.set(AttributeDict(triggered_inputs=[{"prop_id": prop_id, "value": 1}]))
+            return func(*args)
+        return call
+
+    table = mock_data.MOCK_CHECKS["table_name"].iloc[0]
+    check_id = int(mock_data.MOCK_CHECKS["check_id"].iloc[0])
+    query = {"period": "30", "status": "", "domain": "", "schema": "", "table": "", "search": ""}
+    grid_request = {
+        "startRow": 0, "endRow": 100,
+        "sortModel": [{"colId": "rows_failed", "sort": "desc"}],
+        "filterModel": {"check_status_name": {"filterType": "text", "type": "equals", "filter": "FAIL"}},
+    }
+    export_client = dash.get_app().server.test_client()
+
+    def export_stream():
+        return export_client.get("/export/results.csv?period=1").get_data(as_text=True)
+
+    return {
+        "dashboard.update_trend_chart": lambda: dashboard.update_trend_chart(1),
+        "dashboard.update_type_chart": lambda: dashboard.update_type_chart(1),
+        "dashboard.update_domain_chart": lambda: dashboard.update_domain_chart(1),
+        "dashboard.update_recent_runs": lambda: dashboard.update_recent_runs(1),
+        "dashboard.update_health_detail[all]": lambda: dashboard.update_health_detail(None),
+        "dashboard.update_health_detail[table]": lambda: dashboard.update_health_detail(table),
+        "results.update_results[7d]": lambda: results.update_results("7", "", "", "", "", ""),
+        "results.update_results[90d,FAIL,dwh]": lambda: results.update_results("90", "FAIL", "", "dwh", "", ""),
+        "results.update_results[30d,search]": lambda: results.update_results("30", "", "", "", "", "trans"),
+        "results.get_results_rows[sort,filter]": lambda: results.get_results_rows(grid_request, query),
+        "results.export_results[csv]": triggered(
+            "btn-export-csv.n_clicks", results.export_results, 1, None, None, None, "30", "", "", "", "", ""),
+        "export.csv_stream[1d]": export_stream,
+        "checks.update_checks_table[all]": lambda: checks.update_checks_table("", "", "", "", "", "", ""),
+        "checks.update_checks_table[search]": lambda: checks.update_checks_table("f_tr", "", "", "", "", "", ""),
+        "alerts.update_alerts_feed[all]": lambda: alerts.update_alerts_feed("", "", "", "", "", ""),
+        "alerts.update_alerts_feed[search]": lambda: alerts.update_alerts_feed("check", "active", "", "", "", ""),
+        "check_detail.layout": lambda: check_detail.layout(check_id),
+    }
+
+
+def run_worker(repeat):
+    """Замер всех сценариев в текущем процессе (данные уже заданы окружением)."""
+    import numpy as np
+    from plotly.utils import PlotlyJSONEncoder
+
+    sys.path.insert(0, ROOT)
+    os.chdir(ROOT)
+    start = time.perf_counter()
+    import app  # noqa: F401 -- регистрирует страницы и генерирует мок-данные
+    import mock_data
+    build_sec = time.perf_counter() - start
+
+    cases = {}
+    for name, func in _scenarios().items():
+        response = func()  # прогрев: импорты, ленивые структуры
+        timings = []
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            response = func()
+            timings.append(time.perf_counter() - t0)
+        timings_ms = np.array(timings) * 1000
+        cases[name] = {
+            "p50_ms": round(float(np.percentile(timings_ms, 50)), 3),
+            "p99_ms": round(float(np.percentile(timings_ms, 99)), 3),
+            "payload_bytes": len(json.dumps(response, cls=PlotlyJSONEncoder)),
+            "rss_mb": round(_peak_rss_mb(), 1),
+        }
+
+    return {
+        "checks": len(mock_data.MOCK_CHECKS),
+        "results": len(mock_data.RESULTS_STORE),
+        "alerts": len(mock_data.MOCK_ALERTS),
+        "build_sec": round(build_sec, 3),
+        "peak_rss_mb": round(_peak_rss_mb(), 1),
+        "cases": cases,
+    }
+
+
+# ============================================================
+# Запуск масштабов и сравнение с baseline
+# ============================================================
+def run_scale(checks, days, repeat, seed):
+    env = dict(
+        os.environ,
+        DQT_MOCK_CHECKS=str(checks),
+        DQT_MOCK_DAYS=str(days),
+        DQT_MOCK_ALERTS=str(max(30, checks // 2)),
+        DQT_MOCK_SEED=str(seed),
+        # Кэш и фоновые выгрузки исказили бы замер самих колбэков
+        DQT_CACHE_DISABLED="1",
+        DQT_EXPORT_BACKGROUND_ROWS=str(10**12),
+    )
+    proc = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--worker", "--repeat", str(repeat)],
+        env=env, capture_output=True, text=True, cwd=ROOT,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"Масштаб {checks}x{days} завершился с ошибкой:\n{proc.stderr}")
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, cwd=ROOT,
+        ).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def print_report(report, baseline=None, threshold=1.2):
+    """Таблица результатов; при наличии baseline -- отношение p50 и признак регрессии."""
+    regressions = []
+    for scale, data in report["scales"].items():
+        print(f"\n== {scale}: {data['checks']} проверок, {data['results']:,} результатов, "
+              f"{data['alerts']} алертов; данные {data['build_sec']:.2f} с, пик RSS {data['peak_rss_mb']:.0f} МБ")
+        base_cases = ((baseline or {}).get("scales", {}).get(scale) or {}).get("cases", {})
+        print(f"{'сценарий':45} {'p50, мс':>10} {'p99, мс':>10} {'ответ, Б':>11} {'к baseline':>11}")
+        for name, case in data["cases"].items():
+            ratio = ""
+            base = base_cases.get(name)
+            if base and base["p50_ms"] > 0:
+                value = case["p50_ms"] / base["p50_ms"]
+                ratio = f"x{value:.2f}"
+                if value > threshold:
+                    ratio += " !"
+                    regressions.append((scale, name, value))
+            print(f"{name:45} {case['p50_ms']:>10.2f} {case['p99_ms']:>10.2f} {case['payload_bytes']:>11,} {ratio:>11}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scales", default=DEFAULT_SCALES, help="масштабы <проверок>x<дней> через запятую")
+    parser.add_argument("--repeat", type=int, default=5, help="повторов каждого сценария")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="сохранить результат в JSON (baseline)")
+    parser.add_argument("--compare", help="сравнить с сохранённым JSON")
+    parser.add_argument("--threshold", type=float, default=1.2, help="допустимый рост p50 при сравнении")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(run_worker(args.repeat)))
+        return 0
+
+    report = {
+        "meta": {
+            "commit": _git_commit(),
+            "created": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "repeat": args.repeat,
+            "seed": args.seed,
+        },
+        "scales": {},
+    }
+    for scale in args.scales.split(","):
+        checks, days = (int(x) for x in scale.lower().split("x"))
+        report["scales"][scale] = run_scale(checks, days, args.repeat, args.seed)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+    regressions = print_report(report, baseline, args.threshold)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"\nРезультат сохранён в {args.output}")
+    if regressions:
+        print(f"\nРегрессии (p50 выше baseline более чем в {args.threshold} раза): {len(regressions)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,133 @@
+"""
+Замер подбора правил оповещений (services.rules.RuleSet).
+
+Генерируются --rules правил (все проверки / домен / группа / проверка, с
+разными условиями) и --results результатов за день (OK / FAIL / ERROR по
+--checks проверкам). Для каждого результата подбираются правила через
+скомпилированный RuleSet; для сравнения на выборке --naive-sample
+результатов правила перебираются целиком (O(правил) на результат), и
+наборы совпавших правил сверяются. Замеряется также перезагрузка правил:
+изменение одного правила и замена всего набора.
+
+Пример:
+    python benchmarks/bench_rules.py --rules 10000 --results 1000000 --output rules.json
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from services.rules import CONDITION_STATUSES, RuleSet  # noqa: E402
+
+STATUSES = ("OK", "FAIL", "ERROR")
+STATUS_WEIGHTS = (85, 10, 5)
+SCOPE_WEIGHTS = {"all": 1, "domain": 20, "check_type": 30, "check": 49}
+
+
+def _naive_match(rules, status, domain, check_type, check_id):
+    """Перебор всех правил -- как без компиляции."""
+    matched = []
+    for rule in rules:
+        if status not in CONDITION_STATUSES[rule["condition"]]:
+            continue
+        scope, target = rule["scope"], rule.get("target")
+        if (scope == "all" or (scope == "domain" and target == domain)
+                or (scope == "check_type" and target == check_type)
+                or (scope == "check" and target == check_id)):
+            matched.append(rule)
+    return matched
+
+
+def generate(n_rules, n_results, n_checks, n_domains, n_types, seed):
+    rng = random.Random(seed)
+    domains = [f"domain_{i}" for i in range(n_domains)]
+    types = [f"type_{i}" for i in range(n_types)]
+    checks = [(check_id, rng.choice(domains), rng.choice(types)) for check_id in range(1, n_checks + 1)]
+    targets = {
+        "all": lambda: None,
+        "domain": lambda: rng.choice(domains),
+        "check_type": lambda: rng.choice(types),
+        "check": lambda: rng.randint(1, n_checks),
+    }
+    scopes = rng.choices(list(SCOPE_WEIGHTS), weights=list(SCOPE_WEIGHTS.values()), k=n_rules)
+    rules = [
+        {"name": f"rule_{i}", "scope": scope, "target": targets[scope](),
+         "condition": rng.choice(list(CONDITION_STATUSES))}
+        for i, scope in enumerate(scopes)
+    ]
+    statuses = rng.choices(STATUSES, weights=STATUS_WEIGHTS, k=n_results)
+    results = [(status, *checks[rng.randrange(n_checks)][1:], checks[rng.randrange(n_checks)][0])
+               for status in statuses]
+    return rules, results
+
+
+def run(args):
+    t = time.perf_counter()
+    rules, results = generate(args.rules, args.results, args.checks, args.domains, args.types, args.seed)
+    report = {"rules": args.rules, "results": args.results, "generate_sec": round(time.perf_counter() - t, 2)}
+
+    t = time.perf_counter()
+    rule_set = RuleSet(rules)
+    report["compile_ms"] = round((time.perf_counter() - t) * 1000, 1)
+
+    t = time.perf_counter()
+    rule_set.update(1, {**rules[0], "condition": "ERROR"})
+    report["update_one_ms"] = round((time.perf_counter() - t) * 1000, 1)
+    rule_set.replace(rules)
+
+    match = rule_set.match
+    matched = 0
+    t = time.perf_counter()
+    for status, domain, check_type, check_id in results:
+        matched += len(match(status, domain, check_type, check_id))
+    elapsed = time.perf_counter() - t
+    report["match_sec"] = round(elapsed, 3)
+    report["match_us_per_result"] = round(elapsed / len(results) * 1e6, 3)
+    report["matched_per_result"] = round(matched / len(results), 3)
+
+    compiled = list(rule_set)
+    sample = results[:args.naive_sample]
+    t = time.perf_counter()
+    naive = [_naive_match(compiled, *result) for result in sample]
+    elapsed = time.perf_counter() - t
+    report["naive_us_per_result"] = round(elapsed / len(sample) * 1e6, 1)
+    report["naive_sec_extrapolated"] = round(elapsed / len(sample) * len(results), 1)
+    mismatches = sum(
+        sorted(r["rule_id"] for r in match(*result)) != sorted(r["rule_id"] for r in expected)
+        for result, expected in zip(sample, naive)
+    )
+    report["mismatches"] = mismatches
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rules", type=int, default=10000)
+    parser.add_argument("--results", type=int, default=1000000)
+    parser.add_argument("--checks", type=int, default=50000)
+    parser.add_argument("--domains", type=int, default=20)
+    parser.add_argument("--types", type=int, default=30)
+    parser.add_argument("--naive-sample", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="JSON-файл для сохранения результатов")
+    args = parser.parse_args()
+
+    report = run(args)
+    width = max(map(len, report))
+    for key, value in report.items():
+        print(f"{key:<{width}}  {value}")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    if report["mismatches"]:
+        print(f"Расхождения с перебором: {report['mismatches']}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,16 @@
+"""
+Настройки gunicorn (Procfile, render.yaml).
+
+Приложение загружается в master-процессе до fork (preload): мок-данные и
+индексы строятся один раз. Фоновые потоки при fork не копируются, поэтому
+планировщик проверок запускается в worker'е после fork -- ровно в одном
+(блокировка в CheckScheduler.start_as_leader).
+"""
+preload_app = True
+
+
+def post_fork(server, worker):
+    import mock_data
+
+    if mock_data.start_scheduler():
+        server.log.info("Планировщик проверок запущен в worker'е %s", worker.pid)
@@ -1,11 +1,25 @@
 """
 Мок-данные для демо DQT UI
 """
+import os
+import threading
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
 import random
 
+from services.results_store import ResultsStore, OUTPUT_COLUMNS as RESULTS_COLUMNS
+from services.aggregates import ResultsCube
+from services.search_index import TrigramIndex
+from services.indexes import ResultsKeyIndex, FrameKeyIndex, KeyRevisions, KeysetOrder
+from services.lineage import LineageGraph
+from services.impact import ImpactAnalyzer
+from services.executor import CheckExecutor
+from services.alerting import AlertEngine
+from services.scheduler import CheckScheduler
+from services.notifications import NotificationDispatcher, notify_alert_events, parse_recipients
+from services.rules import RuleSet
+
 # Типы проверок
 CHECK_TYPES = [
     {"check_type_id": 1, "check_type_name": "Полнота данных", "description": "Проверка на NULL значения"},
@@ -155,105 +169,228 @@ WHERE amount < 0
     return scripts.get(check_type, f"SELECT * FROM {table} LIMIT 10;")
 
 
-def generate_results(checks_df, days=30):
-    """Генерация истории результатов проверок"""
-    results = []
-    result_id = 1
+# Вероятности статусов результата (порядок как в CHECK_STATUSES)
+RESULT_STATUS_WEIGHTS = [0.75, 0.15, 0.05, 0.05]
+
+
+def iter_results(checks_df, days=30, seed=None, chunk_checks=1000, first_result_id=1):
+    """Генерация истории результатов чанками (векторизованно, без циклов по строкам).
     
-    for _, check in checks_df.iterrows():
-        # Генерируем результаты за последние N дней
-        for day in range(days):
-            run_date = datetime.now() - timedelta(days=day)
-            
-            # Не все проверки запускаются каждый день
-            if check["schedule_main_value"] == "daily" or random.random() > 0.3:
-                status = random.choices(
-                    CHECK_STATUSES, 
-                    weights=[0.75, 0.15, 0.05, 0.05]
-                )[0]
-                
-                execution_time = random.uniform(0.5, 30.0)
-                rows_checked = random.randint(1000, 10000000)
-                rows_failed = 0 if status == "OK" else random.randint(1, int(rows_checked * 0.1))
-                
-                results.append({
-                    "result_id": result_id,
-                    "check_id": check["check_id"],
-                    "check_name": check["check_name"],
-                    "table_name": check["table_name"],
-                    "check_type_name": check["check_type_name"],
-                    "run_date": run_date.date(),
-                    "run_datetime": run_date,
-                    "check_status_name": status,
-                    "execution_time_sec": round(execution_time, 2),
-                    "rows_checked": rows_checked,
-                    "rows_failed": rows_failed,
-                    "error_message": "Connection timeout" if status == "ERROR" else None,
-                    "owner": check["owner"],
-                    "domain": check["domain"],
-                })
-                result_id += 1
+    Каждый чанк -- DataFrame в формате generate_results для chunk_checks проверок,
+    поэтому пиковая память не зависит от общего числа проверок × дней.
+    Дни идут от сегодняшнего назад; проверки с расписанием daily запускаются
+    каждый день, остальные -- с вероятностью 0.7.
+    """
+    rng = np.random.default_rng(seed)
+    now = np.datetime64(datetime.now(), "ns")
+    result_id = first_result_id
     
-    return pd.DataFrame(results)
+    for start in range(0, len(checks_df), chunk_checks):
+        chunk = checks_df.iloc[start:start + chunk_checks]
+        n_checks = len(chunk)
+        
+        # Сетка (проверка × день) и отбор запусков по расписанию
+        check_idx = np.repeat(np.arange(n_checks), days)
+        day = np.tile(np.arange(days), n_checks)
+        is_daily = (chunk["schedule_main_value"].to_numpy() == "daily")[check_idx]
+        runs = is_daily | (rng.random(len(check_idx)) > 0.3)
+        check_idx, day = check_idx[runs], day[runs]
+        n = len(check_idx)
+        
+        status_codes = rng.choice(len(CHECK_STATUSES), size=n, p=RESULT_STATUS_WEIGHTS)
+        rows_checked = rng.integers(1000, 10_000_000, size=n, endpoint=True)
+        failed_upper = (rows_checked * 0.1).astype(np.int64)
+        rows_failed = np.where(status_codes == 0, 0, rng.integers(1, failed_upper, endpoint=True))
+        run_datetime = now - day.astype("timedelta64[D]").astype("timedelta64[ns]")
+        
+        def dim(column):
+            # Атрибут проверки -> категория без копирования строк на каждый запуск
+            codes, uniques = pd.factorize(chunk[column])
+            return pd.Categorical.from_codes(codes[check_idx], uniques)
+        
+        yield pd.DataFrame({
+            "result_id": np.arange(result_id, result_id + n, dtype=np.int64),
+            "check_id": chunk["check_id"].to_numpy()[check_idx],
+            "check_name": dim("check_name"),
+            "table_name": dim("table_name"),
+            "check_type_name": dim("check_type_name"),
+            "run_date": run_datetime.astype("datetime64[D]").astype("datetime64[ns]"),
+            "run_datetime": run_datetime,
+            "check_status_name": pd.Categorical.from_codes(status_codes, CHECK_STATUSES),
+            "execution_time_sec": np.round(rng.uniform(0.5, 30.0, size=n), 2),
+            "rows_checked": rows_checked,
+            "rows_failed": rows_failed,
+            "error_message": np.where(status_codes == CHECK_STATUSES.index("ERROR"), "Connection timeout", None),
+            "owner": dim("owner"),
+            "domain": dim("domain"),
+        })
+        result_id += n
+
+
+def generate_results(checks_df, days=30, seed=None):
+    """Генерация истории результатов проверок"""
+    chunks = list(iter_results(checks_df, days=days, seed=seed))
+    if not chunks:
+        return pd.DataFrame(columns=list(RESULTS_COLUMNS))
+    return pd.concat(chunks, ignore_index=True)
 
 
-def get_dashboard_stats(results_df, days=7):
+def build_results_store(checks_df, days=30, seed=None, chunk_checks=1000):
+    """Заполнение хранилища результатов чанками без промежуточного полного DataFrame."""
+    store = ResultsStore(categories=RESULTS_CATEGORIES)
+    for chunk in iter_results(checks_df, days=days, seed=seed, chunk_checks=chunk_checks):
+        store.append(chunk)
+    return store
+
+
+def get_dashboard_stats(cube, days=7):
     """Статистика для дашборда"""
-    recent = results_df[results_df["run_date"] >= (datetime.now() - timedelta(days=days)).date()]
-    
-    total = len(recent)
-    failed = len(recent[recent["check_status_name"] == "FAIL"])
-    errors = len(recent[recent["check_status_name"] == "ERROR"])
-    success = len(recent[recent["check_status_name"] == "OK"])
+    totals = cube.totals(period_days=days)
+    by_status = totals["by_status"]
+    total = totals["total"]
+    success = by_status.get("OK", 0)
+    tables = cube.counts(["table_name"], period_days=days)
     
     return {
         "total_runs": total,
-        "failed_runs": failed,
-        "error_runs": errors,
+        "failed_runs": by_status.get("FAIL", 0),
+        "error_runs": by_status.get("ERROR", 0),
         "success_rate": round(success / total * 100, 1) if total > 0 else 0,
-        "unique_checks": recent["check_id"].nunique(),
-        "unique_tables": recent["table_name"].nunique(),
+        "unique_checks": len(cube.latest_positions(since_days=days)),
+        "unique_tables": int((tables["count"] > 0).sum()),
     }
 
 
-def get_trend_data(results_df, days=30):
+def get_trend_data(cube, days=30):
     """Данные для графика тренда"""
-    recent = results_df[results_df["run_date"] >= (datetime.now() - timedelta(days=days)).date()]
-    
-    trend = recent.groupby(["run_date", "check_status_name"]).size().reset_index(name="count")
-    return trend
+    return cube.counts(["run_date", "check_status_name"], period_days=days)
 
 
-def get_checks_by_domain(results_df):
+def get_checks_by_domain(cube):
     """Проверки по доменам"""
-    return results_df.groupby(["domain", "check_status_name"]).size().reset_index(name="count")
+    return cube.counts(["domain", "check_status_name"])
 
 
-def get_checks_by_type(results_df):
+def get_checks_by_type(cube):
     """Проверки по типам"""
-    return results_df.groupby(["check_type_name", "check_status_name"]).size().reset_index(name="count")
+    return cube.counts(["check_type_name", "check_status_name"])
 
 
+# Фиксированные словари измерений хранилища результатов
+RESULTS_CATEGORIES = {
+    "check_status_name": CHECK_STATUSES,
+    "domain": DOMAINS,
+    "owner": OWNERS,
+    "table_name": TABLES,
+    "check_type_name": [ct["check_type_name"] for ct in CHECK_TYPES],
+}
+
+# Масштаб мок-данных (переопределяется для нагрузочных замеров, см. benchmarks/)
+MOCK_N_CHECKS = int(os.environ.get("DQT_MOCK_CHECKS", 50))
+MOCK_DAYS = int(os.environ.get("DQT_MOCK_DAYS", 30))
+MOCK_N_ALERTS = int(os.environ.get("DQT_MOCK_ALERTS", 100))
+MOCK_SEED = int(os.environ["DQT_MOCK_SEED"]) if os.environ.get("DQT_MOCK_SEED") else None
+if MOCK_SEED is not None:
+    random.seed(MOCK_SEED)
+
 # Инициализация мок-данных при импорте
-MOCK_CHECKS = generate_checks(50)
-MOCK_RESULTS = generate_results(MOCK_CHECKS, days=30)
+MOCK_CHECKS = generate_checks(MOCK_N_CHECKS)
+RESULTS_STORE = build_results_store(MOCK_CHECKS, days=MOCK_DAYS, seed=MOCK_SEED)
+RESULTS_CUBE = ResultsCube(RESULTS_STORE)
+# Поиск по названию проверки и таблице (общий для /checks и /results)
+CHECK_SEARCH_FIELDS = ["check_name", "table_name"]
+CHECKS_SEARCH = TrigramIndex.from_frame(MOCK_CHECKS, "check_id", CHECK_SEARCH_FIELDS)
+# Индексы по check_id для страницы проверки
+CHECKS_BY_ID = FrameKeyIndex(MOCK_CHECKS, "check_id")
+RESULTS_BY_CHECK = ResultsKeyIndex(RESULTS_STORE, "check_id")
 MOCK_CHECK_TYPES = pd.DataFrame(CHECK_TYPES)
 
 
 def get_check_by_id(check_id: int):
     """Получить проверку по ID"""
-    check = MOCK_CHECKS[MOCK_CHECKS["check_id"] == check_id]
-    if check.empty:
-        return None
-    return check.iloc[0].to_dict()
+    return CHECKS_BY_ID.first(check_id)
 
 
 def get_check_results(check_id: int, limit: int = 20):
     """Получить историю результатов проверки"""
-    results = MOCK_RESULTS[MOCK_RESULTS["check_id"] == check_id].sort_values(
-        "run_datetime", ascending=False
-    ).head(limit)
-    return results
+    return RESULTS_STORE.take(RESULTS_BY_CHECK.newest(check_id, limit))
+
+
+# Ревизии каталога проверок: какие check_id менялись (для дельта-обновлений таблицы)
+CHECKS_REVISIONS = KeyRevisions()
+# Запись в MOCK_CHECKS: колбэки и потоки исполнителя (record_check_runs) пишут по очереди
+CHECKS_LOCK = threading.Lock()
+
+
+def set_checks_active(check_ids, active: bool):
+    """Включение/выключение проверок. Возвращает check_id фактически изменённых."""
+    with CHECKS_LOCK:
+        mask = MOCK_CHECKS["check_id"].isin(check_ids) & (MOCK_CHECKS["is_active"] != active)
+        changed = MOCK_CHECKS.loc[mask, "check_id"].tolist()
+        if changed:
+            MOCK_CHECKS.loc[mask, "is_active"] = active
+            CHECKS_REVISIONS.touch(changed)
+    return changed
+
+
+# Поля каталога, которые меняет форма редактирования проверки
+EDITABLE_CHECK_FIELDS = ("check_name", "schedule_main_value", "priority", "owner", "threshold", "description",
+                         "sql_script")
+
+
+def _reindex_checks(check_ids):
+    """Поиск по проверкам после изменения каталога: документы пересобираются, удалённые -- убираются."""
+    rows = MOCK_CHECKS[MOCK_CHECKS["check_id"].isin(check_ids)]
+    CHECKS_SEARCH.update_frame(rows, "check_id", CHECK_SEARCH_FIELDS)
+    for check_id in set(check_ids) - set(rows["check_id"].tolist()):
+        CHECKS_SEARCH.remove(check_id)
+
+
+def update_check(check_id, **fields):
+    """Сохранение полей проверки из формы редактирования. Возвращает True, если проверка найдена."""
+    with CHECKS_LOCK:
+        mask = MOCK_CHECKS["check_id"] == check_id
+        if not mask.any():
+            return False
+        for field, value in fields.items():
+            if field in EDITABLE_CHECK_FIELDS and value is not None:
+                MOCK_CHECKS.loc[mask, field] = value
+        _reindex_checks([check_id])
+        CHECKS_REVISIONS.touch([check_id])
+    return True
+
+
+def record_check_runs(results_df):
+    """Обновление last_status / last_run проверок по свежим результатам выполнения."""
+    latest = results_df.sort_values("run_datetime").drop_duplicates("check_id", keep="last").set_index("check_id")
+    with CHECKS_LOCK:
+        mask = MOCK_CHECKS["check_id"].isin(latest.index)
+        ids = MOCK_CHECKS.loc[mask, "check_id"]
+        MOCK_CHECKS.loc[mask, "last_status"] = latest.loc[ids, "check_status_name"].astype(str).to_numpy()
+        MOCK_CHECKS.loc[mask, "last_run"] = latest.loc[ids, "run_datetime"].to_numpy()
+        CHECKS_REVISIONS.touch(ids.tolist())
+
+
+# Выполнение проверок (кнопки «Запустить» и массовый запуск)
+CHECK_EXECUTOR = CheckExecutor(RESULTS_STORE, on_results=record_check_runs)
+
+# Запуск проверок по расписанию; фоновый поток -- start_scheduler() после fork
+CHECK_SCHEDULER = CheckScheduler(
+    CHECK_EXECUTOR, get_check_by_id, revisions=CHECKS_REVISIONS,
+    max_in_flight=int(os.environ.get("DQT_SCHEDULER_MAX_IN_FLIGHT", 0)) or None,
+)
+CHECK_SCHEDULER.load(MOCK_CHECKS)
+
+
+def start_scheduler():
+    """Фоновый планировщик в текущем процессе (DQT_SCHEDULER=1, один процесс на машину).
+
+    Вызывается из хука post_fork gunicorn и при запуске dev-сервера, не при импорте:
+    поток, запущенный в master-процессе до fork, в worker'ы не попадает.
+    """
+    if os.environ.get("DQT_SCHEDULER") == "1":
+        return CHECK_SCHEDULER.start_as_leader()
+    return False
 
 
 # Каналы оповещений
@@ -263,87 +400,132 @@ ALERT_CHANNELS = ["telegram", "email"]
 ALERT_STATUSES = ["active", "acknowledged", "resolved"]
 
 
-def generate_alerts(results_df, n=30):
-    """Генерация списка алертов на основе FAIL/ERROR результатов"""
-    alerts = []
-    
-    # Берём только FAIL и ERROR результаты
-    failed_results = results_df[
-        results_df["check_status_name"].isin(["FAIL", "ERROR"])
-    ].sort_values("run_datetime", ascending=False).head(n)
-    
-    alert_id = 1
-    for _, result in failed_results.iterrows():
-        severity = "critical" if result["check_status_name"] == "FAIL" else "warning"
-        status = random.choices(
-            ALERT_STATUSES,
-            weights=[0.5, 0.3, 0.2]
-        )[0]
-        
-        channel = random.choice(ALERT_CHANNELS)
-        acknowledged_by = random.choice(OWNERS) if status != "active" else None
-        resolved_at = result["run_datetime"] + timedelta(hours=random.randint(1, 24)) if status == "resolved" else None
-        
-        alerts.append({
-            "alert_id": alert_id,
-            "check_id": result["check_id"],
-            "check_name": result["check_name"],
-            "table_name": result["table_name"],
-            "domain": result["domain"],
-            "check_status": result["check_status_name"],
-            "severity": severity,
-            "status": status,
-            "channel": channel,
-            "message": f"Проверка {result['check_name']} завершилась со статусом {result['check_status_name']}",
-            "created_at": result["run_datetime"],
-            "acknowledged_by": acknowledged_by,
-            "acknowledged_at": result["run_datetime"] + timedelta(minutes=random.randint(5, 120)) if acknowledged_by else None,
-            "resolved_at": resolved_at,
-            "owner": result["owner"],
-        })
-        alert_id += 1
-    
-    return pd.DataFrame(alerts)
+def generate_alerts(engine, n=30, seed=None):
+    """Лента алертов: n последних по времени открытия инцидентов движка, часть активных -- принята."""
+    rng = np.random.default_rng(seed)
+    alerts = engine.frame().nlargest(n, "created_at").sort_values("alert_id", ignore_index=True)
+    # Для демо: часть активных инцидентов уже принята в работу
+    active = alerts.index[(alerts["status"] == "active").to_numpy() & (rng.random(len(alerts)) < 0.4)]
+    for i in active:
+        user = rng.choice(OWNERS)
+        at = alerts.at[i, "last_seen"] + pd.Timedelta(minutes=int(rng.integers(5, 120, endpoint=True)))
+        engine.acknowledge(int(alerts.at[i, "alert_id"]), user, at)
+        alerts.loc[i, ["status", "acknowledged_by", "acknowledged_at"]] = ["acknowledged", user, at]
+    alerts["channel"] = rng.choice(ALERT_CHANNELS, size=len(alerts))
+    return alerts
+
+
+# Алерты -- инциденты по проверкам: повторные падения и «дребезг» OK/FAIL
+# обновляют счётчики открытого инцидента, а не добавляют строки
+ALERT_ENGINE = AlertEngine()
+ALERT_ENGINE.attach(RESULTS_STORE)
+
+# Правила оповещений (диалог «Создать правило») и отправка по ним. Подписка --
+# после attach: по истории результатов оповещения не отправляются
+ALERT_RULES = RuleSet()
+NOTIFIER = NotificationDispatcher.from_env()
+
+
+def add_alert_rule(name, condition, scope, target, channel, recipients, subject, body):
+    """Сохранение правила оповещений (сразу действует на новые алерты). Возвращает правило."""
+    rule = {
+        "name": name,
+        "condition": condition or "FAIL_OR_ERROR",
+        "scope": scope or "all",
+        "target": target,
+        "channel": channel,
+        "recipients": parse_recipients(recipients, channel),
+        "subject": subject or "[DQT] {status}: {check_name}",
+        "body": body or "Проверка {check_name} ({table_name}) завершилась со статусом {status} в {run_time}.",
+    }
+    rule["rule_id"] = ALERT_RULES.add(rule)
+    return rule
 
 
+ALERT_ENGINE.subscribe(lambda events: notify_alert_events(NOTIFIER, ALERT_RULES, events, get_check_by_id))
+
 # Инициализация мок-алертов
-MOCK_ALERTS = generate_alerts(MOCK_RESULTS, n=30)
+MOCK_ALERTS = generate_alerts(ALERT_ENGINE, n=MOCK_N_ALERTS, seed=MOCK_SEED)
+
+# Варианты комментариев к инцидентам
+INCIDENT_COMMENTS = [
+    "Проблема воспроизведена, анализирую",
+    "Связано с обновлением ETL-пайплайна",
+    "Исправлено, ждём следующий запуск",
+    "Ложное срабатывание, нужно скорректировать threshold",
+    "Передано команде DWH",
+]
+
 
 # Добавляем поля инцидентов к алертам
-def enrich_alerts_with_incidents(alerts_df):
+def enrich_alerts_with_incidents(alerts_df, seed=None):
     """Обогащение алертов данными об инцидентах (трекер, комментарии)."""
+    rng = np.random.default_rng(seed)
     alerts_df = alerts_df.copy()
-    tracker_tasks = []
-    comments_list = []
-    for _, row in alerts_df.iterrows():
-        has_task = random.random() > 0.5
-        tracker_tasks.append({
-            "has_task": has_task,
-            "task_id": f"DQ-{random.randint(100, 999)}" if has_task else None,
-            "task_url": f"https://tracker.example.com/DQ-{random.randint(100, 999)}" if has_task else None,
-        })
-        n_comments = random.randint(0, 3) if row["status"] != "active" else 0
-        comments = []
-        for c in range(n_comments):
-            comments.append({
-                "author": random.choice(OWNERS),
-                "text": random.choice([
-                    "Проблема воспроизведена, анализирую",
-                    "Связано с обновлением ETL-пайплайна",
-                    "Исправлено, ждём следующий запуск",
-                    "Ложное срабатывание, нужно скорректировать threshold",
-                    "Передано команде DWH",
-                ]),
-                "created_at": (row["created_at"] + timedelta(minutes=random.randint(10, 300))).strftime("%d.%m.%Y %H:%M"),
-            })
-        comments_list.append(comments)
-    alerts_df["tracker_task_id"] = [t["task_id"] for t in tracker_tasks]
-    alerts_df["tracker_task_url"] = [t["task_url"] for t in tracker_tasks]
-    alerts_df["has_tracker_task"] = [t["has_task"] for t in tracker_tasks]
-    alerts_df["comments"] = comments_list
+    count = len(alerts_df)
+    
+    has_task = rng.random(count) > 0.5
+    task_numbers = pd.Series(rng.integers(100, 999, size=count, endpoint=True)).astype(str).to_numpy()
+    alerts_df["tracker_task_id"] = pd.Series(np.where(has_task, "DQ-" + task_numbers, None), dtype=object, index=alerts_df.index)
+    alerts_df["tracker_task_url"] = pd.Series(np.where(has_task, "https://tracker.example.com/DQ-" + task_numbers, None), dtype=object, index=alerts_df.index)
+    alerts_df["has_tracker_task"] = has_task
+    
+    # Комментарии: сначала все поля одним массивом, затем раскладываем по алертам
+    n_comments = np.where(
+        alerts_df["status"].to_numpy() != "active", rng.integers(0, 3, size=count, endpoint=True), 0
+    )
+    total = int(n_comments.sum())
+    authors = rng.choice(OWNERS, size=total)
+    texts = rng.choice(INCIDENT_COMMENTS, size=total)
+    created = (
+        pd.Series(np.repeat(alerts_df["created_at"].to_numpy(), n_comments))
+        + pd.to_timedelta(rng.integers(10, 300, size=total, endpoint=True), unit="m")
+    ).dt.strftime("%d.%m.%Y %H:%M").to_numpy()
+    comments = [
+        {"author": a, "text": t, "created_at": c} for a, t, c in zip(authors, texts, created)
+    ]
+    offsets = np.cumsum(n_comments)[:-1] if count else []
+    alerts_df["comments"] = [list(part) for part in np.split(np.array(comments, dtype=object), offsets)] if count else []
     return alerts_df
 
-MOCK_ALERTS = enrich_alerts_with_incidents(MOCK_ALERTS)
+MOCK_ALERTS = enrich_alerts_with_incidents(MOCK_ALERTS, seed=MOCK_SEED)
+
+# Измерения алертов храним как категории: фильтры сравнивают коды, а не строки
+ALERT_DIMENSIONS = ["check_name", "table_name", "domain", "check_status", "severity", "status", "channel", "owner"]
+MOCK_ALERTS = MOCK_ALERTS.astype({col: "category" for col in ALERT_DIMENSIONS})
+# Поиск алертов по проверке и таблице (текст сообщения -- шаблонный, «fail» нашёл бы почти всё)
+ALERT_SEARCH_FIELDS = ["check_name", "table_name"]
+ALERTS_SEARCH = TrigramIndex.from_frame(MOCK_ALERTS, "alert_id", ALERT_SEARCH_FIELDS)
+# Лента алертов: новые сверху, постраничная выдача по курсору (created_at, alert_id)
+ALERTS_FEED = KeysetOrder(MOCK_ALERTS, "created_at", "alert_id")
+_ALERTS_LOCK = threading.Lock()
+
+
+def refresh_alerts(events):
+    """Лента по событиям движка: новые инциденты добавляются, изменённые заменяются.
+
+    Поля, которых нет у движка (канал, задача в трекере, комментарии), у
+    изменённых алертов сохраняются, у новых -- пустые.
+    """
+    global MOCK_ALERTS
+    ids = list(dict.fromkeys(int(incident["alert_id"]) for _, incident in events))
+    rows = ALERT_ENGINE.frame(ids)
+    with _ALERTS_LOCK:
+        extra = MOCK_ALERTS.set_index("alert_id")[ALERT_EXTRA_COLUMNS]
+        rows = rows.join(extra, on="alert_id")
+        new = rows["comments"].isna().to_numpy()
+        rows["has_tracker_task"] = rows["has_tracker_task"].fillna(False).astype(bool)
+        rows["comments"] = [[] if is_new else c for is_new, c in zip(new, rows["comments"].tolist())]
+        kept = MOCK_ALERTS[~MOCK_ALERTS["alert_id"].isin(ids)].astype({col: object for col in ALERT_DIMENSIONS})
+        alerts = pd.concat([kept, rows], ignore_index=True).astype({col: "category" for col in ALERT_DIMENSIONS})
+        MOCK_ALERTS = alerts
+        ALERTS_FEED.rebuild(alerts)
+        ALERTS_SEARCH.update_frame(rows, "alert_id", ALERT_SEARCH_FIELDS)
+
+
+# Колонки ленты, которых нет у инцидентов движка
+ALERT_EXTRA_COLUMNS = [col for col in MOCK_ALERTS.columns if col not in ALERT_ENGINE.frame([]).columns]
+ALERT_ENGINE.subscribe(refresh_alerts)
 
 
 def get_active_alerts():
@@ -355,16 +537,20 @@ def get_active_alerts():
 
 def get_alerts_count_by_status():
     """Статистика алертов по статусам"""
-    return MOCK_ALERTS.groupby("status").size().to_dict()
+    return MOCK_ALERTS.groupby("status", observed=True).size().to_dict()
+
+
+def get_alerts_count_by_severity():
+    """Статистика алертов по критичности"""
+    return MOCK_ALERTS.groupby("severity", observed=True).size().to_dict()
 
 
 # ============================================================
 # История версий проверок
 # ============================================================
-def generate_check_versions(checks_df):
+def generate_check_versions(checks_df, seed=None):
     """Генерация истории версий для каждой проверки."""
-    versions = []
-    version_id = 1
+    rng = np.random.default_rng(seed)
     change_types = [
         "Создание проверки",
         "Изменение SQL-скрипта",
@@ -373,39 +559,45 @@ def generate_check_versions(checks_df):
         "Изменение владельца",
         "Изменение приоритета",
     ]
-    for _, check in checks_df.iterrows():
-        n_versions = random.randint(1, 5)
-        base_date = check["created_at"]
-        for v in range(1, n_versions + 1):
-            change_date = base_date + timedelta(days=random.randint(0, 30) * v)
-            ct = "Создание проверки" if v == 1 else random.choice(change_types[1:])
-            versions.append({
-                "version_id": version_id,
-                "check_id": check["check_id"],
-                "version": v,
-                "change_type": ct,
-                "changed_by": check["owner"] if v == 1 else random.choice(OWNERS),
-                "changed_at": change_date,
-                "sql_script": check["sql_script"] if v == n_versions else check["sql_script"].replace(
-                    "CURRENT_DATE - 1", f"CURRENT_DATE - {random.randint(1, 7)}"
-                ),
-                "threshold": check["threshold"] if v == n_versions else random.choice([0, 0.01, 0.05]),
-                "schedule": check["schedule_main_value"],
-                "is_current": v == n_versions,
-            })
-            version_id += 1
-    return pd.DataFrame(versions)
-
-
-MOCK_CHECK_VERSIONS = generate_check_versions(MOCK_CHECKS)
+    # Каждая проверка -> n_versions строк; version -- номер внутри проверки
+    n_versions = rng.integers(1, 5, size=len(checks_df), endpoint=True)
+    check_idx = np.repeat(np.arange(len(checks_df)), n_versions)
+    version = np.arange(len(check_idx)) - np.repeat(np.cumsum(n_versions) - n_versions, n_versions) + 1
+    is_first = version == 1
+    is_current = version == n_versions[check_idx]
+    count = len(check_idx)
+    
+    checks = checks_df.iloc[check_idx].reset_index(drop=True)
+    change_date = checks["created_at"] + pd.to_timedelta(rng.integers(0, 30, size=count, endpoint=True) * version, unit="D")
+    
+    # Старые версии SQL отличаются сдвигом даты загрузки
+    sql_script = checks["sql_script"].copy()
+    lag = rng.integers(1, 7, size=count, endpoint=True)
+    for days in np.unique(lag[~is_current]):
+        rows = (~is_current) & (lag == days)
+        sql_script[rows] = sql_script[rows].str.replace("CURRENT_DATE - 1", f"CURRENT_DATE - {days}", regex=False)
+    
+    return pd.DataFrame({
+        "version_id": np.arange(1, count + 1),
+        "check_id": checks["check_id"],
+        "version": version,
+        "change_type": np.where(is_first, change_types[0], rng.choice(change_types[1:], size=count)),
+        "changed_by": np.where(is_first, checks["owner"], rng.choice(OWNERS, size=count)),
+        "changed_at": change_date,
+        "sql_script": sql_script,
+        "threshold": np.where(is_current, checks["threshold"], rng.choice([0, 0.01, 0.05], size=count)),
+        "schedule": checks["schedule_main_value"],
+        "is_current": is_current,
+    })
+
+
+MOCK_CHECK_VERSIONS = generate_check_versions(MOCK_CHECKS, seed=MOCK_SEED)
+VERSIONS_BY_CHECK = FrameKeyIndex(MOCK_CHECK_VERSIONS, "check_id", sort_by="version", ascending=False)
 
 
 def get_check_versions(check_id: int):
     """Получить историю версий проверки."""
-    versions = MOCK_CHECK_VERSIONS[MOCK_CHECK_VERSIONS["check_id"] == check_id].sort_values(
-        "version", ascending=False
-    )
-    return versions
+    return VERSIONS_BY_CHECK.rows(check_id)
 
 
 # ============================================================
@@ -463,50 +655,18 @@ LINEAGE_GRAPH = {
 }
 
 
-def get_lineage(table_name: str):
-    """Получить lineage для таблицы в формате Cytoscape."""
-    nodes = set()
-    edges = []
-
-    info = LINEAGE_GRAPH.get(table_name, {"sources": [], "targets": []})
-
-    # Центральный узел
-    nodes.add(table_name)
-
-    # Источники
-    for src in info.get("sources", []):
-        nodes.add(src)
-        edges.append({"source": src, "target": table_name})
-        # Второй уровень
-        src_info = LINEAGE_GRAPH.get(src, {})
-        for src2 in src_info.get("sources", []):
-            nodes.add(src2)
-            edges.append({"source": src2, "target": src})
-
-    # Потребители
-    for tgt in info.get("targets", []):
-        nodes.add(tgt)
-        edges.append({"source": table_name, "target": tgt})
-        tgt_info = LINEAGE_GRAPH.get(tgt, {})
-        for tgt2 in tgt_info.get("targets", []):
-            nodes.add(tgt2)
-            edges.append({"source": tgt, "target": tgt2})
-
-    # Формат Cytoscape
-    cyto_elements = []
-    for node in nodes:
-        layer = "source"
-        if node == table_name:
-            layer = "center"
-        elif node in info.get("targets", []):
-            layer = "target"
-        elif any(node in LINEAGE_GRAPH.get(t, {}).get("targets", []) for t in info.get("targets", [])):
-            layer = "target"
-        cyto_elements.append({"data": {"id": node, "label": node.split(".")[-1], "full_name": node, "layer": layer}})
-    for edge in edges:
-        cyto_elements.append({"data": {"source": edge["source"], "target": edge["target"]}})
-
-    return cyto_elements
+LINEAGE = LineageGraph.from_mapping(LINEAGE_GRAPH)
+
+# Таблицы под риском: потребители таблиц с падающими проверками
+IMPACT = ImpactAnalyzer(RESULTS_STORE, RESULTS_CUBE, LINEAGE)
+
+# Глубина lineage по умолчанию (шагов в каждую сторону)
+LINEAGE_DEPTH = 2
+
+
+def get_lineage(table_name: str, depth=LINEAGE_DEPTH):
+    """Получить lineage для таблицы в формате Cytoscape (depth=None -- без ограничения)."""
+    return LINEAGE.cytoscape(table_name, upstream_depth=depth, downstream_depth=depth)
 
 
 # ============================================================
@@ -2,14 +2,23 @@
 Страница алертов и уведомлений
 """
 import dash
-from dash import html, dcc, callback, Input, Output, State, ctx
+from dash import html, dcc, callback, Input, Output, State, ctx, Patch
 import dash_bootstrap_components as dbc
 import dash_ag_grid as dag
+import numpy as np
 from datetime import datetime, timedelta
-from mock_data import MOCK_ALERTS, MOCK_CHECKS, DOMAINS, OWNERS, SCHEMAS, TABLES_BY_SCHEMA, get_alerts_count_by_status
+from mock_data import (
+    ALERTS_SEARCH, ALERTS_FEED, MOCK_CHECKS, DOMAINS, OWNERS, SCHEMAS, TABLES_BY_SCHEMA,
+    NOTIFIER, add_alert_rule, get_alerts_count_by_status, get_alerts_count_by_severity,
+)
+from services.notifications import parse_recipients
+from services.templates import TemplateError, compile_template
 
 dash.register_page(__name__, path="/alerts", name="Алерты")
 
+# Алертов на странице ленты (следующие подгружаются при прокрутке)
+ALERTS_PAGE_SIZE = 20
+
 
 def create_alert_card(severity, count, title, icon):
     """Создание карточки статистики алертов"""
@@ -34,6 +43,7 @@ def create_alert_card(severity, count, title, icon):
 
 def layout():
     stats = get_alerts_count_by_status()
+    severities = get_alerts_count_by_severity()
     
     return dbc.Container([
         # Заголовок
@@ -55,7 +65,7 @@ def layout():
             dbc.Col(create_alert_card("active", stats.get("active", 0), "Активных алертов", "fa-bell"), width=3),
             dbc.Col(create_alert_card("acknowledged", stats.get("acknowledged", 0), "На рассмотрении", "fa-eye"), width=3),
             dbc.Col(create_alert_card("resolved", stats.get("resolved", 0), "Решено", "fa-check-circle"), width=3),
-            dbc.Col(create_alert_card("critical", len(MOCK_ALERTS[MOCK_ALERTS["severity"] == "critical"]), "Критических", "fa-exclamation-circle"), width=3),
+            dbc.Col(create_alert_card("critical", severities.get("critical", 0), "Критических", "fa-exclamation-circle"), width=3),
         ], className="mb-4 g-3"),
         
         # Фильтры
@@ -110,8 +120,14 @@ def layout():
         # Статистика
         dbc.Row([dbc.Col([html.Span(id="alerts-count", className="text-muted")])], className="mb-2"),
         
-        # Лента алертов
+        # Лента алертов: первая страница, следующие -- по курсору при прокрутке
         html.Div(id="alerts-feed"),
+        html.Div(
+            dbc.Button("Показать ещё", id="btn-load-more-alerts", color="outline-secondary", size="sm",
+                       className="dqt-load-more"),
+            id="alerts-load-more", className="text-center my-3", style={"display": "none"},
+        ),
+        dcc.Store(id="alerts-feed-cursor"),
         
         # Модальное окно создания правила (расширенное)
         dbc.Modal([
@@ -292,6 +308,12 @@ def create_alert_item(alert):
                         html.I(className=f"{channel_icons.get(alert['channel'], '')} me-2 text-muted"),
                         html.A(html.Strong(alert["check_name"]),
                                href=f"/check/{alert['check_id']}", className="text-decoration-none"),
+                        # Повторные падения и «дребезг» копятся в одном инциденте
+                        dbc.Badge(f"×{alert['occurrences']}", color="light", text_color="dark", className="ms-2",
+                                  title="Падений в инциденте") if alert.get("occurrences", 1) > 1 else None,
+                        dbc.Badge([html.I(className="fas fa-wave-square me-1"), "Нестабильна"], color="secondary",
+                                  className="ms-2", title="Статус проверки часто переключается между OK и FAIL")
+                        if alert.get("flapping") else None,
                     ]),
                     html.P(alert["message"], className="text-muted mb-1 small"),
                     html.Div([
@@ -311,6 +333,9 @@ def create_alert_item(alert):
                 dbc.Col([
                     html.Div([
                         html.Small(alert["created_at"].strftime("%d.%m.%Y %H:%M"), className="text-muted d-block"),
+                        html.Small(f"Последнее: {alert['last_seen'].strftime('%d.%m.%Y %H:%M')}",
+                                   className="text-muted d-block")
+                        if alert.get("occurrences", 1) > 1 else None,
                         html.Small(f"Принял: {alert['acknowledged_by']}", className="text-info d-block")
                         if alert['acknowledged_by'] else None,
                         # Бейдж задачи в трекере
@@ -387,23 +412,24 @@ def update_rule_target_by_scope(scope):
 def update_template_preview(subject, body):
     # Показываем пример с подставленными значениями
     example_values = {
-        "{check_name}": "check_f_transactions_пол_12",
-        "{table_name}": "dwh.f_transactions",
-        "{status}": "FAIL",
-        "{run_time}": "2026-02-11 14:30",
-        "{rows_checked}": "1,500,000",
-        "{rows_failed}": "2,340",
-        "{domain}": "Транзакции",
-        "{owner}": "ivanov_a",
-        "{error_message}": "",
-        "{threshold}": "0.05%",
+        "check_name": "check_f_transactions_пол_12",
+        "table_name": "dwh.f_transactions",
+        "status": "FAIL",
+        "run_time": "2026-02-11 14:30",
+        "rows_checked": "1,500,000",
+        "rows_failed": "2,340",
+        "domain": "Транзакции",
+        "owner": "ivanov_a",
+        "error_message": "",
+        "threshold": "0.05%",
     }
     
-    preview_subject = subject or ""
-    preview_body = body or ""
-    for key, val in example_values.items():
-        preview_subject = preview_subject.replace(key, val)
-        preview_body = preview_body.replace(key, val)
+    # Тот же скомпилированный шаблон, что и при отправке
+    try:
+        preview_subject = compile_template(subject).render(example_values)
+        preview_body = compile_template(body).render(example_values)
+    except TemplateError as e:
+        return html.Span(str(e), className="text-danger")
     
     return html.Div([
         html.Strong(f"Тема: {preview_subject}"),
@@ -412,9 +438,39 @@ def update_template_preview(subject, body):
     ])
 
 
+def _filter_alerts(frame, search, status, severity, domain, schema, table):
+    """Маска строк frame ленты по фильтрам страницы."""
+    mask = np.ones(len(frame), dtype=bool)
+    if search:
+        mask &= frame["alert_id"].isin(ALERTS_SEARCH.search(search)).to_numpy()
+    if status:
+        mask &= (frame["status"] == status).to_numpy()
+    if severity:
+        mask &= (frame["severity"] == severity).to_numpy()
+    if domain:
+        mask &= (frame["domain"] == domain).to_numpy()
+    if schema and table:
+        mask &= (frame["table_name"] == f"{schema}.{table}").to_numpy()
+    elif schema:
+        mask &= frame["table_name"].astype(str).str.startswith(f"{schema}.").to_numpy()
+    return mask
+
+
+def _alerts_page(filters, cursor=None):
+    """Элементы следующей страницы ленты, курсор и стиль кнопки «Показать ещё»."""
+    # Один снимок ленты: движок алертов может обновить её между чтениями
+    feed = ALERTS_FEED.view()
+    mask = _filter_alerts(feed.frame, *filters)
+    positions, next_cursor = feed.page(mask, cursor, ALERTS_PAGE_SIZE)
+    items = [create_alert_item(alert) for alert in feed.frame.iloc[positions].to_dict("records")]
+    return items, next_cursor, {"display": "block" if next_cursor else "none"}, mask
+
+
 @callback(
     [Output("alerts-feed", "children"),
-     Output("alerts-count", "children")],
+     Output("alerts-count", "children"),
+     Output("alerts-feed-cursor", "data"),
+     Output("alerts-load-more", "style")],
     [Input("search-alerts", "value"),
      Input("filter-alert-status", "value"),
      Input("filter-alert-severity", "value"),
@@ -423,35 +479,36 @@ def update_template_preview(subject, body):
      Input("filter-alert-table", "value")]
 )
 def update_alerts_feed(search, status, severity, domain, schema, table):
-    df = MOCK_ALERTS.copy()
-    
-    if search:
-        search = search.lower()
-        df = df[
-            df["check_name"].str.lower().str.contains(search, na=False) |
-            df["table_name"].str.lower().str.contains(search, na=False)
-        ]
-    if status:
-        df = df[df["status"] == status]
-    if severity:
-        df = df[df["severity"] == severity]
-    if domain:
-        df = df[df["domain"] == domain]
-    if schema and table:
-        full_table = f"{schema}.{table}"
-        df = df[df["table_name"] == full_table]
-    elif schema:
-        df = df[df["table_name"].str.startswith(f"{schema}.")]
-    
-    df = df.sort_values("created_at", ascending=False)
-    
-    alerts_items = [create_alert_item(row.to_dict()) for _, row in df.iterrows()]
-    
-    if not alerts_items:
-        alerts_items = [dbc.Alert("Нет алертов по заданным фильтрам", color="info")]
-    
-    count_text = f"Найдено алертов: {len(df)}"
-    return alerts_items, count_text
+    """Первая страница ленты по фильтрам (остальные -- load_more_alerts)."""
+    items, cursor, more_style, mask = _alerts_page((search, status, severity, domain, schema, table))
+    if not items:
+        items = [dbc.Alert("Нет алертов по заданным фильтрам", color="info")]
+    count_text = f"Найдено алертов: {int(mask.sum())}"
+    return items, count_text, cursor, more_style
+
+
+@callback(
+    [Output("alerts-feed", "children", allow_duplicate=True),
+     Output("alerts-feed-cursor", "data", allow_duplicate=True),
+     Output("alerts-load-more", "style", allow_duplicate=True)],
+    Input("btn-load-more-alerts", "n_clicks"),
+    [State("alerts-feed-cursor", "data"),
+     State("search-alerts", "value"),
+     State("filter-alert-status", "value"),
+     State("filter-alert-severity", "value"),
+     State("filter-alert-domain", "value"),
+     State("filter-alert-schema", "value"),
+     State("filter-alert-table", "value")],
+    prevent_initial_call=True
+)
+def load_more_alerts(n_clicks, cursor, search, status, severity, domain, schema, table):
+    """Следующая страница после курсора -- дописывается в конец ленты (Patch)."""
+    if not cursor:
+        return dash.no_update, dash.no_update, {"display": "none"}
+    items, next_cursor, more_style, _ = _alerts_page((search, status, severity, domain, schema, table), cursor)
+    feed = Patch()
+    feed.extend(items)
+    return feed, next_cursor, more_style
 
 
 @callback(
@@ -490,14 +547,27 @@ def toggle_rule_modal(n_create, n_cancel, n_save, is_open):
      State("new-rule-condition", "value"),
      State("new-rule-scope", "value"),
      State("new-rule-target", "value"),
+     State("new-rule-channel", "value"),
+     State("new-rule-recipients", "value"),
      State("new-rule-msg-subject", "value"),
      State("new-rule-msg-body", "value")],
     prevent_initial_call=True
 )
-def save_rule(n_clicks, name, condition, scope, target, msg_subject, msg_body):
+def save_rule(n_clicks, name, condition, scope, target, channel, recipients, msg_subject, msg_body):
     if n_clicks:
         if not name:
             return True, "Введите название правила", "Ошибка", "danger"
+        if not channel:
+            return True, "Выберите канал оповещения", "Ошибка", "danger"
+        if scope not in (None, "all") and not target:
+            return True, "Выберите объект для области правила", "Ошибка", "danger"
+        if not parse_recipients(recipients, channel):
+            return True, "Укажите получателей для выбранного канала", "Ошибка", "danger"
+        try:
+            rule = add_alert_rule(name, condition, scope, target, channel, recipients, msg_subject, msg_body)
+        except ValueError as e:
+            # TemplateError шаблонов и ошибки условия/области правила (RuleSet._compile)
+            return True, str(e), "Ошибка", "danger"
         condition_text = condition or "не задано"
         if scope == "all" or not scope:
             scope_text = "все проверки"
@@ -512,6 +582,9 @@ def save_rule(n_clicks, name, condition, scope, target, msg_subject, msg_body):
         if msg_subject or msg_body:
             template_info = " Шаблон сообщения сохранён."
         
-        msg = f"Правило \"{name}\" создано: при {condition_text} для {scope_text}.{template_info}"
+        disabled = sorted({c for c, _ in rule["recipients"]} - set(NOTIFIER.channels))
+        if disabled:
+            template_info += f" Канал не настроен: {', '.join(disabled)}."
+        msg = f"Правило \"{name}\" создано: при {condition_text} для {scope_text}, получателей: {len(rule['recipients'])}.{template_info}"
         return True, msg, "Успех", "success"
     return False, "", "", ""
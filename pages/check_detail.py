@@ -1,6 +1,8 @@
 """
 Страница детальной информации о проверке
 """
+from datetime import date, timedelta
+
 import dash
 from dash import html, dcc, callback, Input, Output, State, ctx
 import dash_bootstrap_components as dbc
@@ -8,7 +10,12 @@ import dash_ag_grid as dag
 import dash_cytoscape as cyto
 import plotly.express as px
 import plotly.graph_objects as go
-from mock_data import get_check_by_id, get_check_results, get_check_versions, get_lineage, MOCK_CHECKS
+from dash.exceptions import PreventUpdate
+from mock_data import (
+    get_check_by_id, get_check_results, get_check_versions, get_lineage,
+    MOCK_CHECKS, RESULTS_STORE, LINEAGE, LINEAGE_DEPTH, CHECK_EXECUTOR,
+)
+from services.cache import CALLBACK_CACHE
 
 dash.register_page(__name__, path_template="/check/<check_id>", name="Детали проверки")
 
@@ -30,8 +37,6 @@ def layout(check_id=None):
         ])
     
     results = get_check_results(check_id, limit=30)
-    versions = get_check_versions(check_id)
-    lineage_elements = get_lineage(check["table_name"])
     
     # Статистика за последние 30 дней
     total_runs = len(results)
@@ -140,11 +145,7 @@ def layout(check_id=None):
                         dbc.Card([
                             dbc.CardHeader("История запусков"),
                             dbc.CardBody([
-                                dcc.Graph(
-                                    figure=create_history_chart(results),
-                                    style={"height": "250px"},
-                                    config={"displayModeBar": False},
-                                )
+                                _lazy_container("check-overview-chart", height="250px"),
                             ])
                         ])
                     ], width=8),
@@ -199,180 +200,29 @@ def layout(check_id=None):
             
             # Таб: История
             dbc.Tab([
-                dbc.Card([
-                    dbc.CardBody([
-                        dag.AgGrid(
-                            id="history-grid",
-                            rowData=results.to_dict("records"),
-                            columnDefs=[
-                                {"field": "run_datetime", "headerName": "Время запуска", "width": 180,
-                                 "valueFormatter": {"function": "d3.timeFormat('%d.%m.%Y %H:%M')(new Date(params.value))"}},
-                                {"field": "check_status_name", "headerName": "Статус", "width": 100,
-                                 "cellRenderer": "StatusRenderer"},
-                                {"field": "execution_time_sec", "headerName": "Время (сек)", "width": 120},
-                                {"field": "rows_checked", "headerName": "Строк проверено", "width": 140,
-                                 "valueFormatter": {"function": "params.value ? params.value.toLocaleString() : '-'"}},
-                                {"field": "rows_failed", "headerName": "Строк с ошибками", "width": 150},
-                                {"field": "error_message", "headerName": "Сообщение об ошибке", "width": 250},
-                            ],
-                            defaultColDef={"sortable": True, "resizable": True},
-                            dashGridOptions={"pagination": True, "paginationPageSize": 10},
-                            style={"height": "400px"},
-                            className="ag-theme-alpine",
-                        )
-                    ])
-                ], className="mt-3")
+                _lazy_container("check-tab-history"),
             ], label="История запусков", tab_id="tab-history"),
             
             # Таб: Предыдущие версии
             dbc.Tab([
-                dbc.Card([
-                    dbc.CardBody([
-                        html.H5("История изменений конфигурации", className="mb-3"),
-                        html.P("Все изменения проверки фиксируются и доступны для просмотра.", className="text-muted small"),
-                        dag.AgGrid(
-                            id="versions-grid",
-                            rowData=versions.to_dict("records") if not versions.empty else [],
-                            columnDefs=[
-                                {"field": "version", "headerName": "Версия", "width": 90,
-                                 "cellRenderer": {"function": """params => {
-                                    const isCurrent = params.data.is_current;
-                                    return isCurrent ? `<span class="badge bg-primary">v${params.value} (текущая)</span>` : `v${params.value}`;
-                                 }"""}},
-                                {"field": "change_type", "headerName": "Тип изменения", "width": 200},
-                                {"field": "changed_by", "headerName": "Автор", "width": 130},
-                                {"field": "changed_at", "headerName": "Дата изменения", "width": 180,
-                                 "valueFormatter": {"function": "d3.timeFormat('%d.%m.%Y %H:%M')(new Date(params.value))"}},
-                                {"field": "threshold", "headerName": "Threshold", "width": 100,
-                                 "valueFormatter": {"function": "params.value != null ? (params.value * 100).toFixed(1) + '%' : '-'"}},
-                                {"field": "schedule", "headerName": "Расписание", "width": 120},
-                            ],
-                            defaultColDef={"sortable": True, "resizable": True},
-                            dashGridOptions={"pagination": True, "paginationPageSize": 10},
-                            style={"height": "350px"},
-                            className="ag-theme-alpine",
-                        ),
-                    ])
-                ], className="mt-3")
+                _lazy_container("check-tab-versions"),
             ], label="Предыдущие версии", tab_id="tab-versions"),
             
             # Таб: Lineage
             dbc.Tab([
-                dbc.Card([
-                    dbc.CardBody([
-                        html.H5([
-                            "Lineage таблицы ",
-                            dbc.Badge(check["table_name"], color="info"),
-                        ], className="mb-3"),
-                        html.P("Граф зависимостей: источники данных слева, потребители справа.", className="text-muted small"),
-                        cyto.Cytoscape(
-                            id="lineage-graph",
-                            elements=lineage_elements,
-                            layout={"name": "breadthfirst", "directed": True, "spacingFactor": 1.5},
-                            style={"width": "100%", "height": "400px", "border": "1px solid #dee2e6", "borderRadius": "8px"},
-                            stylesheet=[
-                                {
-                                    "selector": "node",
-                                    "style": {
-                                        "label": "data(label)",
-                                        "text-valign": "center",
-                                        "text-halign": "center",
-                                        "background-color": "#6c757d",
-                                        "color": "#fff",
-                                        "font-size": "11px",
-                                        "width": "120px",
-                                        "height": "35px",
-                                        "shape": "round-rectangle",
-                                        "text-wrap": "wrap",
-                                        "text-max-width": "110px",
-                                        "padding": "8px",
-                                    }
-                                },
-                                {
-                                    "selector": 'node[layer = "center"]',
-                                    "style": {
-                                        "background-color": "#0d6efd",
-                                        "border-width": "3px",
-                                        "border-color": "#0a58ca",
-                                        "font-weight": "bold",
-                                        "width": "140px",
-                                        "height": "40px",
-                                    }
-                                },
-                                {
-                                    "selector": 'node[layer = "source"]',
-                                    "style": {"background-color": "#198754"}
-                                },
-                                {
-                                    "selector": 'node[layer = "target"]',
-                                    "style": {"background-color": "#fd7e14"}
-                                },
-                                {
-                                    "selector": "edge",
-                                    "style": {
-                                        "curve-style": "bezier",
-                                        "target-arrow-shape": "triangle",
-                                        "target-arrow-color": "#adb5bd",
-                                        "line-color": "#adb5bd",
-                                        "width": 2,
-                                    }
-                                },
-                            ],
-                        ),
-                        html.Div([
-                            dbc.Badge("Центральная таблица", color="primary", className="me-2"),
-                            dbc.Badge("Источники", color="success", className="me-2"),
-                            dbc.Badge("Потребители", color="warning", className="me-2"),
-                        ], className="mt-2"),
-                    ])
-                ], className="mt-3")
+                _lazy_container("check-tab-lineage"),
             ], label="Lineage", tab_id="tab-lineage"),
             
             # Таб: Алерты
             dbc.Tab([
-                dbc.Card([
-                    dbc.CardBody([
-                        dbc.Row([
-                            dbc.Col(html.H5("Настройки оповещений"), width=8),
-                            dbc.Col([
-                                dbc.Button([
-                                    html.I(className="fas fa-plus me-1"), "Добавить"
-                                ], size="sm", color="primary"),
-                            ], width=4, className="text-end"),
-                        ], className="mb-3"),
-                        dbc.ListGroup([
-                            dbc.ListGroupItem([
-                                dbc.Row([
-                                    dbc.Col([
-                                        html.I(className="fab fa-telegram text-info me-2"),
-                                        html.Strong("Telegram"),
-                                        html.Span(" - @dq_alerts_channel", className="text-muted ms-2"),
-                                    ], width=8),
-                                    dbc.Col([
-                                        dbc.Badge("При FAIL", color="danger", className="me-2"),
-                                        dbc.Switch(id="alert-tg-switch", value=True, className="d-inline"),
-                                    ], width=4, className="text-end"),
-                                ]),
-                            ]),
-                            dbc.ListGroupItem([
-                                dbc.Row([
-                                    dbc.Col([
-                                        html.I(className="fas fa-envelope text-primary me-2"),
-                                        html.Strong("Email"),
-                                        html.Span(" - team@company.com", className="text-muted ms-2"),
-                                    ], width=8),
-                                    dbc.Col([
-                                        dbc.Badge("При ERROR", color="warning", className="me-2"),
-                                        dbc.Switch(id="alert-email-switch", value=False, className="d-inline"),
-                                    ], width=4, className="text-end"),
-                                ]),
-                            ]),
-                        ]),
-                    ])
-                ], className="mt-3")
+                _lazy_container("check-tab-alerts"),
             ], label="Алерты", tab_id="tab-alerts"),
             
         ], id="check-tabs", active_tab="tab-overview"),
+        dcc.Store(id="check-detail-id", data=check_id),
+        dcc.Store(id="check-tabs-loaded", data=[]),
+        dcc.Store(id="check-run-id", data=None),
+        dcc.Interval(id="check-run-interval", interval=1000, disabled=True),
         
         # Модальное окно запуска
         dbc.Modal([
@@ -459,6 +309,242 @@ def layout(check_id=None):
     ], fluid=True, className="py-3")
 
 
+# ============================================================
+# Ленивые табы
+# ============================================================
+# Таб -> контейнер, который заполняется при первом открытии таба
+LAZY_TABS = {
+    "tab-overview": "check-overview-chart",
+    "tab-history": "check-tab-history",
+    "tab-versions": "check-tab-versions",
+    "tab-lineage": "check-tab-lineage",
+    "tab-alerts": "check-tab-alerts",
+}
+
+# Варианты глубины lineage (0 в переключателе -- без ограничения)
+LINEAGE_DEPTHS = [1, 2, 3, 5]
+
+# Содержимое табов зависит от проверки, версии данных хранилища и графа lineage
+_tab_cache = CALLBACK_CACHE.memoize("check_detail", version=lambda: (RESULTS_STORE.content_version, LINEAGE.version))
+
+
+def _lazy_container(container_id, height=None):
+    """Контейнер таба со спиннером до загрузки содержимого."""
+    return html.Div(
+        html.Div(dbc.Spinner(color="primary", size="sm"), className="text-center py-4"),
+        id=container_id,
+        style={"minHeight": height} if height else None,
+    )
+
+
+def _history_tab(results):
+    """Таб «История запусков»"""
+    return dbc.Card([
+        dbc.CardBody([
+            dag.AgGrid(
+                id="history-grid",
+                rowData=results.to_dict("records"),
+                columnDefs=[
+                    {"field": "run_datetime", "headerName": "Время запуска", "width": 180,
+                     "valueFormatter": {"function": "d3.timeFormat('%d.%m.%Y %H:%M')(new Date(params.value))"}},
+                    {"field": "check_status_name", "headerName": "Статус", "width": 100,
+                     "cellRenderer": "StatusRenderer"},
+                    {"field": "execution_time_sec", "headerName": "Время (сек)", "width": 120},
+                    {"field": "rows_checked", "headerName": "Строк проверено", "width": 140,
+                     "valueFormatter": {"function": "params.value ? params.value.toLocaleString() : '-'"}},
+                    {"field": "rows_failed", "headerName": "Строк с ошибками", "width": 150},
+                    {"field": "error_message", "headerName": "Сообщение об ошибке", "width": 250},
+                ],
+                defaultColDef={"sortable": True, "resizable": True},
+                dashGridOptions={"pagination": True, "paginationPageSize": 10},
+                style={"height": "400px"},
+                className="ag-theme-alpine",
+            )
+        ])
+    ], className="mt-3")
+
+
+def _versions_tab(versions):
+    """Таб «Предыдущие версии»"""
+    return dbc.Card([
+        dbc.CardBody([
+            html.H5("История изменений конфигурации", className="mb-3"),
+            html.P("Все изменения проверки фиксируются и доступны для просмотра.", className="text-muted small"),
+            dag.AgGrid(
+                id="versions-grid",
+                rowData=versions.to_dict("records") if not versions.empty else [],
+                columnDefs=[
+                    {"field": "version", "headerName": "Версия", "width": 90,
+                     "cellRenderer": {"function": """params => {
+                        const isCurrent = params.data.is_current;
+                        return isCurrent ? `<span class="badge bg-primary">v${params.value} (текущая)</span>` : `v${params.value}`;
+                     }"""}},
+                    {"field": "change_type", "headerName": "Тип изменения", "width": 200},
+                    {"field": "changed_by", "headerName": "Автор", "width": 130},
+                    {"field": "changed_at", "headerName": "Дата изменения", "width": 180,
+                     "valueFormatter": {"function": "d3.timeFormat('%d.%m.%Y %H:%M')(new Date(params.value))"}},
+                    {"field": "threshold", "headerName": "Threshold", "width": 100,
+                     "valueFormatter": {"function": "params.value != null ? (params.value * 100).toFixed(1) + '%' : '-'"}},
+                    {"field": "schedule", "headerName": "Расписание", "width": 120},
+                ],
+                defaultColDef={"sortable": True, "resizable": True},
+                dashGridOptions={"pagination": True, "paginationPageSize": 10},
+                style={"height": "350px"},
+                className="ag-theme-alpine",
+            ),
+        ])
+    ], className="mt-3")
+
+
+def _lineage_tab(check, lineage_elements):
+    """Таб «Lineage»"""
+    return dbc.Card([
+        dbc.CardBody([
+            html.H5([
+                "Lineage таблицы ",
+                dbc.Badge(check["table_name"], color="info"),
+            ], className="mb-3"),
+            dbc.Row([
+                dbc.Col(html.P("Граф зависимостей: источники данных слева, потребители справа.",
+                               className="text-muted small mb-0"), width=7),
+                dbc.Col([
+                    html.Small("Глубина: ", className="text-muted me-2"),
+                    dbc.RadioItems(
+                        id="lineage-depth",
+                        options=[{"label": str(d), "value": d} for d in LINEAGE_DEPTHS]
+                        + [{"label": "все", "value": 0}],
+                        value=LINEAGE_DEPTH,
+                        inline=True,
+                        className="d-inline-block small",
+                    ),
+                ], width=5, className="text-end"),
+            ], className="mb-2 align-items-center"),
+            cyto.Cytoscape(
+                id="lineage-graph",
+                elements=lineage_elements,
+                layout={"name": "breadthfirst", "directed": True, "spacingFactor": 1.5},
+                style={"width": "100%", "height": "400px", "border": "1px solid #dee2e6", "borderRadius": "8px"},
+                stylesheet=[
+                    {
+                        "selector": "node",
+                        "style": {
+                            "label": "data(label)",
+                            "text-valign": "center",
+                            "text-halign": "center",
+                            "background-color": "#6c757d",
+                            "color": "#fff",
+                            "font-size": "11px",
+                            "width": "120px",
+                            "height": "35px",
+                            "shape": "round-rectangle",
+                            "text-wrap": "wrap",
+                            "text-max-width": "110px",
+                            "padding": "8px",
+                        }
+                    },
+                    {
+                        "selector": 'node[layer = "center"]',
+                        "style": {
+                            "background-color": "#0d6efd",
+                            "border-width": "3px",
+                            "border-color": "#0a58ca",
+                            "font-weight": "bold",
+                            "width": "140px",
+                            "height": "40px",
+                        }
+                    },
+                    {
+                        "selector": 'node[layer = "source"]',
+                        "style": {"background-color": "#198754"}
+                    },
+                    {
+                        "selector": 'node[layer = "target"]',
+                        "style": {"background-color": "#fd7e14"}
+                    },
+                    {
+                        "selector": "edge",
+                        "style": {
+                            "curve-style": "bezier",
+                            "target-arrow-shape": "triangle",
+                            "target-arrow-color": "#adb5bd",
+                            "line-color": "#adb5bd",
+                            "width": 2,
+                        }
+                    },
+                ],
+            ),
+            html.Div([
+                dbc.Badge("Центральная таблица", color="primary", className="me-2"),
+                dbc.Badge("Источники", color="success", className="me-2"),
+                dbc.Badge("Потребители", color="warning", className="me-2"),
+            ], className="mt-2"),
+        ])
+    ], className="mt-3")
+
+
+def _alerts_tab():
+    """Таб «Алерты»"""
+    return dbc.Card([
+        dbc.CardBody([
+            dbc.Row([
+                dbc.Col(html.H5("Настройки оповещений"), width=8),
+                dbc.Col([
+                    dbc.Button([
+                        html.I(className="fas fa-plus me-1"), "Добавить"
+                    ], size="sm", color="primary"),
+                ], width=4, className="text-end"),
+            ], className="mb-3"),
+            dbc.ListGroup([
+                dbc.ListGroupItem([
+                    dbc.Row([
+                        dbc.Col([
+                            html.I(className="fab fa-telegram text-info me-2"),
+                            html.Strong("Telegram"),
+                            html.Span(" - @dq_alerts_channel", className="text-muted ms-2"),
+                        ], width=8),
+                        dbc.Col([
+                            dbc.Badge("При FAIL", color="danger", className="me-2"),
+                            dbc.Switch(id="alert-tg-switch", value=True, className="d-inline"),
+                        ], width=4, className="text-end"),
+                    ]),
+                ]),
+                dbc.ListGroupItem([
+                    dbc.Row([
+                        dbc.Col([
+                            html.I(className="fas fa-envelope text-primary me-2"),
+                            html.Strong("Email"),
+                            html.Span(" - team@company.com", className="text-muted ms-2"),
+                        ], width=8),
+                        dbc.Col([
+                            dbc.Badge("При ERROR", color="warning", className="me-2"),
+                            dbc.Switch(id="alert-email-switch", value=False, className="d-inline"),
+                        ], width=4, className="text-end"),
+                    ]),
+                ]),
+            ]),
+        ])
+    ], className="mt-3")
+
+
+@_tab_cache
+def render_tab(check_id, tab):
+    """Содержимое таба проверки (считается при первом открытии таба)."""
+    if tab == "tab-overview":
+        return dcc.Graph(
+            figure=create_history_chart(get_check_results(check_id, limit=30)),
+            style={"height": "250px"},
+            config={"displayModeBar": False},
+        )
+    if tab == "tab-history":
+        return _history_tab(get_check_results(check_id, limit=30))
+    if tab == "tab-versions":
+        return _versions_tab(get_check_versions(check_id))
+    if tab == "tab-lineage":
+        check = get_check_by_id(check_id)
+        return _lineage_tab(check, get_lineage(check["table_name"]))
+    return _alerts_tab()
+
+
 def create_history_chart(results):
     """Создание графика истории запусков"""
     if results.empty:
@@ -488,6 +574,36 @@ def create_history_chart(results):
     return fig
 
 
+@callback(
+    [Output(container, "children") for container in LAZY_TABS.values()]
+    + [Output("check-tabs-loaded", "data")],
+    Input("check-tabs", "active_tab"),
+    [State("check-detail-id", "data"),
+     State("check-tabs-loaded", "data")],
+)
+def load_tab(active_tab, check_id, loaded):
+    """Заполнение таба при первом переключении на него."""
+    loaded = loaded or []
+    if check_id is None or active_tab not in LAZY_TABS or active_tab in loaded:
+        raise PreventUpdate
+    content = render_tab(check_id, active_tab)
+    return [content if tab == active_tab else dash.no_update for tab in LAZY_TABS] + [loaded + [active_tab]]
+
+
+@callback(
+    Output("lineage-graph", "elements"),
+    Input("lineage-depth", "value"),
+    State("check-detail-id", "data"),
+    prevent_initial_call=True,
+)
+def update_lineage_depth(depth, check_id):
+    """Перестроение lineage при смене глубины обхода."""
+    check = get_check_by_id(check_id)
+    if check is None:
+        raise PreventUpdate
+    return get_lineage(check["table_name"], depth=depth or None)
+
+
 # Callback для модального окна запуска
 @callback(
     Output("modal-run-check", "is_open"),
@@ -518,22 +634,60 @@ def toggle_report_modal(n_report, n_cancel, n_send, is_open):
     [Output("toast-check-action", "is_open"),
      Output("toast-check-action", "children"),
      Output("toast-check-action", "header"),
-     Output("toast-check-action", "icon")],
+     Output("toast-check-action", "icon"),
+     Output("check-run-id", "data"),
+     Output("check-run-interval", "disabled")],
     [Input("btn-confirm-run", "n_clicks"),
      Input("btn-send-report", "n_clicks")],
     [State("report-category", "value"),
-     State("report-description", "value")],
+     State("report-description", "value"),
+     State("check-detail-id", "data"),
+     State("run-date-input", "value")],
     prevent_initial_call=True
 )
-def handle_check_actions(n_run, n_report, report_cat, report_desc):
+def handle_check_actions(n_run, n_report, report_cat, report_desc, check_id=None, run_date=None):
     triggered = ctx.triggered_id
+    no_run = (dash.no_update, dash.no_update)
     
     if triggered == "btn-confirm-run" and n_run:
-        return True, "Проверка отправлена в Airflow для выполнения", "Запуск проверки", "success"
+        check = get_check_by_id(check_id)
+        if check is None:
+            return True, "Проверка не найдена", "Ошибка", "danger", *no_run
+        # Скрипты проверяют данные за «вчера» (CURRENT_DATE - 1): за дату D считаем «сегодня» D + 1
+        as_of = date.fromisoformat(run_date) + timedelta(days=1) if run_date else None
+        run_id = CHECK_EXECUTOR.submit([check], as_of=as_of)
+        return True, "Проверка поставлена в очередь на выполнение", "Запуск проверки", "success", run_id, False
     
     if triggered == "btn-send-report" and n_report:
         if not report_cat or not report_desc:
-            return True, "Заполните категорию и описание проблемы", "Ошибка", "danger"
-        return True, "Спасибо! Ваше сообщение отправлено команде DQ. Мы свяжемся с вами.", "Отчёт отправлен", "success"
+            return True, "Заполните категорию и описание проблемы", "Ошибка", "danger", *no_run
+        return True, "Спасибо! Ваше сообщение отправлено команде DQ. Мы свяжемся с вами.", "Отчёт отправлен", "success", *no_run
     
-    return False, "", "", ""
+    return False, "", "", "", *no_run
+
+
+@callback(
+    [Output("toast-check-action", "is_open", allow_duplicate=True),
+     Output("toast-check-action", "children", allow_duplicate=True),
+     Output("toast-check-action", "header", allow_duplicate=True),
+     Output("toast-check-action", "icon", allow_duplicate=True),
+     Output("check-run-interval", "disabled", allow_duplicate=True)],
+    Input("check-run-interval", "n_intervals"),
+    State("check-run-id", "data"),
+    prevent_initial_call=True
+)
+def poll_check_run(n_intervals, run_id):
+    """Итог запуска проверки, когда результат записан."""
+    run = CHECK_EXECUTOR.status(run_id)
+    if run is None:
+        return dash.no_update, dash.no_update, dash.no_update, dash.no_update, True
+    if not run["finished"]:
+        raise PreventUpdate
+    if not run["results"]:
+        return True, f"Ошибка запуска: {run['error']}", "Проверка не выполнена", "danger", True
+    result = run["results"][0]
+    status = result["check_status_name"]
+    icon = {"OK": "success", "FAIL": "danger"}.get(status, "warning")
+    rows_failed = f"{result['rows_failed']:,}".replace(",", " ")
+    text = f"Статус: {status}, строк с ошибками: {rows_failed}"
+    return True, text, "Проверка выполнена", icon, True
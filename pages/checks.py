@@ -1,11 +1,19 @@
 """
 Страница списка проверок
 """
+import base64
+import zlib
+from datetime import date
+
 import dash
 from dash import html, dcc, callback, Input, Output, State, ctx, ALL, MATCH, ClientsideFunction
 import dash_bootstrap_components as dbc
 import dash_ag_grid as dag
-from mock_data import MOCK_CHECKS, MOCK_CHECK_TYPES, DOMAINS, OWNERS, TABLES, SCHEMAS, TABLES_BY_SCHEMA
+import numpy as np
+from mock_data import (
+    MOCK_CHECKS, MOCK_CHECK_TYPES, CHECKS_SEARCH, CHECKS_REVISIONS, DOMAINS, OWNERS, TABLES, SCHEMAS, TABLES_BY_SCHEMA,
+    CHECK_EXECUTOR, CHECK_SCHEDULER, set_checks_active, update_check,
+)
 
 dash.register_page(__name__, path="/checks", name="Проверки")
 
@@ -207,6 +215,8 @@ def layout():
                     "headerName": "ID", 
                     "width": 80,
                     "pinned": "left",
+                    # Строки из rowTransaction добавляются в конец -- порядок задаёт сортировка
+                    "sort": "asc",
                 },
                 {
                     "field": "check_name", 
@@ -339,6 +349,11 @@ def layout():
         
         # Store для хранения данных редактируемой проверки
         dcc.Store(id="edit-check-data", data=None),
+        # Что сейчас показано в таблице: ревизия каталога и check_id (сжатая битовая маска)
+        dcc.Store(id="checks-grid-state", data=None),
+        # Массовый запуск: id запуска и опрос прогресса
+        dcc.Store(id="bulk-run-id", data=None),
+        dcc.Interval(id="bulk-run-interval", interval=1000, disabled=True),
         # Store для типа действия с периодом (disable/enable)
         dcc.Store(id="period-action-type", data="disable"),
         
@@ -580,11 +595,95 @@ def update_filter_tables_dropdown(schema):
     return options, False, ""
 
 
+# ============================================================
+# Дельта-обновления таблицы
+# ============================================================
+# Поля строки, которые использует таблица (колонки и рендереры)
+GRID_FIELDS = [
+    "check_id", "check_name", "table_name", "check_type_name", "domain", "owner",
+    "schedule_main_value", "last_status", "is_active", "priority",
+]
+
+
+def _encode_ids(ids):
+    """check_id -> битовая маска, сжатая zlib, в base64 (компактно и для диапазонов, и для разрозненных id)."""
+    if len(ids) == 0:
+        return ""
+    bits = np.zeros(int(ids.max()) + 1, dtype=bool)
+    bits[ids] = True
+    return base64.b64encode(zlib.compress(np.packbits(bits).tobytes())).decode("ascii")
+
+
+def _decode_ids(encoded):
+    """Обратное к _encode_ids: отсортированный массив check_id."""
+    if not encoded:
+        return np.empty(0, dtype=np.int64)
+    packed = np.frombuffer(zlib.decompress(base64.b64decode(encoded)), dtype=np.uint8)
+    return np.flatnonzero(np.unpackbits(packed)).astype(np.int64)
+
+
+def _grid_rows(ids):
+    """Строки таблицы для заданных check_id."""
+    df = MOCK_CHECKS[MOCK_CHECKS["check_id"].isin(ids)]
+    return df[GRID_FIELDS].to_dict("records")
+
+
+def _grid_state(ids, revision, filters=None):
+    return {"revision": revision, "ids": _encode_ids(ids), "filters": filters or {}}
+
+
+def _filter_checks(df, filters):
+    """Строки каталога, проходящие фильтры таблицы (search, status, check_type, domain, owner, schema, table)."""
+    search, status, schema, table = (filters.get(k) for k in ("search", "status", "schema", "table"))
+    if search:
+        df = df[df["check_id"].isin(CHECKS_SEARCH.search(search))]
+    if status:
+        df = df[df["last_status"] == status]
+    for field, column in (("check_type", "check_type_name"), ("domain", "domain"), ("owner", "owner")):
+        if filters.get(field):
+            df = df[df[column] == filters[field]]
+    if schema and table:
+        full_table = f"{schema}.{table}"
+        df = df[df["table_name"] == full_table]
+    elif schema:
+        df = df[df["table_name"].str.startswith(f"{schema}.")]
+    return df
+
+
+def _grid_delta(state, ids):
+    """rowTransaction от показанного клиенту состояния state к строкам ids.
+
+    None -- дельта не меньше полной замены (или состояние клиента неизвестно).
+    """
+    if not state:
+        return None
+    shown = _decode_ids(state["ids"])
+    added = np.setdiff1d(ids, shown, assume_unique=True)
+    removed = np.setdiff1d(shown, ids, assume_unique=True)
+    changed = np.intersect1d(
+        np.array(CHECKS_REVISIONS.changed_since(state["revision"]), dtype=np.int64),
+        np.intersect1d(ids, shown, assume_unique=True),
+    )
+    # Удаление -- только id, поэтому сравниваем число полных строк
+    if len(added) + len(changed) >= len(ids):
+        return None
+    transaction = {}
+    if len(added):
+        transaction["add"] = _grid_rows(added)
+    if len(changed):
+        transaction["update"] = _grid_rows(changed)
+    if len(removed):
+        transaction["remove"] = [{"check_id": int(i)} for i in removed]
+    return transaction
+
+
 # ============================================================
 # Основной callback фильтрации таблицы
 # ============================================================
 @callback(
     [Output("checks-grid", "rowData"),
+     Output("checks-grid", "rowTransaction"),
+     Output("checks-grid-state", "data"),
      Output("checks-count", "children")],
     [Input("search-checks", "value"),
      Input("filter-status", "value"),
@@ -592,33 +691,24 @@ def update_filter_tables_dropdown(schema):
      Input("filter-domain", "value"),
      Input("filter-owner", "value"),
      Input("filter-check-schema", "value"),
-     Input("filter-check-table", "value")]
+     Input("filter-check-table", "value")],
+    State("checks-grid-state", "data"),
 )
-def update_checks_table(search, status, check_type, domain, owner, schema, table):
-    df = MOCK_CHECKS.copy()
-    
-    if search:
-        search = search.lower()
-        df = df[
-            df["check_name"].str.lower().str.contains(search, na=False) |
-            df["table_name"].str.lower().str.contains(search, na=False)
-        ]
-    if status:
-        df = df[df["last_status"] == status]
-    if check_type:
-        df = df[df["check_type_name"] == check_type]
-    if domain:
-        df = df[df["domain"] == domain]
-    if owner:
-        df = df[df["owner"] == owner]
-    if schema and table:
-        full_table = f"{schema}.{table}"
-        df = df[df["table_name"] == full_table]
-    elif schema:
-        df = df[df["table_name"].str.startswith(f"{schema}.")]
+def update_checks_table(search, status, check_type, domain, owner, schema, table, state=None):
+    """Фильтрация таблицы: клиенту уходит только разница с тем, что он уже показывает."""
+    revision = CHECKS_REVISIONS.revision
+    filters = {"search": search, "status": status, "check_type": check_type, "domain": domain,
+               "owner": owner, "schema": schema, "table": table}
+    df = _filter_checks(MOCK_CHECKS, filters)
     
     count_text = f"Найдено проверок: {len(df)}"
-    return df.to_dict("records"), count_text
+    ids = np.sort(df["check_id"].to_numpy(dtype=np.int64))
+    transaction = _grid_delta(state, ids)
+    if transaction is None:
+        return df[GRID_FIELDS].to_dict("records"), dash.no_update, _grid_state(ids, revision, filters), count_text
+    if not transaction:
+        return dash.no_update, dash.no_update, _grid_state(ids, revision, filters), count_text
+    return dash.no_update, transaction, _grid_state(ids, revision, filters), count_text
 
 
 # ============================================================
@@ -723,10 +813,18 @@ def toggle_edit_modal(cell_clicked, n_cancel, n_save, is_open):
      Input("checks-grid", "cellClicked")],
     [State("new-check-name", "value"),
      State("new-check-table", "value"),
-     State("edit-check-name", "value")],
+     State("edit-check-data", "data"),
+     State("edit-check-name", "value"),
+     State("edit-check-schedule", "value"),
+     State("edit-check-priority", "value"),
+     State("edit-check-owner", "value"),
+     State("edit-check-threshold", "value"),
+     State("edit-check-description", "value"),
+     State("edit-check-sql", "value")],
     prevent_initial_call=True
 )
-def handle_actions(n_save_new, n_save_edit, cell_clicked, new_name, new_table, edit_name):
+def handle_actions(n_save_new, n_save_edit, cell_clicked, new_name, new_table, edit_check, edit_name,
+                   edit_schedule, edit_priority, edit_owner, edit_threshold, edit_description, edit_sql):
     triggered = ctx.triggered_id
     
     if triggered == "btn-save-new" and n_save_new:
@@ -736,7 +834,12 @@ def handle_actions(n_save_new, n_save_edit, cell_clicked, new_name, new_table, e
             return True, "Заполните обязательные поля (название, таблица)", "Ошибка", "danger"
     
     if triggered == "btn-save-edit" and n_save_edit:
-        if edit_name:
+        if edit_name and edit_check:
+            update_check(
+                int(edit_check["check_id"]), check_name=edit_name, schedule_main_value=edit_schedule,
+                priority=edit_priority, owner=edit_owner, description=edit_description, sql_script=edit_sql,
+                threshold=None if edit_threshold is None else float(edit_threshold) / 100,
+            )
             return True, f"Проверка '{edit_name}' успешно обновлена!", "Успех", "success"
         else:
             return True, "Заполните обязательные поля", "Ошибка", "danger"
@@ -775,7 +878,11 @@ def toggle_bulk_actions(selected_rows):
     [Output("toast-notification", "is_open", allow_duplicate=True),
      Output("toast-notification", "children", allow_duplicate=True),
      Output("toast-notification", "header", allow_duplicate=True),
-     Output("toast-notification", "icon", allow_duplicate=True)],
+     Output("toast-notification", "icon", allow_duplicate=True),
+     Output("checks-grid", "rowTransaction", allow_duplicate=True),
+     Output("checks-grid-state", "data", allow_duplicate=True),
+     Output("bulk-run-id", "data"),
+     Output("bulk-run-interval", "disabled")],
     [Input("btn-bulk-run", "n_clicks"),
      Input("btn-bulk-enable", "n_clicks"),
      Input("btn-bulk-disable", "n_clicks"),
@@ -785,49 +892,122 @@ def toggle_bulk_actions(selected_rows):
      State("period-action-type", "data"),
      State("period-start-date", "value"),
      State("period-end-date", "value"),
-     State("period-reason", "value")],
+     State("period-reason", "value"),
+     State("checks-grid-state", "data")],
     prevent_initial_call=True
 )
 def handle_bulk_actions(n_run, n_enable, n_disable, n_delete, n_period,
-                        selected_rows, period_action, period_start, period_end, period_reason):
+                        selected_rows, period_action, period_start, period_end, period_reason, grid_state=None):
     triggered = ctx.triggered_id
+    no_patch = (dash.no_update, dash.no_update)
+    no_run = (dash.no_update, dash.no_update)
     
     if triggered == "btn-apply-period":
+        if not period_start or not period_end:
+            return True, "Укажите даты начала и окончания периода", "Ошибка", "danger", *no_patch, *no_run
+        start, end = date.fromisoformat(period_start), date.fromisoformat(period_end)
+        if start > end:
+            return True, "Дата начала позже даты окончания", "Ошибка", "danger", *no_patch, *no_run
         count = len(selected_rows) if selected_rows else 0
+        # Окно учитывает планировщик: проверка пропускается (или запускается) в эти даты
+        CHECK_SCHEDULER.set_window([row["check_id"] for row in selected_rows or []], start, end,
+                                   active=period_action != "disable")
         action_text = "выключены" if period_action == "disable" else "включены"
-        period_text = f"с {period_start} по {period_end}" if period_start and period_end else "на указанный период"
-        return True, f"{count} проверок {action_text} {period_text}. Причина: {period_reason or 'не указана'}", "Период установлен", "success"
+        return (True, f"{count} проверок {action_text} с {period_start} по {period_end}. "
+                      f"Причина: {period_reason or 'не указана'}",
+                "Период установлен", "success", *no_patch, *no_run)
     
     if not selected_rows:
-        return False, "", "", ""
+        return False, "", "", "", *no_patch, *no_run
     
     count = len(selected_rows)
     check_ids = [row["check_id"] for row in selected_rows]
     
     if triggered == "btn-bulk-run":
-        check_names = [row["check_name"] for row in selected_rows[:3]]
-        names_text = ", ".join(check_names)
-        if count > 3:
-            names_text += f" и ещё {count - 3}"
-        msg = html.Div([
-            html.P(f"Запущено {count} проверок. Проверки поставлены в очередь.", className="mb-2"),
-            html.Div([
-                html.Small("Очередь: ", className="text-muted"),
-                html.Small(names_text),
-            ], className="mb-1"),
-            dbc.Progress(value=0, id="bulk-run-progress", striped=True, animated=True,
-                         color="success", className="mt-2", style={"height": "6px"}),
-            html.Small("Приоритет: высокий (мультизапуск)", className="text-muted"),
-        ])
-        return True, msg, "Массовый запуск", "success"
-    elif triggered == "btn-bulk-enable":
-        return True, f"Включено {count} проверок", "Массовое включение", "success"
-    elif triggered == "btn-bulk-disable":
-        return True, f"Выключено {count} проверок", "Массовое выключение", "warning"
+        checks = MOCK_CHECKS[MOCK_CHECKS["check_id"].isin(check_ids)].to_dict("records")
+        run_id = CHECK_EXECUTOR.submit(checks)
+        msg = _bulk_run_message(selected_rows, CHECK_EXECUTOR.status(run_id))
+        return True, msg, "Массовый запуск", "success", *no_patch, run_id, False
+    elif triggered in ("btn-bulk-enable", "btn-bulk-disable"):
+        enable = triggered == "btn-bulk-enable"
+        set_checks_active(check_ids, enable)
+        patch = _patch_rows(grid_state)
+        if enable:
+            return True, f"Включено {count} проверок", "Массовое включение", "success", *patch, *no_run
+        return True, f"Выключено {count} проверок", "Массовое выключение", "warning", *patch, *no_run
     elif triggered == "btn-bulk-delete":
-        return True, f"Удалено {count} проверок", "Массовое удаление", "danger"
+        return True, f"Удалено {count} проверок", "Массовое удаление", "danger", *no_patch, *no_run
     
-    return False, "", "", ""
+    return False, "", "", "", *no_patch, *no_run
+
+
+def _bulk_run_message(selected_rows, run):
+    """Текст уведомления массового запуска с прогрессом выполнения."""
+    count = len(selected_rows)
+    names_text = ", ".join(row["check_name"] for row in selected_rows[:3])
+    if count > 3:
+        names_text += f" и ещё {count - 3}"
+    done, total = run["done"], max(run["total"], 1)
+    statuses = ", ".join(f"{status}: {n}" for status, n in sorted(run["statuses"].items()))
+    return html.Div([
+        html.P(f"Запущено {count} проверок. Выполнено {done} из {run['total']}.", className="mb-2"),
+        html.Div([
+            html.Small("Очередь: ", className="text-muted"),
+            html.Small(names_text),
+        ], className="mb-1"),
+        dbc.Progress(value=round(100 * done / total), id="bulk-run-progress", striped=not run["finished"],
+                     animated=not run["finished"], color="success", className="mt-2", style={"height": "6px"}),
+        html.Small(statuses or "Приоритет: высокий (мультизапуск)", className="text-muted"),
+        html.Small(f"Ошибка запуска: {run['error']}", className="text-danger d-block") if run.get("error") else None,
+    ])
+
+
+@callback(
+    [Output("toast-notification", "children", allow_duplicate=True),
+     Output("toast-notification", "is_open", allow_duplicate=True),
+     Output("bulk-run-interval", "disabled", allow_duplicate=True),
+     Output("checks-grid", "rowTransaction", allow_duplicate=True),
+     Output("checks-grid-state", "data", allow_duplicate=True)],
+    Input("bulk-run-interval", "n_intervals"),
+    [State("bulk-run-id", "data"),
+     State("checks-grid", "selectedRows"),
+     State("checks-grid-state", "data")],
+    prevent_initial_call=True
+)
+def poll_bulk_run(n_intervals, run_id, selected_rows, grid_state):
+    """Прогресс массового запуска; по завершении -- итог и обновлённые статусы в таблице."""
+    run = CHECK_EXECUTOR.status(run_id)
+    if run is None:
+        return dash.no_update, dash.no_update, True, dash.no_update, dash.no_update
+    msg = _bulk_run_message(selected_rows or [], run)
+    if not run["finished"]:
+        return msg, dash.no_update, False, dash.no_update, dash.no_update
+    return msg, True, True, *_patch_rows(grid_state)
+
+
+def _patch_rows(grid_state):
+    """rowTransaction с изменёнными строками из тех, что показаны в таблице, и новое состояние.
+
+    Изменённые строки заново проверяются фильтрами таблицы: переставшие им
+    соответствовать (например, статус сменился при фильтре по статусу) удаляются.
+    """
+    if not grid_state:
+        return dash.no_update, dash.no_update
+    revision = CHECKS_REVISIONS.revision
+    shown = _decode_ids(grid_state["ids"])
+    changed = np.intersect1d(np.array(CHECKS_REVISIONS.changed_since(grid_state["revision"]), dtype=np.int64), shown)
+    state = {**grid_state, "revision": revision}
+    if len(changed) == 0:
+        return dash.no_update, state
+    rows = _filter_checks(MOCK_CHECKS[MOCK_CHECKS["check_id"].isin(changed)], grid_state.get("filters") or {})
+    removed = np.setdiff1d(changed, rows["check_id"].to_numpy(dtype=np.int64))
+    transaction = {}
+    if len(rows):
+        transaction["update"] = rows[GRID_FIELDS].to_dict("records")
+    if len(removed):
+        transaction["remove"] = [{"check_id": int(i)} for i in removed]
+        state["ids"] = _encode_ids(np.setdiff1d(shown, removed, assume_unique=True))
+    return transaction, state
 
 
 # ============================================================
@@ -8,14 +8,26 @@ import dash_cytoscape as cyto
 import plotly.express as px
 import plotly.graph_objects as go
 from mock_data import (
-    MOCK_CHECKS, MOCK_RESULTS, DOMAINS, TABLES,
+    MOCK_CHECKS, RESULTS_STORE, RESULTS_CUBE, DOMAINS, TABLES,
     get_dashboard_stats, get_trend_data, 
     get_checks_by_domain, get_checks_by_type,
-    LINEAGE_GRAPH,
+    LINEAGE, IMPACT,
 )
+from services.cache import CALLBACK_CACHE
 
 dash.register_page(__name__, path="/", name="Дашборд")
 
+# Графики дашборда зависят только от содержимого хранилища (content_version одинакова
+# у worker'ов с одинаковыми данными): счётчик интервала в ключ не входит,
+# поэтому все открытые вкладки получают одно вычисление на обновление
+_dashboard_cache = CALLBACK_CACHE.memoize(
+    "dashboard", version=lambda: RESULTS_STORE.content_version, key=lambda n: None,
+)
+# Отметки влияния зависят ещё и от графа lineage
+_impact_cache = CALLBACK_CACHE.memoize(
+    "dashboard", version=lambda: (RESULTS_STORE.content_version, LINEAGE.version), key=lambda n: None,
+)
+
 
 def create_kpi_card(title, value, icon, color, delta=None):
     """Создание KPI карточки"""
@@ -46,36 +58,35 @@ def create_kpi_card(title, value, icon, color, delta=None):
     ], className="shadow-sm h-100")
 
 
+# Слой узла полного графа -- по схеме таблицы
+_SCHEMA_LAYERS = {"src": "source", "staging": "staging", "dwh": "dwh", "mart": "mart"}
+
+
+def _schema_layer(table_name):
+    schema = table_name.split(".")[0] if "." in table_name else "other"
+    return _SCHEMA_LAYERS.get(schema, "other")
+
+
 def _build_full_lineage_graph():
-    """Построение полного графа связей для дашборда."""
-    elements = []
-    nodes = set()
-    
-    for table_name, info in LINEAGE_GRAPH.items():
-        nodes.add(table_name)
-        for src in info.get("sources", []):
-            nodes.add(src)
-        for tgt in info.get("targets", []):
-            nodes.add(tgt)
-    
-    # Определяем слой по схеме
-    for node in nodes:
-        schema = node.split(".")[0] if "." in node else "other"
-        layer_map = {"src": "source", "staging": "staging", "dwh": "dwh", "mart": "mart"}
-        layer = layer_map.get(schema, "other")
-        elements.append({"data": {"id": node, "label": node.split(".")[-1], "full_name": node, "layer": layer}})
-    
-    for table_name, info in LINEAGE_GRAPH.items():
-        for src in info.get("sources", []):
-            elements.append({"data": {"source": src, "target": table_name}})
-        for tgt in info.get("targets", []):
-            elements.append({"data": {"source": table_name, "target": tgt}})
-    
-    return elements
+    """Построение полного графа связей для дашборда (с отметками анализа влияния)."""
+    return IMPACT.overlay(LINEAGE.graph_elements(layer=_schema_layer))
+
+
+def _impact_summary():
+    """Строка под графом: падающие таблицы и таблицы под риском."""
+    failing, at_risk = IMPACT.failing_tables(), IMPACT.at_risk()
+    if not failing:
+        return html.Small("Падающих проверок нет -- таблиц под риском нет.", className="text-muted")
+    return html.Small([
+        html.Strong(f"Падают: {len(failing)}", className="text-danger me-3"),
+        html.Strong(f"Под риском: {len(at_risk)}", className="text-warning me-2"),
+        html.Span(", ".join(sorted(at_risk)[:10]) + (" ..." if len(at_risk) > 10 else ""),
+                  className="text-muted"),
+    ])
 
 
 def layout():
-    stats = get_dashboard_stats(MOCK_RESULTS)
+    stats = get_dashboard_stats(RESULTS_CUBE)
     
     return dbc.Container([
         # Заголовок
@@ -229,6 +240,17 @@ def layout():
                                     "curve-style": "bezier", "target-arrow-shape": "triangle",
                                     "target-arrow-color": "#adb5bd", "line-color": "#adb5bd", "width": 1.5,
                                 }},
+                            
+                                # Анализ влияния: падающие таблицы и их потребители под риском
+                                {"selector": 'node[impact = "failing"]', "style": {
+                                    "border-width": "3px", "border-color": "#dc3545",
+                                }},
+                                {"selector": 'node[impact = "at_risk"]', "style": {
+                                    "border-width": "3px", "border-color": "#fd7e14", "border-style": "dashed",
+                                }},
+                                {"selector": 'edge[impact = "impact"]', "style": {
+                                    "line-color": "#fd7e14", "target-arrow-color": "#fd7e14", "width": 2.5,
+                                }},
                             ],
                         ),
                         html.Div([
@@ -236,7 +258,10 @@ def layout():
                             dbc.Badge("staging", color="info", className="me-2"),
                             dbc.Badge("dwh", color="primary", className="me-2"),
                             dbc.Badge("mart", color="success", className="me-2"),
+                            dbc.Badge("падает", color="light", text_color="danger", className="me-2 border border-danger"),
+                            dbc.Badge("под риском", color="light", text_color="warning", className="me-2 border border-warning"),
                         ], className="mt-2"),
+                        html.Div(_impact_summary(), id="dashboard-impact-summary", className="mt-2"),
                     ])
                 ], className="shadow-sm")
             ]),
@@ -278,12 +303,25 @@ def update_widget_visibility(values):
     )
 
 
+@callback(
+    Output("interval-component", "n_intervals"),
+    Input("btn-refresh", "n_clicks"),
+    State("interval-component", "n_intervals"),
+    prevent_initial_call=True
+)
+def refresh_dashboard(n_clicks, n_intervals):
+    """Кнопка «Обновить»: сбрасываем кэш графиков и перезапускаем их колбэки."""
+    CALLBACK_CACHE.invalidate("dashboard")
+    return (n_intervals or 0) + 1
+
+
 @callback(
     Output("trend-chart", "figure"),
     Input("interval-component", "n_intervals")
 )
+@_dashboard_cache
 def update_trend_chart(n):
-    trend_data = get_trend_data(MOCK_RESULTS, days=30)
+    trend_data = get_trend_data(RESULTS_CUBE, days=30)
     
     fig = px.area(
         trend_data, x="run_date", y="count", color="check_status_name",
@@ -302,9 +340,11 @@ def update_trend_chart(n):
     Output("type-chart", "figure"),
     Input("interval-component", "n_intervals")
 )
+@_dashboard_cache
 def update_type_chart(n):
-    latest = MOCK_RESULTS.sort_values("run_datetime").drop_duplicates(subset=["check_id"], keep="last")
-    type_summary = latest.groupby("check_type_name")["check_status_name"].value_counts().unstack(fill_value=0)
+    type_summary = RESULTS_CUBE.latest_counts(["check_type_name", "check_status_name"]).pivot_table(
+        index="check_type_name", columns="check_status_name", values="count", fill_value=0, observed=True,
+    )
     
     fig = go.Figure(data=[
         go.Pie(labels=type_summary.index, values=type_summary.sum(axis=1), hole=0.4,
@@ -318,8 +358,9 @@ def update_type_chart(n):
     Output("domain-chart", "figure"),
     Input("interval-component", "n_intervals")
 )
+@_dashboard_cache
 def update_domain_chart(n):
-    domain_data = get_checks_by_domain(MOCK_RESULTS)
+    domain_data = get_checks_by_domain(RESULTS_CUBE)
     
     fig = px.bar(
         domain_data, x="domain", y="count", color="check_status_name", barmode="group",
@@ -337,9 +378,10 @@ def update_domain_chart(n):
     Output("recent-issues", "children"),
     Input("interval-component", "n_intervals")
 )
+@_dashboard_cache
 def update_recent_runs(n):
     """Показываем все последние запуски (не только FAIL/ERROR)."""
-    recent = MOCK_RESULTS.sort_values("run_datetime", ascending=False).head(8)
+    recent = RESULTS_STORE.take(RESULTS_STORE.newest_positions(8))
     
     if recent.empty:
         return html.P("Нет данных", className="text-muted")
@@ -368,6 +410,29 @@ def update_recent_runs(n):
     return dbc.ListGroup(items, flush=True)
 
 
+def _impact_badges(table_name):
+    """Флаг «под риском» таблицы с перечнем падающих источников."""
+    sources = IMPACT.risk_sources(table_name)
+    if not sources:
+        return []
+    return [dbc.Badge(
+        [html.I(className="fas fa-exclamation-triangle me-1"), "Под риском"],
+        color="warning", className="ms-2", title="Падают проверки источников: " + ", ".join(sources),
+    )]
+
+
+@callback(
+    [Output("dashboard-graph", "elements"),
+     Output("dashboard-impact-summary", "children")],
+    Input("interval-component", "n_intervals"),
+    prevent_initial_call=True,
+)
+@_impact_cache
+def update_impact_overlay(n):
+    """Обновление отметок анализа влияния на графе связей."""
+    return _build_full_lineage_graph(), _impact_summary()
+
+
 @callback(
     Output("health-object-detail", "children"),
     Input("health-object-filter", "value"),
@@ -377,12 +442,13 @@ def update_health_detail(table_name):
     if not table_name:
         # Общая сводка по доменам
         domain_health = []
+        domain_counts = get_checks_by_domain(RESULTS_CUBE)
         for domain in DOMAINS:
-            domain_results = MOCK_RESULTS[MOCK_RESULTS["domain"] == domain]
+            domain_results = domain_counts[domain_counts["domain"] == domain]
             if domain_results.empty:
                 continue
-            total = len(domain_results)
-            ok = len(domain_results[domain_results["check_status_name"] == "OK"])
+            total = int(domain_results["count"].sum())
+            ok = int(domain_results.loc[domain_results["check_status_name"] == "OK", "count"].sum())
             rate = round(ok / total * 100, 1) if total > 0 else 0
             color = "success" if rate >= 90 else "warning" if rate >= 70 else "danger"
             domain_health.append(
@@ -399,15 +465,17 @@ def update_health_detail(table_name):
         return dbc.Row(domain_health, className="g-3")
     
     # Детализация по конкретному объекту
-    obj_results = MOCK_RESULTS[MOCK_RESULTS["table_name"] == table_name].sort_values("run_datetime", ascending=False)
+    obj_counts = RESULTS_CUBE.counts(
+        ["check_status_name"], table_name=table_name
+    ).set_index("check_status_name")["count"]
     
-    if obj_results.empty:
+    if obj_counts.sum() == 0:
         return dbc.Alert(f"Нет данных по объекту {table_name}", color="info")
     
-    total = len(obj_results)
-    ok = len(obj_results[obj_results["check_status_name"] == "OK"])
-    fail = len(obj_results[obj_results["check_status_name"] == "FAIL"])
-    error = len(obj_results[obj_results["check_status_name"] == "ERROR"])
+    total = int(obj_counts.sum())
+    ok = int(obj_counts.get("OK", 0))
+    fail = int(obj_counts.get("FAIL", 0))
+    error = int(obj_counts.get("ERROR", 0))
     rate = round(ok / total * 100, 1) if total > 0 else 0
     color = "success" if rate >= 90 else "warning" if rate >= 70 else "danger"
     
@@ -428,7 +496,7 @@ def update_health_detail(table_name):
         dbc.Col([
             dbc.Card([
                 dbc.CardBody([
-                    html.H5(table_name, className="mb-2"),
+                    html.H5([table_name, *_impact_badges(table_name)], className="mb-2"),
                     dbc.Progress(value=rate, color=color, className="mb-2", style={"height": "12px"}),
                     dbc.Row([
                         dbc.Col([html.Span("Успешность: ", className="text-muted"), html.Strong(f"{rate}%", className=f"text-{color}")]),
@@ -6,12 +6,18 @@ from dash import html, dcc, callback, Input, Output, State
 import dash_bootstrap_components as dbc
 import dash_ag_grid as dag
 import plotly.express as px
-from datetime import datetime, timedelta
-from mock_data import MOCK_RESULTS, DOMAINS, SCHEMAS, TABLES_BY_SCHEMA
-import io
+import pandas as pd
+from datetime import datetime
+from mock_data import RESULTS_STORE, RESULTS_CUBE, CHECKS_SEARCH, DOMAINS, SCHEMAS, TABLES_BY_SCHEMA
+from services.results_store import DIMENSIONS
+from services.export import register_export, export_url
+from services.export_jobs import EXPORT_JOBS, EXPORT_BACKGROUND_ROWS
 
 dash.register_page(__name__, path="/results", name="История")
 
+# Размер блока строк, запрашиваемого гридом за один раз
+RESULTS_BLOCK_SIZE = 100
+
 
 def layout():
     return dbc.Container([
@@ -20,7 +26,7 @@ def layout():
             dbc.Col([
                 html.H2("История результатов", className="mb-0"),
                 html.P("Все результаты проверок качества данных", className="text-muted"),
-            ], width=8),
+            ], width=6),
             dbc.Col([
                 dbc.Button([
                     html.I(className="fas fa-file-csv me-2"),
@@ -30,10 +36,17 @@ def layout():
                     html.I(className="fas fa-file-excel me-2"),
                     "Экспорт Excel"
                 ], id="btn-export-excel", color="outline-success"),
-                dcc.Download(id="download-results"),
-            ], width=4, className="text-end"),
+                dbc.DropdownMenu([
+                    dbc.DropdownMenuItem("Parquet", id="btn-export-parquet"),
+                    dbc.DropdownMenuItem("Arrow IPC", id="btn-export-arrow"),
+                ], label="Для аналитики", color="outline-secondary", className="d-inline-block ms-2"),
+                html.Iframe(id="download-results", style={"display": "none"}),
+            ], width=6, className="text-end"),
         ], className="mb-4 align-items-center"),
         
+        # Прогресс фоновой выгрузки
+        html.Div(id="export-job-status", className="mb-3"),
+        
         # Фильтры
         dbc.Card([
             dbc.CardBody([
@@ -150,7 +163,7 @@ def layout():
             id="results-grid",
             columnDefs=[
                 {"field": "run_datetime", "headerName": "Время", "width": 160,
-                 "sort": "desc",
+                 "sort": "desc", "filter": False,
                  "valueFormatter": {"function": "d3.timeFormat('%d.%m.%Y %H:%M')(new Date(params.value))"}},
                 {"field": "check_name", "headerName": "Проверка", "width": 250,
                  "cellRenderer": "CheckLinkRenderer"},
@@ -159,22 +172,35 @@ def layout():
                 {"field": "domain", "headerName": "Домен", "width": 120},
                 {"field": "check_status_name", "headerName": "Статус", "width": 100,
                  "cellRenderer": "StatusRenderer"},
-                {"field": "execution_time_sec", "headerName": "Время (с)", "width": 100},
+                {"field": "execution_time_sec", "headerName": "Время (с)", "width": 100,
+                 "filter": "agNumberColumnFilter"},
                 {"field": "rows_checked", "headerName": "Строк", "width": 110,
+                 "filter": "agNumberColumnFilter",
                  "valueFormatter": {"function": "params.value ? params.value.toLocaleString() : '-'"}},
-                {"field": "rows_failed", "headerName": "Ошибок", "width": 100},
+                {"field": "rows_failed", "headerName": "Ошибок", "width": 100,
+                 "filter": "agNumberColumnFilter"},
                 {"field": "owner", "headerName": "Владелец", "width": 120},
             ],
             defaultColDef={"sortable": True, "resizable": True, "filter": True},
+            # Infinite row model: сервер отдаёт только видимый блок строк
+            rowModelType="infinite",
             dashGridOptions={
                 "pagination": True,
                 "paginationPageSize": 20,
+                "cacheBlockSize": RESULTS_BLOCK_SIZE,
+                "maxBlocksInCache": 10,
                 "animateRows": True,
             },
             style={"height": "500px"},
             className="ag-theme-alpine",
         ),
         
+        # Текущие значения фильтров страницы для запросов блоков грида
+        dcc.Store(id="results-query"),
+        # Фоновое задание выгрузки и опрос его прогресса
+        dcc.Store(id="export-job"),
+        dcc.Interval(id="export-job-interval", interval=1000, disabled=True),
+        
     ], fluid=True, className="py-3")
 
 
@@ -193,8 +219,112 @@ def update_result_tables_dropdown(schema):
     return options, False, ""
 
 
+def _filter_results(period, status, domain, schema, table, search):
+    """Маска истории результатов по фильтрам страницы."""
+    days = int(period) if period else 7
+    return RESULTS_STORE.mask(
+        period_days=days, status=status, domain=domain, schema=schema, table=table,
+        check_id=CHECKS_SEARCH.search(search) if search else None,
+    )
+
+
+def _count_results(by, period, status, domain, schema, table, search):
+    """Количество результатов по измерениям: из куба агрегатов, а при поиске -- по хранилищу."""
+    if search:
+        mask = _filter_results(period, status, domain, schema, table, search)
+        return RESULTS_STORE.count_by(mask, by)
+    days = int(period) if period else 7
+    return RESULTS_CUBE.counts(
+        by, period_days=days, status=status, domain=domain, schema=schema, table=table,
+    )
+
+
+# Операторы числового фильтра AG Grid
+_NUMBER_FILTERS = {
+    "equals": lambda s, v, v2: s == v,
+    "notEqual": lambda s, v, v2: s != v,
+    "greaterThan": lambda s, v, v2: s > v,
+    "greaterThanOrEqual": lambda s, v, v2: s >= v,
+    "lessThan": lambda s, v, v2: s < v,
+    "lessThanOrEqual": lambda s, v, v2: s <= v,
+    "inRange": lambda s, v, v2: (s >= v) & (s <= v2),
+    "blank": lambda s, v, v2: s.isna(),
+    "notBlank": lambda s, v, v2: s.notna(),
+}
+
+# Операторы текстового фильтра AG Grid
+_TEXT_FILTERS = {
+    "contains": lambda s, v: s.str.contains(v, regex=False, na=False),
+    "notContains": lambda s, v: ~s.str.contains(v, regex=False, na=False),
+    "equals": lambda s, v: s == v,
+    "notEqual": lambda s, v: s != v,
+    "startsWith": lambda s, v: s.str.startswith(v, na=False),
+    "endsWith": lambda s, v: s.str.endswith(v, na=False),
+    "blank": lambda s, v: s.isna() | (s == ""),
+    "notBlank": lambda s, v: s.notna() & (s != ""),
+}
+
+
+def _column_filter_mask(series, model):
+    """Маска для одного условия (или группы условий) фильтра колонки."""
+    if "conditions" in model:
+        masks = [_column_filter_mask(series, cond) for cond in model["conditions"]]
+        mask = masks[0]
+        for m in masks[1:]:
+            mask = (mask | m) if model.get("operator") == "OR" else (mask & m)
+        return mask
+    
+    op = model.get("type", "contains")
+    if model.get("filterType") == "number":
+        func = _NUMBER_FILTERS.get(op)
+        if func is None:
+            return pd.Series(True, index=series.index)
+        return func(series, model.get("filter"), model.get("filterTo"))
+    
+    func = _TEXT_FILTERS.get(op)
+    if func is None:
+        return pd.Series(True, index=series.index)
+    value = str(model.get("filter") or "").lower()
+    return func(series.astype(str).str.lower(), value)
+
+
+# Колонки грида, по которым возможны фильтр и сортировка на сервере
+_GRID_NUMERIC = ["execution_time_sec", "rows_checked", "rows_failed"]
+_GRID_SORTABLE = DIMENSIONS + _GRID_NUMERIC + ["run_datetime"]
+
+
+def _grid_filter_mask(positions, col, model):
+    """Маска фильтра колонки грида для выбранных строк хранилища."""
+    if col in DIMENSIONS:
+        # Текстовый фильтр считаем по словарю значений, а не по строкам
+        mask = RESULTS_STORE.categories_mask(col, lambda cats: _column_filter_mask(pd.Series(cats), model))
+        return mask[positions]
+    values = pd.Series(RESULTS_STORE.column(col)[positions])
+    return _column_filter_mask(values, model).to_numpy()
+
+
+def _apply_grid_request(positions, request):
+    """Применяет фильтры и сортировку колонок грида, возвращает срез блока."""
+    for col, model in (request.get("filterModel") or {}).items():
+        if col in DIMENSIONS or col in _GRID_NUMERIC:
+            positions = positions[_grid_filter_mask(positions, col, model)]
+    
+    sort_model = request.get("sortModel") or [{"colId": "run_datetime", "sort": "desc"}]
+    sort_model = [s for s in sort_model if s.get("colId") in _GRID_SORTABLE]
+    if sort_model:
+        positions = RESULTS_STORE.sort_positions(
+            positions,
+            [s["colId"] for s in sort_model],
+            [s.get("sort") != "desc" for s in sort_model],
+        )
+    
+    start = request.get("startRow") or 0
+    end = request.get("endRow") or start + RESULTS_BLOCK_SIZE
+    return RESULTS_STORE.take(positions[start:end]), len(positions)
+
+
 @callback(
-    [Output("results-grid", "rowData"),
+    [Output("results-query", "data"),
      Output("results-summary", "children"),
      Output("results-timeline", "figure")],
     [Input("filter-period", "value"),
@@ -205,44 +335,14 @@ def update_result_tables_dropdown(schema):
      Input("search-results", "value")]
 )
 def update_results(period, status, domain, schema, table, search):
-    df = MOCK_RESULTS.copy()
-    
-    # Фильтр по периоду
-    days = int(period) if period else 7
-    cutoff_date = (datetime.now() - timedelta(days=days)).date()
-    df = df[df["run_date"] >= cutoff_date]
-    
-    # Фильтр по статусу
-    if status:
-        df = df[df["check_status_name"] == status]
-    
-    # Фильтр по домену
-    if domain:
-        df = df[df["domain"] == domain]
-    
-    # Фильтр по схеме и таблице
-    if schema and table:
-        full_table = f"{schema}.{table}"
-        df = df[df["table_name"] == full_table]
-    elif schema:
-        df = df[df["table_name"].str.startswith(f"{schema}.")]
-    
-    # Поиск
-    if search:
-        search = search.lower()
-        df = df[
-            df["check_name"].str.lower().str.contains(search, na=False) |
-            df["table_name"].str.lower().str.contains(search, na=False)
-        ]
-    
-    # Сортировка
-    df = df.sort_values("run_datetime", ascending=False)
+    filters = (period, status, domain, schema, table, search)
     
     # Сводка
-    total = len(df)
-    ok_count = len(df[df["check_status_name"] == "OK"])
-    fail_count = len(df[df["check_status_name"] == "FAIL"])
-    error_count = len(df[df["check_status_name"] == "ERROR"])
+    status_counts = _count_results(["check_status_name"], *filters).set_index("check_status_name")["count"]
+    total = int(status_counts.sum())
+    ok_count = int(status_counts.get("OK", 0))
+    fail_count = int(status_counts.get("FAIL", 0))
+    error_count = int(status_counts.get("ERROR", 0))
     
     summary = dbc.Row([
         dbc.Col([
@@ -264,7 +364,7 @@ def update_results(period, status, domain, schema, table, search):
     ], className="g-4")
     
     # Timeline график
-    timeline_data = df.groupby(["run_date", "check_status_name"]).size().reset_index(name="count")
+    timeline_data = _count_results(["run_date", "check_status_name"], *filters)
     
     fig = px.bar(
         timeline_data,
@@ -287,13 +387,85 @@ def update_results(period, status, domain, schema, table, search):
         bargap=0.1,
     )
     
-    return df.to_dict("records"), summary, fig
+    query = {
+        "period": period, "status": status, "domain": domain,
+        "schema": schema, "table": table, "search": search,
+    }
+    return query, summary, fig
 
 
 @callback(
-    Output("download-results", "data"),
+    Output("results-grid", "getRowsResponse"),
+    Input("results-grid", "getRowsRequest"),
+    State("results-query", "data"),
+    prevent_initial_call=True
+)
+def get_results_rows(request, query):
+    """Отдаёт гриду только запрошенный блок строк (infinite row model)."""
+    if not request:
+        return dash.no_update
+    query = query or {}
+    mask = _filter_results(
+        query.get("period"), query.get("status"), query.get("domain"),
+        query.get("schema"), query.get("table"), query.get("search"),
+    )
+    block, row_count = _apply_grid_request(RESULTS_STORE.positions(mask), request)
+    return {"rowData": block.to_dict("records"), "rowCount": row_count}
+
+
+# При смене фильтров сбрасываем кэш блоков грида -- он перезапросит данные
+dash.clientside_callback(
+    """
+    function(query) {
+        if (window.dash_ag_grid && window.dash_ag_grid.getApiAsync) {
+            window.dash_ag_grid.getApiAsync("results-grid").then(function(api) {
+                api.purgeInfiniteCache();
+            });
+        }
+        return window.dash_clientside.no_update;
+    }
+    """,
+    Output("results-grid", "scrollTo"),
+    Input("results-query", "data"),
+    prevent_initial_call=True
+)
+
+
+# Колонки выгрузки и их заголовки
+EXPORT_COLUMNS = {
+    "run_datetime": "Время",
+    "check_name": "Проверка",
+    "table_name": "Таблица",
+    "check_type_name": "Тип",
+    "domain": "Домен",
+    "check_status_name": "Статус",
+    "execution_time_sec": "Время выполнения (сек)",
+    "rows_checked": "Строк проверено",
+    "rows_failed": "Строк с ошибками",
+    "owner": "Владелец",
+}
+
+_EXPORT_FILTERS = ["period", "status", "domain", "schema", "table", "search"]
+
+
+def _export_positions(params):
+    """Строки выгрузки по параметрам запроса (те же фильтры, что и на странице)."""
+    mask = _filter_results(*(params.get(name) for name in _EXPORT_FILTERS))
+    return RESULTS_STORE.sort_positions(RESULTS_STORE.positions(mask), "run_ts", ascending=False)
+
+
+register_export("results", RESULTS_STORE, _export_positions, EXPORT_COLUMNS, "dqt_results")
+
+
+@callback(
+    [Output("download-results", "src"),
+     Output("export-job", "data"),
+     Output("export-job-interval", "disabled"),
+     Output("export-job-status", "children")],
     [Input("btn-export-csv", "n_clicks"),
-     Input("btn-export-excel", "n_clicks")],
+     Input("btn-export-excel", "n_clicks"),
+     Input("btn-export-parquet", "n_clicks"),
+     Input("btn-export-arrow", "n_clicks")],
     [State("filter-period", "value"),
      State("filter-result-status", "value"),
      State("filter-result-domain", "value"),
@@ -302,66 +474,63 @@ def update_results(period, status, domain, schema, table, search):
      State("search-results", "value")],
     prevent_initial_call=True
 )
-def export_results(n_csv, n_excel, period, status, domain, schema, table, search):
+def export_results(n_csv, n_excel, n_parquet, n_arrow, period, status, domain, schema, table, search):
+    """Файл формирует потоковый endpoint, большие выгрузки -- фоновое задание."""
     from dash import ctx
     
-    # Получаем отфильтрованные данные
-    df = MOCK_RESULTS.copy()
-    
-    # Применяем те же фильтры
-    days = int(period) if period else 7
-    cutoff_date = (datetime.now() - timedelta(days=days)).date()
-    df = df[df["run_date"] >= cutoff_date]
-    
-    if status:
-        df = df[df["check_status_name"] == status]
-    
-    if domain:
-        df = df[df["domain"] == domain]
-    
-    # Фильтр по схеме и таблице
-    if schema and table:
-        full_table = f"{schema}.{table}"
-        df = df[df["table_name"] == full_table]
-    elif schema:
-        df = df[df["table_name"].str.startswith(f"{schema}.")]
-    
-    if search:
-        search = search.lower()
-        df = df[
-            df["check_name"].str.lower().str.contains(search, na=False) |
-            df["table_name"].str.lower().str.contains(search, na=False)
-        ]
-    
-    df = df.sort_values("run_datetime", ascending=False)
-    
-    # Выбираем колонки для экспорта
-    export_cols = [
-        "run_datetime", "check_name", "table_name", "check_type_name",
-        "domain", "check_status_name", "execution_time_sec", 
-        "rows_checked", "rows_failed", "owner"
-    ]
-    export_df = df[export_cols].copy()
-    export_df.columns = [
-        "Время", "Проверка", "Таблица", "Тип",
-        "Домен", "Статус", "Время выполнения (сек)",
-        "Строк проверено", "Строк с ошибками", "Владелец"
-    ]
-    
-    triggered = ctx.triggered_id
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    formats = {
+        "btn-export-csv": "csv", "btn-export-excel": "xlsx",
+        "btn-export-parquet": "parquet", "btn-export-arrow": "arrow",
+    }
+    fmt = formats.get(ctx.triggered_id)
+    if fmt is None:
+        return dash.no_update, dash.no_update, dash.no_update, dash.no_update
     
-    if triggered == "btn-export-csv":
-        return dcc.send_data_frame(
-            export_df.to_csv, 
-            f"dqt_results_{timestamp}.csv",
-            index=False
-        )
-    elif triggered == "btn-export-excel":
-        return dcc.send_data_frame(
-            export_df.to_excel,
-            f"dqt_results_{timestamp}.xlsx",
-            index=False
-        )
+    params = dict(zip(_EXPORT_FILTERS, (period, status, domain, schema, table, search)))
+    rows = int(_filter_results(period, status, domain, schema, table, search).sum())
+    if rows > EXPORT_BACKGROUND_ROWS:
+        job_id = EXPORT_JOBS.submit("results", fmt, params)
+        return dash.no_update, job_id, False, _export_job_progress(EXPORT_JOBS.status(job_id))
     
-    return None
+    # Метка времени делает адрес уникальным -- повторный клик снова скачивает файл
+    params["ts"] = datetime.now().strftime("%Y%m%d%H%M%S%f")
+    return dash.get_relative_path(export_url("results", fmt, params)), None, True, None
+
+
+def _export_job_progress(state):
+    """Блок прогресса фонового задания выгрузки."""
+    if state is None:
+        return dbc.Alert("Задание выгрузки не найдено или устарело", color="warning", dismissable=True)
+    if state["status"] == "failed":
+        return dbc.Alert(f"Ошибка выгрузки: {state.get('error', '')}", color="danger", dismissable=True)
+    total = state["total"]
+    percent = round(state["done"] / total * 100) if total else 0
+    if state["status"] == "done":
+        return dbc.Alert([
+            html.I(className="fas fa-check-circle me-2"),
+            f"Выгрузка готова: {state['filename']} ({total:,} строк)",
+        ], color="success", dismissable=True)
+    label = "В очереди" if state["status"] == "queued" else f"{state['done']:,} из {total:,} строк"
+    return html.Div([
+        html.Small(f"Фоновая выгрузка {state['filename']}: {label}", className="text-muted"),
+        dbc.Progress(value=percent, label=f"{percent}%", striped=True, animated=True, className="mt-1"),
+    ])
+
+
+@callback(
+    [Output("export-job-status", "children", allow_duplicate=True),
+     Output("export-job-interval", "disabled", allow_duplicate=True),
+     Output("download-results", "src", allow_duplicate=True)],
+    Input("export-job-interval", "n_intervals"),
+    State("export-job", "data"),
+    prevent_initial_call=True
+)
+def poll_export_job(n, job_id):
+    """Опрос прогресса фоновой выгрузки; готовый файл скачивается автоматически."""
+    state = EXPORT_JOBS.status(job_id)
+    progress = _export_job_progress(state)
+    if state is None or state["status"] == "failed":
+        return progress, True, dash.no_update
+    if state["status"] == "done":
+        return progress, True, dash.get_relative_path(f"/export/jobs/{job_id}")
+    return progress, False, dash.no_update
@@ -6,10 +6,57 @@ from dash import html, dcc, callback, Input, Output, State, ctx
 import dash_bootstrap_components as dbc
 import dash_ag_grid as dag
 from mock_data import MOCK_CHECK_TEMPLATES, CHECK_TYPES, OWNERS
+from services.connections import CONNECTIONS
+from services.pool import CONNECTION_POOLS
 
 dash.register_page(__name__, path="/settings", name="Настройки")
 
 
+def _pool_status(stats):
+    if stats["waiting"]:
+        return "text-warning", f"Ожидают: {stats['waiting']}"
+    if stats["size"]:
+        return "text-success", "Подключено"
+    return "text-muted", "Нет открытых подключений"
+
+
+def _connection_item(icon, title, address, status_class, status, details=None):
+    return dbc.ListGroupItem([
+        dbc.Row([
+            dbc.Col([
+                html.I(className=f"fas {icon} me-2"),
+                html.Strong(title),
+                html.Span(f" - {address}", className="text-muted ms-2"),
+            ], width=5),
+            dbc.Col([
+                html.Span("●", className=f"{status_class} me-1"),
+                html.Small(status, className=status_class),
+            ], width=2),
+            dbc.Col(details, width=3),
+            dbc.Col([dbc.Button("Настроить", size="sm", color="outline-primary")], width=2, className="text-end"),
+        ]),
+    ])
+
+
+def _connections_list():
+    """Подключения из CONNECTIONS со статистикой их пулов и Airflow."""
+    pool_stats = CONNECTION_POOLS.stats()
+    items = []
+    for name, connection in CONNECTIONS.items():
+        stats = pool_stats[name]
+        items.append(_connection_item(
+            connection["icon"], connection["title"], connection["address"], *_pool_status(stats),
+            html.Small([
+                f"Занято {stats['in_use']} · свободно {stats['idle']} из {stats['max_size']}",
+                html.Br(),
+                f"Ожидание: ср. {stats['wait_avg_ms']:.1f} мс, макс. {stats['wait_max_ms']:.1f} мс",
+            ], className="text-muted"),
+        ))
+    items.append(_connection_item("fa-cogs text-warning", "Airflow", "airflow.internal:8080",
+                                  "text-success", "Подключено"))
+    return dbc.ListGroup(items)
+
+
 def layout():
     # Данные шаблонов для AG Grid
     templates_data = []
@@ -125,51 +172,11 @@ def layout():
             dbc.Tab([
                 dbc.Card([
                     dbc.CardBody([
-                        html.H5("Подключения к источникам данных", className="mb-3"),
-                        dbc.ListGroup([
-                            dbc.ListGroupItem([
-                                dbc.Row([
-                                    dbc.Col([
-                                        html.I(className="fas fa-database text-primary me-2"),
-                                        html.Strong("Greenplum GP100"),
-                                        html.Span(" - gp100.dwh.local:5432", className="text-muted ms-2"),
-                                    ], width=7),
-                                    dbc.Col([
-                                        html.Span("●", className="text-success me-1"),
-                                        html.Small("Подключено", className="text-success"),
-                                    ], width=2),
-                                    dbc.Col([dbc.Button("Настроить", size="sm", color="outline-primary")], width=3, className="text-end"),
-                                ]),
-                            ]),
-                            dbc.ListGroupItem([
-                                dbc.Row([
-                                    dbc.Col([
-                                        html.I(className="fas fa-database text-info me-2"),
-                                        html.Strong("PostgreSQL PG226"),
-                                        html.Span(" - pg226.meta.local:5432", className="text-muted ms-2"),
-                                    ], width=7),
-                                    dbc.Col([
-                                        html.Span("●", className="text-success me-1"),
-                                        html.Small("Подключено", className="text-success"),
-                                    ], width=2),
-                                    dbc.Col([dbc.Button("Настроить", size="sm", color="outline-primary")], width=3, className="text-end"),
-                                ]),
-                            ]),
-                            dbc.ListGroupItem([
-                                dbc.Row([
-                                    dbc.Col([
-                                        html.I(className="fas fa-cogs text-warning me-2"),
-                                        html.Strong("Airflow"),
-                                        html.Span(" - airflow.internal:8080", className="text-muted ms-2"),
-                                    ], width=7),
-                                    dbc.Col([
-                                        html.Span("●", className="text-success me-1"),
-                                        html.Small("Подключено", className="text-success"),
-                                    ], width=2),
-                                    dbc.Col([dbc.Button("Настроить", size="sm", color="outline-primary")], width=3, className="text-end"),
-                                ]),
-                            ]),
-                        ]),
+                        html.H5("Подключения к источникам данных", className="mb-1"),
+                        html.P("Пулы подключений: занятые и свободные подключения, ожидание свободного подключения.",
+                               className="text-muted small"),
+                        html.Div(_connections_list(), id="connections-pool-list"),
+                        dcc.Interval(id="connections-pool-interval", interval=5000, disabled=True),
                     ])
                 ], className="mt-3")
             ], label="Подключения", tab_id="tab-connections"),
@@ -394,3 +401,21 @@ def handle_template_actions(n_save, n_delete, name):
         return True, "Шаблон удалён", "Удаление", "warning"
     
     return False, "", "", ""
+
+
+@callback(
+    Output("connections-pool-interval", "disabled"),
+    Input("settings-tabs", "active_tab"),
+)
+def toggle_pool_stats(active_tab):
+    """Статистика пулов обновляется, только пока открыта вкладка подключений."""
+    return active_tab != "tab-connections"
+
+
+@callback(
+    Output("connections-pool-list", "children"),
+    Input("connections-pool-interval", "n_intervals"),
+    prevent_initial_call=True,
+)
+def update_pool_stats(n):
+    return _connections_list()
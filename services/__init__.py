@@ -0,0 +1 @@
+# DQT Services
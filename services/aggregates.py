@@ -0,0 +1,198 @@
+"""
+Материализованный куб агрегатов результатов по дням.
+
+Ключ куба: (день, статус, домен, тип проверки, таблица, владелец) --
+коды измерений хранилища результатов. Для каждого ключа хранятся
+число запусков, сумма строк с ошибками и суммарное время выполнения.
+Куб подписан на добавление строк в хранилище и обновляет только
+затронутые дни, поэтому графики зависят от числа дней и измерений,
+а не от числа запусков.
+
+Дополнительно куб держит последний результат каждой проверки
+(для графиков «текущего состояния» и анализа влияния).
+"""
+import threading
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+from services.results_store import NS_PER_DAY, day_number
+
+# Измерения ключа куба (кроме дня)
+CUBE_DIMENSIONS = ["check_status_name", "domain", "check_type_name", "table_name", "owner"]
+
+# Агрегируемые метрики
+CUBE_METRICS = ["count", "rows_failed", "execution_time_sec"]
+
+# Уровни куба: полный и свёртка без таблицы/владельца для графиков дашборда.
+# Запрос обслуживается самым компактным уровнем, содержащим нужные измерения.
+CUBE_LEVELS = {
+    "coarse": ["check_status_name", "domain", "check_type_name"],
+    "full": CUBE_DIMENSIONS,
+}
+
+
+class ResultsCube:
+    """Агрегаты результатов по дням с инкрементальным обновлением."""
+
+    def __init__(self, store):
+        self._store = store
+        self._lock = threading.Lock()
+        # уровень -> {run_day -> DataFrame(index=измерения уровня, columns=CUBE_METRICS)}
+        self._days = {level: {} for level in CUBE_LEVELS}
+        self._frames = dict.fromkeys(CUBE_LEVELS)
+        # Последний результат по check_id: номер строки и время запуска
+        self._latest_pos = np.full(0, -1, dtype=np.int64)
+        self._latest_ts = np.full(0, np.iinfo(np.int64).min, dtype=np.int64)
+        self._add_rows(0, len(store))
+        store.subscribe(lambda _store, start, stop: self._add_rows(start, stop))
+
+    # ------------------------------------------------------------
+    # Обновление
+    # ------------------------------------------------------------
+    def _add_rows(self, start, stop):
+        """Добавление в куб строк хранилища из диапазона [start, stop)."""
+        if stop <= start:
+            return
+        store = self._store
+        data = {"run_day": (store.column("run_ts")[start:stop] // NS_PER_DAY).astype(np.int32)}
+        for col in CUBE_DIMENSIONS:
+            data[col] = store.column(col)[start:stop]
+        data["rows_failed"] = store.column("rows_failed")[start:stop]
+        data["execution_time_sec"] = store.column("execution_time_sec")[start:stop].astype(np.float64)
+        delta = pd.DataFrame(data).groupby(["run_day"] + CUBE_DIMENSIONS, sort=False).agg(
+            count=("rows_failed", "size"),
+            rows_failed=("rows_failed", "sum"),
+            execution_time_sec=("execution_time_sec", "sum"),
+        )
+        with self._lock:
+            for level, dims in CUBE_LEVELS.items():
+                rollup = delta if dims == CUBE_DIMENSIONS else delta.groupby(["run_day"] + dims, sort=False).sum()
+                days = self._days[level]
+                for day, part in rollup.groupby(level="run_day", sort=False):
+                    part = part.droplevel("run_day")
+                    current = days.get(day)
+                    if current is not None:
+                        part = current.add(part, fill_value=0).astype(current.dtypes.to_dict())
+                    days[day] = part
+                self._frames[level] = None
+            self._update_latest(start, stop)
+
+    def _update_latest(self, start, stop):
+        store = self._store
+        check_ids = store.column("check_id")[start:stop].astype(np.int64)
+        run_ts = store.column("run_ts")[start:stop]
+        size = int(check_ids.max()) + 1
+        if size > len(self._latest_pos):
+            grow = size - len(self._latest_pos)
+            self._latest_pos = np.r_[self._latest_pos, np.full(grow, -1, dtype=np.int64)]
+            self._latest_ts = np.r_[self._latest_ts, np.full(grow, np.iinfo(np.int64).min, dtype=np.int64)]
+        # Последний запуск каждой проверки внутри добавленного диапазона
+        order = np.lexsort((run_ts, check_ids))
+        ids_sorted = check_ids[order]
+        is_last = np.r_[ids_sorted[1:] != ids_sorted[:-1], True]
+        ids, rows = ids_sorted[is_last], order[is_last]
+        newer = run_ts[rows] >= self._latest_ts[ids]
+        self._latest_ts[ids[newer]] = run_ts[rows[newer]]
+        self._latest_pos[ids[newer]] = rows[newer] + start
+
+    def _all_days(self, level="full"):
+        """Уровень куба целиком одним DataFrame (собирается лениво после обновлений)."""
+        with self._lock:
+            if self._frames[level] is None:
+                days = self._days[level]
+                if days:
+                    frame = pd.concat(days, names=["run_day"]).reset_index()
+                else:
+                    frame = pd.DataFrame(columns=["run_day"] + CUBE_LEVELS[level] + CUBE_METRICS)
+                self._frames[level] = frame
+            return self._frames[level]
+
+    # ------------------------------------------------------------
+    # Запросы
+    # ------------------------------------------------------------
+    def _codes(self, name, value):
+        values = value if isinstance(value, (list, tuple, set)) else [value]
+        return [self._store.code_of(name, v) for v in values]
+
+    def counts(self, by, period_days=None, status=None, domain=None, schema=None,
+               table=None, table_name=None, check_type=None, owner=None):
+        """Агрегаты по измерениям by (допустимо "run_date") с фильтрами.
+
+        Возвращает DataFrame с колонками by + count, rows_failed, execution_time_sec.
+        """
+        by = list(by)
+        needed = {col for col in by if col != "run_date"}
+        needed |= {name for name, value in (("check_status_name", status), ("domain", domain),
+                                            ("check_type_name", check_type), ("owner", owner),
+                                            ("table_name", table_name or schema)) if value}
+        level = next(level for level, dims in CUBE_LEVELS.items() if needed <= set(dims))
+        frame = self._all_days(level)
+        mask = np.ones(len(frame), dtype=bool)
+        if period_days is not None:
+            cutoff = day_number((datetime.now() - timedelta(days=int(period_days))).date())
+            mask &= frame["run_day"].to_numpy() >= cutoff
+        for name, value in (("check_status_name", status), ("domain", domain),
+                            ("check_type_name", check_type), ("owner", owner),
+                            ("table_name", table_name)):
+            if value:
+                mask &= np.isin(frame[name].to_numpy(), self._codes(name, value))
+        if schema and table:
+            mask &= frame["table_name"].to_numpy() == self._store.code_of("table_name", f"{schema}.{table}")
+        elif schema:
+            tables = self._store.categories("table_name")
+            mask &= np.isin(frame["table_name"].to_numpy(), np.flatnonzero(tables.str.startswith(f"{schema}.")))
+
+        keys = ["run_day" if col == "run_date" else col for col in by]
+        result = frame[mask].groupby(keys, sort=True)[CUBE_METRICS].sum().reset_index()
+        result.columns = by + CUBE_METRICS
+        return self._decode(result, by)
+
+    def totals(self, period_days=None, **filters):
+        """Суммарные метрики (count, rows_failed, execution_time_sec) по фильтрам."""
+        result = self.counts(["check_status_name"], period_days=period_days, **filters)
+        return {
+            "total": int(result["count"].sum()),
+            "by_status": result.set_index("check_status_name")["count"].astype(int).to_dict(),
+            "rows_failed": int(result["rows_failed"].sum()),
+            "execution_time_sec": float(result["execution_time_sec"].sum()),
+        }
+
+    def latest_positions(self, since_days=None):
+        """Номера строк хранилища с последним результатом каждой проверки."""
+        with self._lock:
+            positions = self._latest_pos[self._latest_pos >= 0]
+            if since_days is not None:
+                cutoff = day_number((datetime.now() - timedelta(days=int(since_days))).date()) * NS_PER_DAY
+                positions = positions[self._latest_ts[self._latest_pos >= 0] >= cutoff]
+            return positions
+
+    def latest_of(self, check_ids):
+        """Номер строки последнего результата для каждой из проверок (-1 -- результатов нет)."""
+        check_ids = np.asarray(check_ids, dtype=np.int64)
+        with self._lock:
+            known = check_ids < len(self._latest_pos)
+            positions = np.full(len(check_ids), -1, dtype=np.int64)
+            positions[known] = self._latest_pos[check_ids[known]]
+            return positions
+
+    def latest_counts(self, by):
+        """Количество проверок по измерениям их последнего результата."""
+        positions = self.latest_positions()
+        data = {col: self._store.column(col)[positions] for col in by}
+        result = pd.DataFrame(data).value_counts(sort=False).reset_index(name="count")
+        return self._decode(result.sort_values(list(by)).reset_index(drop=True), by)
+
+    def _decode(self, result, by):
+        for col in by:
+            if col == "run_date":
+                result[col] = result[col].to_numpy(dtype=np.int64).astype("datetime64[D]").astype("datetime64[ns]")
+            else:
+                result[col] = pd.Categorical.from_codes(
+                    result[col].to_numpy(dtype=np.int64), self._store.categories(col)
+                )
+        return result
+
+    def __len__(self):
+        return len(self._all_days())
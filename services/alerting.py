@@ -0,0 +1,225 @@
+"""
+Алерты как инциденты: дедупликация повторных падений и подавление «дребезга».
+
+Движок подписан на хранилище результатов и обрабатывает результаты по
+одному в порядке времени запуска, за O(1) на результат:
+
+* FAIL/ERROR проверки без открытого инцидента открывает инцидент (алерт);
+  повторные падения увеличивают счётчик occurrences и last_seen открытого
+  инцидента, новых строк не добавляется;
+* OK закрывает открытый инцидент (status resolved, resolved_at);
+* проверка «дребезжит», если её статус переключался между OK и
+  FAIL/ERROR flap_transitions раз за flap_window. Пока проверка дребезжит,
+  OK не закрывает инцидент, а новые падения не открывают новый -- инцидент
+  помечается flapping и копит счётчики. Когда переключения выходят за
+  окно, следующий OK закрывает инцидент обычным образом.
+
+Для каждой проверки хранится только последний статус и deque из
+flap_transitions последних переключений. Подписчики получают события
+opened / updated (повторное падение) / flapping / resolved: оповещения
+отправляются только по opened и flapping, поэтому проверка, падающая
+каждый час, даёт одно сообщение, а не 24 в день; лента алертов
+обновляется по всем событиям.
+"""
+import threading
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+FAILING_STATUSES = ("FAIL", "ERROR")
+RECOVERY_STATUSES = ("OK",)
+
+# Переключений OK <-> FAIL/ERROR за окно, после которых проверка считается «дребезжащей»
+FLAP_TRANSITIONS = 4
+FLAP_WINDOW = pd.Timedelta(hours=12)
+
+# Поля инцидента, берущиеся из результата, который его открыл
+_RESULT_FIELDS = ("check_name", "table_name", "check_type_name", "domain", "owner", "error_message")
+_RESULT_NUMBERS = ("rows_checked", "rows_failed")
+
+ALERT_COLUMNS = [
+    "alert_id", "check_id", "check_name", "table_name", "domain", "check_status", "severity", "status",
+    "message", "created_at", "last_seen", "occurrences", "flapping",
+    "acknowledged_by", "acknowledged_at", "resolved_at", "owner",
+]
+
+
+def _decode(store, name, start, stop):
+    return store.categories(name).to_numpy(object)[store.column(name)[start:stop]]
+
+
+def _value(value, names):
+    """Значение поля результата: код измерения декодируется (-1 -- пусто), число -- int."""
+    if names is None:
+        return int(value)
+    return str(names[value]) if value >= 0 else None
+
+
+class _CheckState:
+    __slots__ = ("failing", "transitions")
+
+    def __init__(self, transitions):
+        self.failing = False
+        # Время последних переключений статуса, нс
+        self.transitions = deque(maxlen=transitions)
+
+
+class AlertEngine:
+    """Инциденты по проверкам: один открытый инцидент на check_id."""
+
+    def __init__(self, flap_transitions=FLAP_TRANSITIONS, flap_window=FLAP_WINDOW,
+                 failing_statuses=FAILING_STATUSES, recovery_statuses=RECOVERY_STATUSES):
+        self.flap_transitions = flap_transitions
+        self._flap_window_ns = int(pd.Timedelta(flap_window).value)
+        self._failing_statuses = failing_statuses
+        self._recovery_statuses = recovery_statuses
+        self._lock = threading.Lock()
+        # Инциденты в порядке открытия: alert_id = номер + 1
+        self._incidents = []
+        # check_id -> номер открытого инцидента
+        self._open = {}
+        self._states = {}
+        self._listeners = []
+        # Растёт при каждом изменении инцидентов
+        self.version = 0
+
+    def attach(self, store):
+        """Обработка истории хранилища и подписка на новые результаты."""
+        self.consume(store, 0, len(store))
+        store.subscribe(self.consume)
+
+    def subscribe(self, listener):
+        """listener(events): события [(вид, инцидент)] после каждой пачки результатов."""
+        self._listeners.append(listener)
+
+    # ------------------------------------------------------------
+    # Обработка результатов
+    # ------------------------------------------------------------
+    def consume(self, store, start, stop):
+        """Обработка строк хранилища [start, stop) в порядке времени запуска."""
+        if stop <= start:
+            return []
+        check_ids = store.column("check_id")[start:stop].tolist()
+        run_ts = store.column("run_ts")[start:stop]
+        statuses = _decode(store, "check_status_name", start, stop)
+        # Коды и словари полей инцидента -- один раз на пачку, декодируются только для новых инцидентов
+        fields = {
+            col: (store.column(col)[start:stop], store.categories(col).to_numpy(object)) for col in _RESULT_FIELDS
+        }
+        fields.update({col: (store.column(col)[start:stop], None) for col in _RESULT_NUMBERS})
+        order = np.argsort(run_ts, kind="stable").tolist()
+        run_ts = run_ts.tolist()
+        events = []
+        with self._lock:
+            for i in order:
+                event = self._process(check_ids[i], statuses[i], run_ts[i], fields, i)
+                if event is not None:
+                    events.append(event)
+            if events:
+                self.version += 1
+        if events:
+            for listener in self._listeners:
+                listener(events)
+        return events
+
+    def _process(self, check_id, status, ts, fields, position):
+        failing = status in self._failing_statuses
+        if not failing and status not in self._recovery_statuses:
+            return None
+        state = self._states.get(check_id)
+        if state is None:
+            state = self._states[check_id] = _CheckState(self.flap_transitions)
+        if failing != state.failing:
+            state.failing = failing
+            state.transitions.append(ts)
+        transitions = state.transitions
+        flapping = (len(transitions) == transitions.maxlen
+                    and ts - transitions[0] <= self._flap_window_ns)
+
+        index = self._open.get(check_id)
+        incident = self._incidents[index] if index is not None else None
+        if failing:
+            if incident is None:
+                incident = self._open_incident(check_id, status, ts, fields, position)
+                incident["flapping"] = flapping
+                return "opened", dict(incident)
+            incident["occurrences"] += 1
+            incident["last_seen"] = ts
+            incident["check_status"] = status
+            if status == "FAIL":
+                incident["severity"] = "critical"
+            if flapping and not incident["flapping"]:
+                incident["flapping"] = True
+                return "flapping", dict(incident)
+            return "updated", dict(incident)
+        if incident is None:
+            return None
+        if flapping:
+            if not incident["flapping"]:
+                incident["flapping"] = True
+                return "flapping", dict(incident)
+            return None
+        incident["status"] = "resolved"
+        incident["resolved_at"] = ts
+        del self._open[check_id]
+        return "resolved", dict(incident)
+
+    def _open_incident(self, check_id, status, ts, fields, position):
+        fields = {col: _value(values[position], names) for col, (values, names) in fields.items()}
+        incident = {
+            "alert_id": len(self._incidents) + 1,
+            "check_id": check_id,
+            **fields,
+            "check_status": status,
+            "severity": "critical" if status == "FAIL" else "warning",
+            "status": "active",
+            "message": f"Проверка {fields['check_name']} завершилась со статусом {status}",
+            "created_at": ts,
+            "last_seen": ts,
+            "occurrences": 1,
+            "flapping": False,
+            "acknowledged_by": None,
+            "acknowledged_at": None,
+            "resolved_at": None,
+        }
+        self._open[check_id] = len(self._incidents)
+        self._incidents.append(incident)
+        return incident
+
+    # ------------------------------------------------------------
+    # Действия пользователя
+    # ------------------------------------------------------------
+    def acknowledge(self, alert_id, user, at):
+        """Принятие инцидента в работу (только активного)."""
+        with self._lock:
+            incident = self._incidents[alert_id - 1]
+            if incident["status"] != "active":
+                return False
+            incident["status"] = "acknowledged"
+            incident["acknowledged_by"] = user
+            incident["acknowledged_at"] = pd.Timestamp(at).value
+            self.version += 1
+            return True
+
+    # ------------------------------------------------------------
+    # Чтение
+    # ------------------------------------------------------------
+    def open_incident(self, check_id):
+        """Открытый инцидент проверки (копия) или None."""
+        with self._lock:
+            index = self._open.get(check_id)
+            return None if index is None else dict(self._incidents[index])
+
+    def __len__(self):
+        return len(self._incidents)
+
+    def frame(self, alert_ids=None):
+        """Инциденты (все или alert_ids) DataFrame'ом в формате ленты алертов (время -- datetime64)."""
+        with self._lock:
+            incidents = self._incidents if alert_ids is None else [self._incidents[i - 1] for i in alert_ids]
+            df = pd.DataFrame(incidents, columns=ALERT_COLUMNS)
+        for col in ("created_at", "last_seen", "acknowledged_at", "resolved_at"):
+            df[col] = pd.to_datetime(df[col].astype("Int64"), unit="ns")
+        df["acknowledged_by"] = df["acknowledged_by"].astype(object)
+        return df
@@ -0,0 +1,158 @@
+"""
+Слияние проверок одной таблицы в один проход по ней.
+
+Большинство скриптов проверок (шаблоны MOCK_CHECK_TEMPLATES и
+SQL_TEMPLATES страницы проверок) -- одной из двух форм над одной таблицей
+с общим фильтром партиции (load_date = CURRENT_DATE - N):
+
+* строки-нарушения: SELECT <колонки> FROM t WHERE <условие> AND <фильтр>;
+  число нарушений = SUM(CASE WHEN <условие> THEN 1 ELSE 0 END);
+* строка-сводка: SELECT ..., <выражение> AS null_count FROM t WHERE <фильтр>;
+  число нарушений = <выражение>.
+
+Проверки одной таблицы с одинаковым фильтром сливаются в один запрос
+SELECT agg_0, agg_1, ..., COUNT(*) FROM t WHERE <фильтр>, результат
+которого раскладывается обратно по проверкам; последняя колонка -- число
+строк партиции (rows_checked), отдельный COUNT(*) для группы не нужен. Скрипты других форм (JOIN,
+GROUP BY, HAVING, подзапросы, OR на верхнем уровне) выполняются как есть.
+"""
+import re
+
+# Колонки строки-сводки, значение которых -- число нарушений (как в executor)
+FAILED_COUNT_COLUMNS = ("failed_rows", "failed_count", "null_count")
+
+_COMMENT = re.compile(r"--[^\n]*")
+_SPACES = re.compile(r"\s+")
+_UNSUPPORTED = re.compile(r"\b(JOIN|GROUP\s+BY|HAVING|ORDER\s+BY|LIMIT|UNION|OFFSET|DISTINCT)\b|\(\s*SELECT\b",
+                          re.IGNORECASE)
+_AGGREGATE = re.compile(r"\b(COUNT|SUM|MIN|MAX|AVG)\s*\(", re.IGNORECASE)
+_QUERY = re.compile(
+    r"^SELECT\s+(?P<select>.+?)\s+FROM\s+(?P<table>[\w.]+)(?:\s+(?:AS\s+)?(?!WHERE\b)(?P<alias>\w+))?"
+    r"(?:\s+WHERE\s+(?P<where>.+))?$",
+    re.IGNORECASE | re.DOTALL,
+)
+_PARTITION = re.compile(r"^load_date\s*=", re.IGNORECASE)
+_MAIN_TABLE = re.compile(
+    r"\bFROM\s+[\w.]+(?:\s+(?:AS\s+)?(?!(?:WHERE|JOIN|LEFT|RIGHT|INNER|FULL|CROSS|GROUP|ORDER|HAVING|LIMIT)\b)"
+    r"(?P<alias>\w+))?",
+    re.IGNORECASE,
+)
+_WHERE_END = r"\s+(?:GROUP\s+BY|HAVING|ORDER\s+BY|LIMIT)\s+"
+_ALIASED_COLUMN = re.compile(r"^(?P<expr>.+?)\s+AS\s+(?P<name>\w+)$", re.IGNORECASE | re.DOTALL)
+
+
+def _split_top_level(text, separator):
+    """Части text по separator (регулярное выражение) вне кавычек и скобок."""
+    parts, depth, quote, start = [], 0, False, 0
+    pattern = re.compile(separator, re.IGNORECASE)
+    i = 0
+    while i < len(text):
+        char = text[i]
+        if char == "'":
+            quote = not quote
+        elif not quote and char == "(":
+            depth += 1
+        elif not quote and char == ")":
+            depth -= 1
+        elif not quote and depth == 0:
+            match = pattern.match(text, i)
+            if match and match.end() > i:
+                parts.append(text[start:i].strip())
+                start = i = match.end()
+                continue
+        i += 1
+    parts.append(text[start:].strip())
+    return parts
+
+
+def normalize_sql(sql):
+    """Скрипт без комментариев, лишних пробелов и завершающей точки с запятой."""
+    return _SPACES.sub(" ", _COMMENT.sub("", sql)).strip().rstrip(";").strip()
+
+
+def partition_filter(sql):
+    """Фильтр партиции основной таблицы скрипта (условия load_date = ... через AND) или "".
+
+    Строка совпадает с фильтром, который fusable_part выделяет для сливаемых скриптов.
+    """
+    sql = normalize_sql(sql)
+    parts = _split_top_level(sql, r"\s+WHERE\s+")
+    if len(parts) < 2:
+        return ""
+    where = _split_top_level(parts[1], _WHERE_END)[0]
+    if len(_split_top_level(where, r"\s+OR\s+")) > 1:
+        return ""
+    main = _MAIN_TABLE.search(parts[0])
+    alias = main["alias"] if main else None
+    conditions = []
+    for condition in _split_top_level(where, r"\s+AND\s+"):
+        prefix, _, rest = condition.partition(".")
+        if alias and prefix == alias and _PARTITION.match(rest):
+            conditions.append(rest)
+        elif _PARTITION.match(condition):
+            conditions.append(condition)
+    return " AND ".join(sorted(conditions))
+
+
+def fusable_part(sql):
+    """(таблица, фильтр, агрегат числа нарушений) для скрипта, который можно слить, иначе None."""
+    sql = normalize_sql(sql)
+    if ";" in sql or _UNSUPPORTED.search(sql):
+        return None
+    match = _QUERY.match(sql)
+    if match is None:
+        return None
+    select, where, alias = match["select"], match["where"] or "", match["alias"]
+    if where and len(_split_top_level(where, r"\s+OR\s+")) > 1:
+        return None
+    conditions = [c for c in _split_top_level(where, r"\s+AND\s+") if c] if where else []
+    if alias:
+        unalias = re.compile(rf"\b{re.escape(alias)}\.")
+        conditions = [unalias.sub("", c) for c in conditions]
+        select = unalias.sub("", select)
+    partition = sorted(c for c in conditions if _PARTITION.match(c))
+    rest = [c for c in conditions if not _PARTITION.match(c)]
+
+    if _AGGREGATE.search(select):
+        # Строка-сводка: выражение колонки с числом нарушений по строкам фильтра
+        if rest:
+            return None
+        for column in _split_top_level(select, r",\s*"):
+            aliased = _ALIASED_COLUMN.match(column)
+            if aliased and aliased["name"].lower() in FAILED_COUNT_COLUMNS:
+                return match["table"], " AND ".join(partition), aliased["expr"]
+        return None
+    if not rest:
+        return None
+    condition = " AND ".join(f"({c})" if len(rest) > 1 else c for c in rest)
+    return match["table"], " AND ".join(partition), f"SUM(CASE WHEN {condition} THEN 1 ELSE 0 END)"
+
+
+def plan_batches(checks):
+    """Разбиение проверок одной таблицы на слитые группы и одиночные проверки.
+
+    Возвращает (batches, singles): batches -- список (sql, [(проверка, номер колонки)])
+    для групп из двух и более проверок с одинаковым фильтром (последняя колонка sql --
+    COUNT(*) строк партиции); singles -- остальные.
+    """
+    groups, singles = {}, []
+    for check in checks:
+        part = fusable_part(check["sql_script"])
+        if part is None:
+            singles.append(check)
+        else:
+            table, partition, aggregate = part
+            groups.setdefault((table, partition), []).append((check, aggregate))
+
+    batches = []
+    for (table, partition), members in groups.items():
+        if len(members) < 2:
+            singles.extend(check for check, _ in members)
+            continue
+        # Одинаковые агрегаты считаются один раз
+        columns = {}
+        layout = [(check, columns.setdefault(aggregate, len(columns))) for check, aggregate in members]
+        select = ", ".join([f"{aggregate} AS f{i}" for aggregate, i in columns.items()] + ["COUNT(*) AS rows_checked"])
+        sql = f"SELECT {select} FROM {table}" + (f" WHERE {partition}" if partition else "")
+        batches.append((sql, layout))
+    return batches, singles
@@ -0,0 +1,170 @@
+"""
+Общий кэш результатов колбэков для нескольких worker-процессов.
+
+Значения хранятся в файлах (pickle) в общем каталоге, поэтому все
+worker'ы gunicorn на одной машине видят один и тот же кэш. Ключ --
+пространство имён, версия данных и входы колбэка. Пока один процесс
+считает значение, остальные ждут его на файловой блокировке (flock)
+и затем читают готовый результат -- N открытых вкладок дают одно
+вычисление на обновление. Просроченные записи и их файлы блокировок
+удаляются при сбросе (invalidate) и сами -- каждые SWEEP_EVERY записей.
+
+Настройки через переменные окружения:
+    DQT_CACHE_DIR -- каталог кэша (по умолчанию <tmp>/dqt-cache);
+    DQT_CACHE_TTL -- время жизни записи в секундах (по умолчанию 60);
+    DQT_CACHE_DISABLED=1 -- отключить кэш.
+"""
+import functools
+import hashlib
+import os
+import pickle
+import tempfile
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows -- работаем без межпроцессной блокировки
+    fcntl = None
+
+DEFAULT_TTL = 60
+
+# Через сколько записей процесс сам удаляет просроченные записи кэша
+SWEEP_EVERY = 100
+
+
+class SharedCache:
+    """Файловый кэш с TTL, версией данных и явной инвалидацией."""
+
+    def __init__(self, directory=None, ttl=None, enabled=None):
+        self.directory = directory or os.environ.get(
+            "DQT_CACHE_DIR", os.path.join(tempfile.gettempdir(), "dqt-cache")
+        )
+        self.ttl = float(ttl if ttl is not None else os.environ.get("DQT_CACHE_TTL", DEFAULT_TTL))
+        if enabled is None:
+            enabled = os.environ.get("DQT_CACHE_DISABLED", "") not in ("1", "true", "yes")
+        self.enabled = enabled
+        self._writes = 0
+        os.makedirs(self.directory, exist_ok=True)
+
+    # ------------------------------------------------------------
+    # Файлы и блокировки
+    # ------------------------------------------------------------
+    def _path(self, namespace, key):
+        digest = hashlib.sha1(repr(key).encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, f"{namespace}-{digest}.pkl")
+
+    @contextmanager
+    def _locked(self, path):
+        """Эксклюзивная блокировка записи на время вычисления."""
+        if fcntl is None:
+            yield
+            return
+        with open(path + ".lock", "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _read(self, path, ttl):
+        try:
+            if time.time() - os.path.getmtime(path) > ttl:
+                return False, None
+            with open(path, "rb") as f:
+                return True, pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return False, None
+
+    def _write(self, path, value):
+        # Запись через временный файл и rename -- читатели не увидят половину файла
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    # ------------------------------------------------------------
+    # API
+    # ------------------------------------------------------------
+    def get_or_compute(self, namespace, key, compute, ttl=None):
+        """Значение из кэша или результат compute() (считается одним процессом)."""
+        if not self.enabled:
+            return compute()
+        ttl = self.ttl if ttl is None else ttl
+        path = self._path(namespace, key)
+        found, value = self._read(path, ttl)
+        if found:
+            return value
+        with self._locked(path):
+            # Пока ждали блокировку, значение мог посчитать другой процесс
+            found, value = self._read(path, ttl)
+            if found:
+                return value
+            value = compute()
+            self._write(path, value)
+        # Ключи включают версию данных, поэтому старые записи больше не читаются --
+        # их удаляет периодическая уборка, а не только ручной сброс
+        self._writes += 1
+        if self._writes % SWEEP_EVERY == 0:
+            self._sweep()
+        return value
+
+    def invalidate(self, namespace=None):
+        """Удаление записей пространства имён (или всего кэша) и просроченных записей."""
+        self._sweep(f"{namespace}-" if namespace else "")
+
+    def _sweep(self, prefix=None):
+        """Удаление записей с префиксом prefix и просроченных -- вместе с их файлами блокировок.
+
+        Файл блокировки без записи (вычисление упало) и недописанный .tmp удаляются,
+        когда старше TTL.
+        """
+        now = time.time()
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            try:
+                expired = now - os.path.getmtime(path) > self.ttl
+                if name.endswith(".pkl"):
+                    if expired or (prefix is not None and name.startswith(prefix)):
+                        os.remove(path)
+                        self._remove_lock(path)
+                elif name.endswith(".pkl.lock"):
+                    if expired and not os.path.exists(path[:-len(".lock")]):
+                        os.remove(path)
+                elif name.endswith(".tmp") and expired:
+                    os.remove(path)
+            except OSError:
+                pass
+
+    @staticmethod
+    def _remove_lock(path):
+        # Процесс, ждущий на удалённом файле, посчитает значение ещё раз -- запись атомарна
+        try:
+            os.remove(path + ".lock")
+        except OSError:
+            pass
+
+    def memoize(self, namespace, version=None, ttl=None, key=None):
+        """Декоратор для колбэка.
+
+        version -- функция без аргументов, возвращающая версию данных;
+        key     -- функция от аргументов колбэка, возвращающая значимую часть
+                   ключа (например, без счётчика n_intervals). По умолчанию -- все аргументы.
+        """
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                parts = key(*args, **kwargs) if key else (args, sorted(kwargs.items()))
+                cache_key = (func.__module__, func.__qualname__, version() if version else None, parts)
+                return self.get_or_compute(namespace, cache_key, lambda: func(*args, **kwargs), ttl=ttl)
+            return wrapper
+        return decorator
+
+
+# Общий экземпляр для колбэков страниц
+CALLBACK_CACHE = SharedCache()
@@ -0,0 +1,301 @@
+"""
+Выполнение проверок: SQL-скрипт проверки на подключении к БД с записью
+результата в хранилище результатов.
+
+Проверки выполняются в пуле потоков ограниченного размера
+(DQT_EXEC_WORKERS, по умолчанию 4), задание пула -- проверки одной
+таблицы из запуска. Число проверенных строк (rows_checked) считается по
+той же партиции, которую фильтрует скрипт (load_date = ..., см.
+batching.partition_filter), один раз на партицию в задании. Проверки с
+одинаковым фильтром партиции сливаются в один запрос вместе с COUNT(*)
+партиции -- один проход по таблице на группу (services/batching.py;
+DQT_EXEC_FUSE=0 отключает слияние), остальные выполняются по одной: скрипт возвращает строки-нарушения, их
+число -- rows_failed (если скрипт возвращает одну строку-сводку с
+колонкой из FAILED_COUNT_COLUMNS, берётся её значение). Если слитый
+запрос падает, его проверки выполняются по одной.
+Статус: OK, если доля нарушений не превышает threshold проверки, иначе
+FAIL; ошибка выполнения -- ERROR с текстом ошибки.
+
+Результаты копятся в буфере и добавляются в хранилище пачками (append
+хранилища копирует данные, поэтому построчная запись была бы дорогой);
+запуск считается завершённым после записи всех его результатов.
+Прогресс запуска доступен через status(run_id). Непредвиденная ошибка
+выполнения или записи не оставляет запуск незавершённым: он завершается
+с полем error.
+
+Подключения берутся из пула источника (services/pool.py): число
+одновременных запросов к источнику ограничено размером его пула, даже
+если потоков выполнения больше.
+"""
+import os
+import threading
+import time
+import traceback
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import pandas as pd
+
+from services.batching import FAILED_COUNT_COLUMNS, partition_filter, plan_batches
+from services.connections import DEFAULT_CONNECTION, adapt_sql, ensure_standin_table
+from services.pool import CONNECTION_POOLS
+
+# Результатов в буфере, после которых он записывается в хранилище
+FLUSH_ROWS = 200
+
+# Сколько хранить состояние завершённых запусков, сек
+RUN_TTL = 3600
+
+
+def _failed_rows(columns, rows):
+    if len(rows) == 1:
+        for i, column in enumerate(columns):
+            if column.lower() in FAILED_COUNT_COLUMNS:
+                return int(rows[0][i] or 0)
+    return len(rows)
+
+
+def _count_sql(table, partition):
+    return f"SELECT COUNT(*) FROM {table}" + (f" WHERE {partition}" if partition else "")
+
+
+def _rollback(conn, dialect):
+    if dialect != "sqlite":
+        conn.rollback()
+
+
+def _result(check, started, elapsed, rows_checked, rows_failed, error=None):
+    """Строка результата проверки; error -- исключение выполнения (статус ERROR)."""
+    if error is not None:
+        status = "ERROR"
+    else:
+        threshold = float(check.get("threshold") or 0)
+        status = "OK" if rows_failed <= threshold * rows_checked else "FAIL"
+    return {
+        "check_id": int(check["check_id"]),
+        "check_name": check["check_name"],
+        "table_name": check["table_name"],
+        "check_type_name": check["check_type_name"],
+        "run_date": pd.Timestamp(started.date()),
+        "run_datetime": pd.Timestamp(started),
+        "check_status_name": status,
+        "execution_time_sec": round(elapsed, 3),
+        "rows_checked": rows_checked,
+        "rows_failed": rows_failed,
+        "error_message": None if error is None else f"{type(error).__name__}: {error}",
+        "owner": check["owner"],
+        "domain": check["domain"],
+    }
+
+
+class CheckExecutor:
+    """Пул выполнения проверок с записью результатов в хранилище."""
+
+    def __init__(self, store, max_workers=None, connection=None, on_results=None, flush_rows=FLUSH_ROWS,
+                 pools=CONNECTION_POOLS, fuse=None):
+        self._store = store
+        self._pools = pools
+        self.fuse = os.environ.get("DQT_EXEC_FUSE", "1") != "0" if fuse is None else fuse
+        self.max_workers = int(max_workers or os.environ.get("DQT_EXEC_WORKERS", 4))
+        self.connection = connection or DEFAULT_CONNECTION
+        # on_results(df) -- после записи пачки результатов в хранилище
+        self._on_results = on_results
+        self._flush_rows = flush_rows
+        self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="dqt-check")
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._runs = {}
+        self._pending = []
+        self._next_result_id = None
+        # Проверок в очереди и в работе (для backpressure планировщика)
+        self._in_flight = 0
+
+    # ------------------------------------------------------------
+    # Запуск
+    # ------------------------------------------------------------
+    def submit(self, checks, as_of=None):
+        """Постановка проверок (словари строк каталога) в очередь. Возвращает id запуска.
+
+        as_of -- дата, за которую выполняется проверка (вместо CURRENT_DATE).
+        """
+        checks = list(checks)
+        run_id = uuid.uuid4().hex
+        with self._lock:
+            self._cleanup()
+            self._runs[run_id] = {
+                "total": len(checks), "done": 0, "written": 0, "finished": not checks,
+                "statuses": {}, "results": [], "queries": 0, "error": None, "started": time.time(),
+            }
+            self._in_flight += len(checks)
+        by_table = {}
+        for check in checks:
+            by_table.setdefault(check["table_name"], []).append(check)
+        for table_checks in by_table.values():
+            self._pool.submit(self._execute, run_id, table_checks, as_of)
+        return run_id
+
+    @property
+    def in_flight(self):
+        """Число поставленных, но ещё не выполненных проверок."""
+        with self._lock:
+            return self._in_flight
+
+    def status(self, run_id):
+        """Прогресс запуска: total, done, statuses, results, queries, error, finished (или None)."""
+        with self._lock:
+            run = self._runs.get(run_id)
+            return None if run is None else {**run, "statuses": dict(run["statuses"]), "results": list(run["results"])}
+
+    def _cleanup(self):
+        now = time.time()
+        for run_id in [r for r, run in self._runs.items() if run["finished"] and now - run["started"] > RUN_TTL]:
+            del self._runs[run_id]
+
+    # ------------------------------------------------------------
+    # Выполнение
+    # ------------------------------------------------------------
+    def run_check(self, check, as_of=None):
+        """Выполнение одной проверки. Возвращает строку результата (без result_id)."""
+        return self.run_table([check], as_of)[0][0]
+
+    def run_table(self, checks, as_of=None):
+        """Выполнение проверок одной таблицы.
+
+        Возвращает (строки результатов в порядке checks, число выполненных запросов).
+        Время общих запросов (COUNT(*) партиции, слитый запрос) делится поровну между
+        проверками, которые ими посчитаны.
+        """
+        table = checks[0]["table_name"]
+        started = datetime.now()
+        results = [None] * len(checks)
+        position = {id(check): i for i, check in enumerate(checks)}
+        queries = 0
+        try:
+            with self._pools.connection(self.connection) as (conn, dialect):
+                if dialect == "sqlite":
+                    ensure_standin_table(conn, table)
+                cur = conn.cursor()
+                # Число строк -- в той же партиции, которую фильтруют проверки: у слитых
+                # групп оно считается в том же запросе (последняя колонка)
+                partitions = {id(check): partition_filter(check["sql_script"]) for check in checks}
+                rows_checked, count_time = {}, {}
+
+                batches, singles = plan_batches(checks) if self.fuse else ([], list(checks))
+                for sql, layout in batches:
+                    t0 = time.perf_counter()
+                    try:
+                        cur.execute(adapt_sql(sql, dialect, as_of))
+                        queries += 1
+                        row = cur.fetchone()
+                    except Exception:
+                        _rollback(conn, dialect)
+                        singles += [check for check, _ in layout]
+                        continue
+                    elapsed = (time.perf_counter() - t0) / len(layout)
+                    partition = partitions[id(layout[0][0])]
+                    rows_checked[partition] = int(row[-1])
+                    count_time.setdefault(partition, 0.0)
+                    for check, column in layout:
+                        results[position[id(check)]] = _result(
+                            check, started, elapsed, rows_checked[partition], int(row[column] or 0))
+
+                pending = [partitions[id(check)] for check in singles]
+                for partition in dict.fromkeys(pending):
+                    if partition in rows_checked:
+                        continue
+                    t0 = time.perf_counter()
+                    cur.execute(adapt_sql(_count_sql(table, partition), dialect, as_of))
+                    queries += 1
+                    rows_checked[partition] = int(cur.fetchone()[0])
+                    count_time[partition] = (time.perf_counter() - t0) / pending.count(partition)
+
+                for check in singles:
+                    t0 = time.perf_counter()
+                    try:
+                        cur.execute(adapt_sql(check["sql_script"], dialect, as_of))
+                        queries += 1
+                        columns = [c[0] for c in cur.description or []]
+                        rows_failed, error = _failed_rows(columns, cur.fetchall() if columns else []), None
+                    except Exception as e:
+                        _rollback(conn, dialect)
+                        rows_failed, error = 0, e
+                    partition = partitions[id(check)]
+                    results[position[id(check)]] = _result(
+                        check, started, count_time[partition] + time.perf_counter() - t0, rows_checked[partition],
+                        rows_failed, error)
+                # Только чтение: транзакцию PostgreSQL не держим открытой в пуле
+                _rollback(conn, dialect)
+        except Exception as e:
+            elapsed = (datetime.now() - started).total_seconds() / len(checks)
+            results = [result or _result(check, started, elapsed, 0, 0, e) for check, result in zip(checks, results)]
+        return results, queries
+
+    def _execute(self, run_id, checks, as_of):
+        try:
+            results, queries = self.run_table(checks, as_of)
+        except Exception as e:
+            # Ошибки запросов run_table сам превращает в ERROR; здесь -- непредвиденная ошибка
+            traceback.print_exc()
+            with self._lock:
+                run = self._runs[run_id]
+                run["done"] += len(checks)
+                self._in_flight -= len(checks)
+                flush = run["done"] == run["total"]
+            self._fail(run_id, len(checks), e)
+            if flush:
+                self.flush()
+            return
+        with self._lock:
+            run = self._runs[run_id]
+            run["done"] += len(results)
+            run["queries"] += queries
+            self._in_flight -= len(results)
+            for result in results:
+                status = result["check_status_name"]
+                run["statuses"][status] = run["statuses"].get(status, 0) + 1
+                run["results"].append({k: result[k] for k in ("check_id", "check_status_name", "rows_failed")})
+                self._pending.append((run_id, result))
+            flush = len(self._pending) >= self._flush_rows or run["done"] == run["total"]
+        if flush:
+            self.flush()
+
+    def _fail(self, run_id, count, error):
+        """count проверок запуска не будут записаны: запуск получает error и может завершиться."""
+        with self._lock:
+            run = self._runs.get(run_id)
+            if run is None:
+                return
+            run["error"] = f"{type(error).__name__}: {error}"
+            run["written"] += count
+            run["finished"] = run["written"] == run["total"]
+
+    def flush(self):
+        """Запись накопленных результатов в хранилище одной пачкой."""
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, []
+            if not pending:
+                return
+            if self._next_result_id is None:
+                ids = self._store.column("result_id")
+                self._next_result_id = int(ids.max()) + 1 if len(ids) else 1
+            try:
+                df = pd.DataFrame([result for _, result in pending])
+                df.insert(0, "result_id", range(self._next_result_id, self._next_result_id + len(df)))
+                self._next_result_id += len(df)
+                self._store.append(df)
+                if self._on_results is not None:
+                    self._on_results(df)
+            except Exception as e:
+                traceback.print_exc()
+                for run_id, count in Counter(run_id for run_id, _ in pending).items():
+                    self._fail(run_id, count, e)
+                return
+            with self._lock:
+                for run_id, _ in pending:
+                    run = self._runs.get(run_id)
+                    if run is not None:
+                        run["written"] += 1
+                        run["finished"] = run["written"] == run["total"]
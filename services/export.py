@@ -0,0 +1,243 @@
+"""
+Потоковая выгрузка данных из колоночного хранилища.
+
+Файл формируется чанками по EXPORT_CHUNK_ROWS строк: CSV отдаётся клиенту
+по мере формирования, XLSX пишется через write-only книгу openpyxl во
+временный файл и затем отдаётся потоком. Parquet и Arrow IPC собираются
+из колонок хранилища (измерения -- словарями) с исходными типами и
+машинными именами колонок. Память ограничена размером чанка и не зависит
+от объёма выгрузки.
+
+Страницы регистрируют источники выгрузки через register_export(), а
+Flask-blueprint export_blueprint (подключается в app.py) обслуживает
+адреса вида /export/<name>.<fmt>?<фильтры страницы>.
+"""
+import os
+import tempfile
+from datetime import datetime
+from urllib.parse import urlencode
+
+from flask import Blueprint, Response, abort, request, stream_with_context
+
+EXPORT_CHUNK_ROWS = 50_000
+
+# Лимит строк листа Excel (с заголовком) -- длинные выгрузки продолжаются на следующем листе
+XLSX_SHEET_ROWS = 1_048_576
+
+EXPORT_FORMATS = {
+    "csv": "text/csv; charset=utf-8",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    "parquet": "application/vnd.apache.parquet",
+    "arrow": "application/vnd.apache.arrow.file",
+}
+
+# name -> {"store", "positions", "columns", "filename"}
+_SOURCES = {}
+
+export_blueprint = Blueprint("export", __name__, url_prefix="/export")
+
+
+def register_export(name, store, positions, columns, filename):
+    """Регистрация источника выгрузки.
+
+    positions -- функция от словаря параметров запроса, возвращающая
+                 номера строк хранилища в порядке выгрузки;
+    columns   -- словарь {колонка хранилища: заголовок в файле}.
+    """
+    _SOURCES[name] = {"store": store, "positions": positions, "columns": columns, "filename": filename}
+
+
+def export_url(name, fmt, params):
+    """Относительный адрес выгрузки с параметрами фильтров."""
+    query = {k: v for k, v in params.items() if v not in (None, "")}
+    return f"/export/{name}.{fmt}?{urlencode(query)}"
+
+
+# ============================================================
+# Запись файлов
+# ============================================================
+def iter_chunks(store, positions, columns, chunk_rows=EXPORT_CHUNK_ROWS, progress=None):
+    """Декодированные чанки DataFrame с заголовками выгрузки.
+
+    progress(done, total) вызывается после выдачи каждого чанка.
+    """
+    total = len(positions)
+    for start in range(0, max(total, 1), chunk_rows):
+        chunk = store.take(positions[start:start + chunk_rows], columns=list(columns))
+        yield chunk.rename(columns=columns)
+        if progress is not None:
+            progress(min(start + chunk_rows, total), total)
+
+
+def iter_csv(store, positions, columns, chunk_rows=EXPORT_CHUNK_ROWS, progress=None):
+    """CSV по частям (bytes): заголовок, затем чанк за чанком."""
+    for i, chunk in enumerate(iter_chunks(store, positions, columns, chunk_rows, progress)):
+        yield chunk.to_csv(index=False, header=(i == 0)).encode("utf-8")
+
+
+def write_csv(store, positions, columns, path, chunk_rows=EXPORT_CHUNK_ROWS, progress=None):
+    """CSV в файл по чанкам."""
+    with open(path, "wb") as f:
+        for block in iter_csv(store, positions, columns, chunk_rows, progress):
+            f.write(block)
+
+
+def write_xlsx(store, positions, columns, path, chunk_rows=EXPORT_CHUNK_ROWS, progress=None):
+    """XLSX через write-only книгу: строки уходят во временные файлы openpyxl."""
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    header = list(columns.values())
+    sheet, sheet_rows = None, XLSX_SHEET_ROWS
+    for chunk in iter_chunks(store, positions, columns, chunk_rows, progress):
+        for row in chunk.itertuples(index=False, name=None):
+            if sheet_rows >= XLSX_SHEET_ROWS:
+                sheet = workbook.create_sheet(f"Sheet{len(workbook.worksheets) + 1}")
+                sheet.append(header)
+                sheet_rows = 1
+            sheet.append(row)
+            sheet_rows += 1
+    if sheet is None:
+        workbook.create_sheet("Sheet1").append(header)
+    workbook.save(path)
+
+
+def _arrow_schema(store, columns):
+    """Схема Arrow: измерения -- словари (коды + значения), время -- timestamp."""
+    import pyarrow as pa
+
+    from services.results_store import DIMENSIONS
+
+    fields = []
+    for col in columns:
+        if col in DIMENSIONS:
+            index_type = pa.from_numpy_dtype(store.column(col).dtype)
+            fields.append(pa.field(col, pa.dictionary(index_type, pa.string())))
+        elif col in ("run_datetime", "run_date"):
+            fields.append(pa.field(col, pa.timestamp("ns")))
+        else:
+            fields.append(pa.field(col, pa.from_numpy_dtype(store.column(col).dtype)))
+    return pa.schema(fields)
+
+
+def iter_arrow_batches(store, positions, columns, chunk_rows=EXPORT_CHUNK_ROWS, progress=None):
+    """RecordBatch'и Arrow прямо из колонок хранилища (без DataFrame и Python-объектов).
+
+    Возвращает (schema, генератор батчей). Словари измерений фиксируются
+    один раз, поэтому одинаковы во всех батчах и row group'ах.
+    """
+    import pyarrow as pa
+
+    from services.results_store import DIMENSIONS, NS_PER_DAY
+
+    schema = _arrow_schema(store, columns)
+    dictionaries = {
+        col: pa.array(store.categories(col).astype(str), type=pa.string())
+        for col in columns if col in DIMENSIONS
+    }
+
+    def batches():
+        total = len(positions)
+        for start in range(0, total, chunk_rows):
+            pos = positions[start:start + chunk_rows]
+            arrays = []
+            for field in schema:
+                col = field.name
+                if col in dictionaries:
+                    codes = store.column(col)[pos]
+                    arrays.append(pa.DictionaryArray.from_arrays(
+                        pa.array(codes, mask=codes < 0), dictionaries[col]))
+                elif col == "run_datetime":
+                    arrays.append(pa.array(store.column("run_ts")[pos], type=pa.timestamp("ns")))
+                elif col == "run_date":
+                    days = store.column("run_ts")[pos] // NS_PER_DAY * NS_PER_DAY
+                    arrays.append(pa.array(days, type=pa.timestamp("ns")))
+                else:
+                    arrays.append(pa.array(store.column(col)[pos]))
+            yield pa.RecordBatch.from_arrays(arrays, schema=schema)
+            if progress is not None:
+                progress(min(start + chunk_rows, total), total)
+
+    return schema, batches()
+
+
+def write_parquet(store, positions, columns, path, chunk_rows=EXPORT_CHUNK_ROWS, progress=None):
+    """Parquet: row group на чанк, словарное кодирование измерений, статистики колонок."""
+    import pyarrow.parquet as pq
+
+    schema, batches = iter_arrow_batches(store, positions, columns, chunk_rows, progress)
+    with pq.ParquetWriter(path, schema, compression="zstd", write_statistics=True) as writer:
+        for batch in batches:
+            writer.write_batch(batch, row_group_size=chunk_rows)
+
+
+def write_arrow(store, positions, columns, path, chunk_rows=EXPORT_CHUNK_ROWS, progress=None):
+    """Arrow IPC (файловый формат, сжатие zstd)."""
+    import pyarrow as pa
+
+    schema, batches = iter_arrow_batches(store, positions, columns, chunk_rows, progress)
+    options = pa.ipc.IpcWriteOptions(compression="zstd")
+    with pa.OSFile(path, "wb") as sink, pa.ipc.new_file(sink, schema, options=options) as writer:
+        for batch in batches:
+            writer.write_batch(batch)
+
+
+# Запись файла выгрузки по формату: writer(store, positions, columns, path, progress=...)
+EXPORT_WRITERS = {
+    "csv": write_csv,
+    "xlsx": write_xlsx,
+    "parquet": write_parquet,
+    "arrow": write_arrow,
+}
+
+
+def get_export_source(name):
+    """Зарегистрированный источник выгрузки или None."""
+    return _SOURCES.get(name)
+
+
+def export_filename(name, fmt):
+    """Имя файла выгрузки с меткой времени."""
+    return f"{_SOURCES[name]['filename']}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{fmt}"
+
+
+def iter_file(path, remove=False, block_size=1 << 16):
+    """Чтение файла блоками (с удалением после отдачи, если remove)."""
+    try:
+        with open(path, "rb") as f:
+            while block := f.read(block_size):
+                yield block
+    finally:
+        if remove:
+            os.remove(path)
+
+
+# ============================================================
+# HTTP
+# ============================================================
+@export_blueprint.route("/<name>.<fmt>")
+def download(name, fmt):
+    source = _SOURCES.get(name)
+    if source is None or fmt not in EXPORT_FORMATS:
+        abort(404)
+    store, columns = source["store"], source["columns"]
+    positions = source["positions"](request.args.to_dict())
+    filename = export_filename(name, fmt)
+
+    if fmt == "csv":
+        body = iter_csv(store, positions, columns)
+    else:
+        fd, path = tempfile.mkstemp(suffix=f".{fmt}")
+        os.close(fd)
+        try:
+            EXPORT_WRITERS[fmt](store, positions, columns, path)
+        except Exception:
+            os.remove(path)
+            raise
+        body = iter_file(path, remove=True)
+
+    return Response(
+        stream_with_context(body),
+        mimetype=EXPORT_FORMATS[fmt],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
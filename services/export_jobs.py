@@ -0,0 +1,160 @@
+"""
+Фоновые задания выгрузки.
+
+Большие выгрузки не держат запрос веб-сервера: задание выполняется в
+фоновом потоке процесса (видит текущие данные хранилища без копирования),
+пишет файл и прогресс в spool-каталог. Отдельный процесс через fork не
+используется: fork из многопоточного процесса (пул проверок, планировщик,
+цикл оповещений) может унаследовать чужую захваченную блокировку и
+зависнуть, а spawn заново строил бы данные и не видел текущее хранилище.
+Одновременно выполняется не больше DQT_EXPORT_WORKERS заданий, остальные
+ждут в очереди. Состояние задания -- JSON-файл рядом с результатом, поэтому
+прогресс и скачивание доступны из любого worker'а gunicorn.
+
+Настройки через переменные окружения:
+    DQT_EXPORT_SPOOL_DIR      -- каталог заданий (по умолчанию <tmp>/dqt-exports);
+    DQT_EXPORT_WORKERS        -- число параллельных заданий (по умолчанию 2);
+    DQT_EXPORT_TTL            -- время хранения готовых файлов, сек (по умолчанию 3600);
+    DQT_EXPORT_BACKGROUND_ROWS -- с какого числа строк выгрузка уходит в фон.
+"""
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+import traceback
+import uuid
+
+from flask import Blueprint, Response, abort
+
+from services.export import EXPORT_FORMATS, EXPORT_WRITERS, export_filename, get_export_source, iter_file
+
+EXPORT_BACKGROUND_ROWS = int(os.environ.get("DQT_EXPORT_BACKGROUND_ROWS", 200_000))
+
+# Прогресс пишем не чаще, чем раз в PROGRESS_INTERVAL секунд
+PROGRESS_INTERVAL = 0.5
+
+_JOB_ID = re.compile(r"^[0-9a-f]{32}$")
+
+jobs_blueprint = Blueprint("export_jobs", __name__, url_prefix="/export/jobs")
+
+
+class ExportJobs:
+    """Очередь фоновых выгрузок с прогрессом и сроком хранения файлов."""
+
+    def __init__(self, spool_dir=None, max_workers=None, ttl=None):
+        self.spool_dir = spool_dir or os.environ.get(
+            "DQT_EXPORT_SPOOL_DIR", os.path.join(tempfile.gettempdir(), "dqt-exports")
+        )
+        self.max_workers = int(max_workers or os.environ.get("DQT_EXPORT_WORKERS", 2))
+        self.ttl = float(ttl or os.environ.get("DQT_EXPORT_TTL", 3600))
+        self._slots = threading.BoundedSemaphore(self.max_workers)
+        os.makedirs(self.spool_dir, exist_ok=True)
+
+    # ------------------------------------------------------------
+    # Файлы задания
+    # ------------------------------------------------------------
+    def _state_path(self, job_id):
+        return os.path.join(self.spool_dir, f"{job_id}.json")
+
+    def file_path(self, job_id):
+        state = self.status(job_id)
+        if not state or state["status"] != "done":
+            return None
+        return os.path.join(self.spool_dir, f"{job_id}.{state['fmt']}")
+
+    def _write_state(self, job_id, **state):
+        path = self._state_path(job_id)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(state, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    def status(self, job_id):
+        """Состояние задания: status (queued/running/done/failed), done, total, filename..."""
+        if not job_id or not _JOB_ID.match(job_id):
+            return None
+        try:
+            with open(self._state_path(job_id), encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def cleanup(self):
+        """Удаление заданий и файлов старше TTL."""
+        now = time.time()
+        for name in os.listdir(self.spool_dir):
+            path = os.path.join(self.spool_dir, name)
+            try:
+                if now - os.path.getmtime(path) > self.ttl:
+                    os.remove(path)
+            except OSError:
+                pass
+
+    # ------------------------------------------------------------
+    # Запуск
+    # ------------------------------------------------------------
+    def submit(self, name, fmt, params):
+        """Постановка выгрузки в очередь. Возвращает id задания."""
+        if get_export_source(name) is None or fmt not in EXPORT_FORMATS:
+            raise ValueError(f"Неизвестная выгрузка: {name}.{fmt}")
+        self.cleanup()
+        job_id = uuid.uuid4().hex
+        state = {"status": "queued", "fmt": fmt, "filename": export_filename(name, fmt),
+                 "done": 0, "total": 0, "created": time.time()}
+        self._write_state(job_id, **state)
+        threading.Thread(
+            target=self._supervise, args=(job_id, name, fmt, dict(params), state),
+            name=f"dqt-export-{job_id[:8]}", daemon=True,
+        ).start()
+        return job_id
+
+    def _supervise(self, job_id, name, fmt, params, state):
+        """Ожидание свободного слота и выполнение задания (ошибка записывается в состояние)."""
+        with self._slots:
+            self._run(job_id, name, fmt, params, state)
+
+    def _run(self, job_id, name, fmt, params, state):
+        """Тело задания (выполняется в фоновом потоке)."""
+        source = get_export_source(name)
+        last_report = [0.0]
+
+        def progress(done, total):
+            now = time.time()
+            if now - last_report[0] >= PROGRESS_INTERVAL or done >= total:
+                last_report[0] = now
+                self._write_state(job_id, **{**state, "status": "running", "done": done, "total": total})
+
+        path = os.path.join(self.spool_dir, f"{job_id}.{fmt}")
+        tmp_path = f"{path}.tmp"
+        try:
+            positions = source["positions"](params)
+            state = {**state, "status": "running", "total": len(positions)}
+            self._write_state(job_id, **state)
+            EXPORT_WRITERS[fmt](source["store"], positions, source["columns"], tmp_path, progress=progress)
+            os.replace(tmp_path, path)
+            self._write_state(job_id, **{**state, "status": "done", "done": len(positions)})
+        except Exception as e:
+            # Ошибка выгрузки -- в состояние задания и в лог worker'а
+            traceback.print_exc()
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            self._write_state(job_id, **{**state, "status": "failed", "error": str(e)})
+
+
+EXPORT_JOBS = ExportJobs()
+
+
+@jobs_blueprint.route("/<job_id>")
+def download_job(job_id):
+    """Скачивание готового файла задания."""
+    path = EXPORT_JOBS.file_path(job_id)
+    if path is None or not os.path.exists(path):
+        abort(404)
+    state = EXPORT_JOBS.status(job_id)
+    return Response(
+        iter_file(path),
+        mimetype=EXPORT_FORMATS[state["fmt"]],
+        headers={"Content-Disposition": f'attachment; filename="{state["filename"]}"'},
+    )
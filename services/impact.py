@@ -0,0 +1,145 @@
+"""
+Анализ влияния: какие таблицы под риском из-за падающих проверок.
+
+Таблица «падает», если последний результат хотя бы одной её проверки --
+FAIL или ERROR. Все транзитивные потребители падающей таблицы по lineage
+считаются под риском; для каждой такой таблицы хранится множество
+падающих таблиц-источников риска.
+
+Анализатор подписан на добавление результатов в хранилище и пересчитывает
+только проверки из новых строк. Радиус поражения обновляется только для
+таблиц, которые начали или перестали падать (их закэшированные замыкания
+берутся из графа lineage). При изменении самого графа риск пересчитывается
+целиком при следующем чтении.
+"""
+import threading
+
+import numpy as np
+
+FAILING_STATUSES = ("FAIL", "ERROR")
+
+
+class ImpactAnalyzer:
+    """Падающие таблицы и их потребители под риском."""
+
+    def __init__(self, store, cube, lineage, failing_statuses=FAILING_STATUSES):
+        self._store = store
+        self._cube = cube
+        self._lineage = lineage
+        self._failing_statuses = failing_statuses
+        self._lock = threading.Lock()
+        # check_id падающей проверки -> таблица
+        self._failing_checks = {}
+        # таблица -> число падающих проверок
+        self._failing_tables = {}
+        # таблица под риском -> множество падающих таблиц-источников
+        self._at_risk = {}
+        self._lineage_version = lineage.version
+        # Растёт при каждом изменении набора падающих таблиц или риска
+        self.version = 0
+        self._update_checks(np.unique(store.column("check_id")))
+        # Подписка после куба: к моменту вызова последние результаты в кубе уже обновлены
+        store.subscribe(lambda _store, start, stop: self._update_checks(
+            np.unique(_store.column("check_id")[start:stop])))
+
+    # ------------------------------------------------------------
+    # Обновление
+    # ------------------------------------------------------------
+    def _update_checks(self, check_ids):
+        """Пересчёт состояния проверок по их последнему результату."""
+        if len(check_ids) == 0:
+            return
+        store = self._store
+        positions = self._cube.latest_of(check_ids)
+        has_result = positions >= 0
+        check_ids, positions = check_ids[has_result], positions[has_result]
+        failing_codes = [store.code_of("check_status_name", s) for s in self._failing_statuses]
+        failing = np.isin(store.column("check_status_name")[positions], failing_codes)
+        table_names = store.categories("table_name")[store.column("table_name")[positions]]
+
+        with self._lock:
+            changed = set()
+            for check_id, table, is_failing in zip(check_ids.tolist(), table_names, failing.tolist()):
+                was_failing = check_id in self._failing_checks
+                if is_failing == was_failing:
+                    continue
+                if is_failing:
+                    self._failing_checks[check_id] = table
+                    count = self._failing_tables.get(table, 0) + 1
+                    self._failing_tables[table] = count
+                    if count == 1:
+                        changed.add(table)
+                else:
+                    table = self._failing_checks.pop(check_id)
+                    count = self._failing_tables[table] - 1
+                    if count:
+                        self._failing_tables[table] = count
+                    else:
+                        del self._failing_tables[table]
+                        changed.add(table)
+            if changed:
+                for table in changed:
+                    self._propagate(table, table in self._failing_tables)
+                self.version += 1
+
+    def _propagate(self, root, failing):
+        """Добавление или снятие риска с потребителей таблицы root."""
+        for table in self._lineage.downstream(root):
+            roots = self._at_risk.setdefault(table, set())
+            if failing:
+                roots.add(root)
+            else:
+                roots.discard(root)
+                if not roots:
+                    del self._at_risk[table]
+
+    def _sync_lineage(self):
+        """Полный пересчёт риска, если граф lineage изменился."""
+        if self._lineage_version == self._lineage.version:
+            return
+        self._at_risk = {}
+        for table in self._failing_tables:
+            self._propagate(table, True)
+        self._lineage_version = self._lineage.version
+        self.version += 1
+
+    # ------------------------------------------------------------
+    # Чтение
+    # ------------------------------------------------------------
+    def failing_tables(self):
+        """{таблица: число падающих проверок}."""
+        with self._lock:
+            return dict(self._failing_tables)
+
+    def at_risk(self):
+        """{таблица под риском: отсортированный список падающих источников}."""
+        with self._lock:
+            self._sync_lineage()
+            return {table: sorted(roots) for table, roots in self._at_risk.items()}
+
+    def risk_sources(self, table):
+        """Падающие таблицы выше по lineage, из-за которых table под риском."""
+        with self._lock:
+            self._sync_lineage()
+            return sorted(self._at_risk.get(table, ()))
+
+    def overlay(self, elements):
+        """Копия элементов Cytoscape с пометкой impact у узлов и связей.
+
+        Узлы: "failing" (своя проверка падает) или "at_risk" (падает источник);
+        связи: "impact", если ведут от падающей таблицы или таблицы под риском
+        к таблице под риском.
+        """
+        with self._lock:
+            self._sync_lineage()
+            failing, at_risk = set(self._failing_tables), set(self._at_risk)
+        affected = failing | at_risk
+        result = []
+        for element in elements:
+            data = element["data"]
+            if "source" in data:
+                impact = "impact" if data["target"] in at_risk and data["source"] in affected else None
+            else:
+                impact = "failing" if data["id"] in failing else "at_risk" if data["id"] in at_risk else None
+            result.append({**element, "data": {**data, "impact": impact}} if impact else element)
+        return result
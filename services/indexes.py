@@ -0,0 +1,214 @@
+"""
+Индексы по ключу (check_id) для точечных запросов страниц.
+
+ResultsKeyIndex -- номера строк хранилища результатов, отсортированные по
+(ключ, время запуска). Диапазон строк ключа находится двоичным поиском,
+поэтому история проверки берётся за O(log n + k) без прохода по всем
+результатам. Новые строки из store.append попадают в небольшую дельту
+(словарь ключ -> номера строк) и периодически вливаются в основной массив.
+
+FrameKeyIndex -- хэш-индекс ключ -> номера строк DataFrame (проверки,
+версии) в заданном порядке сортировки.
+
+KeysetOrder -- строки DataFrame по убыванию (время, id) для keyset-
+пагинации: начало следующей страницы после курсора (время, id) последней
+показанной строки находится двоичным поиском, без OFFSET.
+"""
+import threading
+
+import numpy as np
+
+
+class ResultsKeyIndex:
+    """Строки хранилища по ключу, упорядоченные по времени запуска."""
+
+    def __init__(self, store, key="check_id", compact_ratio=0.125, min_compact_rows=100_000):
+        self._store = store
+        self._key = key
+        self._compact_ratio = compact_ratio
+        self._min_compact_rows = min_compact_rows
+        self._lock = threading.Lock()
+        self._rebuild(len(store))
+        store.subscribe(lambda _store, start, stop: self._add_rows(start, stop))
+
+    def _rebuild(self, n):
+        """Основной массив: все строки [0, n), отсортированные по (ключ, run_ts)."""
+        keys = self._store.column(self._key)[:n]
+        run_ts = self._store.column("run_ts")[:n]
+        order = np.lexsort((run_ts, keys))
+        self._order = order
+        self._sorted_keys = keys[order]
+        self._indexed = n
+        # Конец самого дальнего добавленного диапазона
+        self._stop = n
+        self._delta = {}
+        self._delta_rows = 0
+
+    def _add_rows(self, start, stop):
+        # Слушатели хранилища вызываются вне его блокировки, поэтому диапазоны могут
+        # прийти не по порядку: строки ниже _indexed уже вошли в основной массив при
+        # пересборке, а пересборка идёт до самого дальнего пришедшего диапазона
+        with self._lock:
+            start = max(start, self._indexed)
+            if start >= stop:
+                return
+            self._stop = max(self._stop, stop)
+            keys = self._store.column(self._key)[start:stop]
+            positions = np.arange(start, stop)
+            order = np.argsort(keys, kind="stable")
+            keys, positions = keys[order], positions[order]
+            bounds = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1], True])
+            for lo, hi in zip(bounds[:-1], bounds[1:]):
+                self._delta.setdefault(keys[lo].item(), []).append(positions[lo:hi])
+            self._delta_rows += stop - start
+            if self._delta_rows >= max(self._min_compact_rows, self._compact_ratio * self._indexed):
+                self._rebuild(self._stop)
+
+    def positions(self, key):
+        """Номера строк ключа по возрастанию времени запуска."""
+        with self._lock:
+            lo = np.searchsorted(self._sorted_keys, key, side="left")
+            hi = np.searchsorted(self._sorted_keys, key, side="right")
+            positions = self._order[lo:hi]
+            delta = self._delta.get(key)
+        if delta:
+            extra = np.concatenate(delta)
+            positions = np.concatenate([positions, extra])
+            run_ts = self._store.column("run_ts")[positions]
+            positions = positions[np.argsort(run_ts, kind="stable")]
+        return positions
+
+    def newest(self, key, limit=None):
+        """Номера limit самых свежих строк ключа (по убыванию времени)."""
+        positions = self.positions(key)[::-1]
+        return positions if limit is None else positions[:limit]
+
+
+class FrameKeyIndex:
+    """Хэш-индекс DataFrame: значение ключа -> номера строк (в порядке sort_by)."""
+
+    def __init__(self, df, key, sort_by=None, ascending=True):
+        self._key = key
+        self._sort_by = sort_by
+        self._ascending = ascending
+        self.rebuild(df)
+
+    def rebuild(self, df):
+        """Пересборка индекса (после замены или изменения порядка строк DataFrame)."""
+        ordered = df.sort_values(self._sort_by, ascending=self._ascending, kind="stable") if self._sort_by else df
+        positions = df.index.get_indexer(ordered.index) if self._sort_by else np.arange(len(df))
+        self._df = df
+        self._positions = {
+            key: positions[idx]
+            for key, idx in ordered.groupby(self._key, sort=False, observed=True).indices.items()
+        }
+
+    def rows(self, key):
+        """Строки ключа (пустой DataFrame, если ключа нет)."""
+        return self._df.iloc[self._positions.get(key, np.empty(0, dtype=np.int64))]
+
+    def first(self, key):
+        """Первая строка ключа как словарь или None."""
+        positions = self._positions.get(key)
+        if positions is None or len(positions) == 0:
+            return None
+        return self._df.iloc[positions[0]].to_dict()
+
+
+class KeyRevisions:
+    """Ревизии изменений строк по ключу: какие строки менялись после ревизии N.
+
+    Клиент, показывающий данные на ревизии N, получает только строки,
+    изменённые позже (для дельта-обновлений таблиц).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.revision = 0
+        # ключ -> ревизия последнего изменения
+        self._changed = {}
+
+    def touch(self, keys):
+        """Отметка изменения строк; возвращает новую ревизию."""
+        with self._lock:
+            self.revision += 1
+            for key in keys:
+                self._changed[key] = self.revision
+            return self.revision
+
+    def changed_since(self, revision):
+        """Ключи строк, изменённых после ревизии revision."""
+        with self._lock:
+            if revision >= self.revision:
+                return []
+            return [key for key, changed in self._changed.items() if changed > revision]
+
+
+class KeysetOrder:
+    """Строки DataFrame по убыванию (ts, key) и страницы после курсора [ts в нс, key].
+
+    rebuild подменяет порядок целиком; view() -- согласованный снимок (frame и
+    ключи сортировки) для колбэка, который читает и маску, и страницу.
+    """
+
+    def __init__(self, df, ts, key):
+        self._ts = ts
+        self._key = key
+        self.rebuild(df)
+
+    def rebuild(self, df):
+        """Пересборка порядка (после изменения DataFrame)."""
+        frame = df.sort_values([self._ts, self._key], ascending=False, kind="stable").reset_index(drop=True)
+        # Ключи сортировки со знаком минус -- по возрастанию, для searchsorted
+        neg_ts = -frame[self._ts].to_numpy("datetime64[ns]").astype(np.int64)
+        neg_key = -frame[self._key].to_numpy(np.int64)
+        self._view = _KeysetView(frame, neg_ts, neg_key)
+
+    def view(self):
+        return self._view
+
+    @property
+    def frame(self):
+        return self._view.frame
+
+    def cursor(self, position):
+        return self._view.cursor(position)
+
+    def start(self, cursor):
+        return self._view.start(cursor)
+
+    def page(self, mask=None, cursor=None, limit=50):
+        return self._view.page(mask, cursor, limit)
+
+
+class _KeysetView:
+    __slots__ = ("frame", "_neg_ts", "_neg_key")
+
+    def __init__(self, frame, neg_ts, neg_key):
+        self.frame = frame
+        self._neg_ts = neg_ts
+        self._neg_key = neg_key
+
+    def cursor(self, position):
+        """Курсор строки position отсортированного frame (JSON-совместимый)."""
+        return [int(-self._neg_ts[position]), int(-self._neg_key[position])]
+
+    def start(self, cursor):
+        """Позиция первой строки строго после курсора."""
+        if not cursor:
+            return 0
+        ts, key = -int(cursor[0]), -int(cursor[1])
+        lo = int(np.searchsorted(self._neg_ts, ts, side="left"))
+        hi = int(np.searchsorted(self._neg_ts, ts, side="right"))
+        return lo + int(np.searchsorted(self._neg_key[lo:hi], key, side="right"))
+
+    def page(self, mask=None, cursor=None, limit=50):
+        """Позиции frame следующей страницы (по mask) и курсор для следующей (None -- конец)."""
+        start = self.start(cursor)
+        if mask is None:
+            positions = np.arange(start, min(start + limit + 1, len(self.frame)))
+        else:
+            positions = start + np.flatnonzero(mask[start:])[:limit + 1]
+        has_more = len(positions) > limit
+        positions = positions[:limit]
+        return positions, self.cursor(positions[-1]) if has_more else None
@@ -0,0 +1,205 @@
+"""
+Граф lineage таблиц: транзитивные источники и потребители.
+
+Таблицы нумеруются при добавлении, связи хранятся двумя списками
+смежности по номерам (источники и потребители каждой таблицы), поэтому
+обход в любую сторону -- BFS без поиска по словарю описаний. Обход
+помнит посещённые узлы и корректно завершается на циклах; глубина
+задаётся числом шагов (None -- без ограничения).
+
+Замыкания (таблица, направление, глубина) и элементы графа целиком
+(по функции слоя) кэшируются в одном ограниченном LRU и сбрасываются
+при изменении графа. Элементы Cytoscape для окрестности
+таблицы и для графа целиком собираются из закэшированных замыканий.
+"""
+import threading
+from collections import OrderedDict, deque
+
+UPSTREAM = "upstream"
+DOWNSTREAM = "downstream"
+
+DEFAULT_CACHE_SIZE = 4096
+
+
+class LineageGraph:
+    """Ориентированный граф источник -> потребитель с индексами в обе стороны."""
+
+    def __init__(self, cache_size=DEFAULT_CACHE_SIZE):
+        self._lock = threading.Lock()
+        self._ids = {}
+        self._names = []
+        # Номер таблицы -> номера её источников / потребителей
+        self._sources = []
+        self._targets = []
+        # Связи (источник, потребитель) в порядке добавления
+        self._edges = {}
+        self._cache = OrderedDict()
+        self._cache_size = cache_size
+        # Растёт при каждом изменении графа
+        self.version = 0
+
+    @classmethod
+    def from_mapping(cls, mapping, **kwargs):
+        """Граф из словаря {таблица: {"sources": [...], "targets": [...]}}."""
+        graph = cls(**kwargs)
+        for table, info in mapping.items():
+            graph.add_table(table)
+            for source in info.get("sources", []):
+                graph.add_edge(source, table)
+            for target in info.get("targets", []):
+                graph.add_edge(table, target)
+        return graph
+
+    # ------------------------------------------------------------
+    # Изменение графа
+    # ------------------------------------------------------------
+    def _node(self, table):
+        node = self._ids.get(table)
+        if node is None:
+            node = self._ids[table] = len(self._names)
+            self._names.append(table)
+            self._sources.append([])
+            self._targets.append([])
+        return node
+
+    def add_table(self, table):
+        with self._lock:
+            if table not in self._ids:
+                self._node(table)
+                self._changed()
+
+    def add_edge(self, source, target):
+        """Связь «source питает target» (повторная связь игнорируется)."""
+        with self._lock:
+            src, tgt = self._node(source), self._node(target)
+            if (src, tgt) in self._edges:
+                return
+            self._edges[src, tgt] = None
+            self._targets[src].append(tgt)
+            self._sources[tgt].append(src)
+            self._changed()
+
+    def _changed(self):
+        self.version += 1
+        self._cache.clear()
+
+    def _remember(self, key, value):
+        """Запись в LRU (под self._lock): замыкания и графы целиком делят один предел."""
+        self._cache[key] = value
+        if len(self._cache) > self._cache_size:
+            self._cache.popitem(last=False)
+
+    # ------------------------------------------------------------
+    # Обход
+    # ------------------------------------------------------------
+    def __contains__(self, table):
+        return table in self._ids
+
+    def __len__(self):
+        return len(self._names)
+
+    @property
+    def edge_count(self):
+        return len(self._edges)
+
+    def sources(self, table):
+        """Непосредственные источники таблицы."""
+        node = self._ids.get(table)
+        return [] if node is None else [self._names[i] for i in self._sources[node]]
+
+    def targets(self, table):
+        """Непосредственные потребители таблицы."""
+        node = self._ids.get(table)
+        return [] if node is None else [self._names[i] for i in self._targets[node]]
+
+    def _closure(self, node, direction, depth):
+        """{номер узла: расстояние} для узлов в пределах depth шагов (без самого узла)."""
+        key = (node, direction, depth)
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None:
+                self._cache.move_to_end(key)
+                return cached
+            adjacency = self._sources if direction == UPSTREAM else self._targets
+            distances = {node: 0}
+            queue = deque([node])
+            while queue:
+                current = queue.popleft()
+                distance = distances[current] + 1
+                if depth is not None and distance > depth:
+                    continue
+                for neighbour in adjacency[current]:
+                    if neighbour not in distances:
+                        distances[neighbour] = distance
+                        queue.append(neighbour)
+            del distances[node]
+            self._remember(key, distances)
+            return distances
+
+    def upstream(self, table, depth=None):
+        """Транзитивные источники: {таблица: расстояние}."""
+        node = self._ids.get(table)
+        if node is None:
+            return {}
+        return {self._names[i]: d for i, d in self._closure(node, UPSTREAM, depth).items()}
+
+    def downstream(self, table, depth=None):
+        """Транзитивные потребители: {таблица: расстояние}."""
+        node = self._ids.get(table)
+        if node is None:
+            return {}
+        return {self._names[i]: d for i, d in self._closure(node, DOWNSTREAM, depth).items()}
+
+    # ------------------------------------------------------------
+    # Cytoscape
+    # ------------------------------------------------------------
+    def _node_element(self, node, layer, distance=None):
+        name = self._names[node]
+        data = {"id": name, "label": name.split(".")[-1], "full_name": name, "layer": layer}
+        if distance is not None:
+            data["distance"] = distance
+        return {"data": data}
+
+    def _edge_element(self, src, tgt):
+        return {"data": {"source": self._names[src], "target": self._names[tgt]}}
+
+    def cytoscape(self, table, upstream_depth=2, downstream_depth=2):
+        """Окрестность таблицы: слои center / source / target и связи вдоль обхода.
+
+        Отрицательное расстояние у источников, положительное -- у потребителей.
+        """
+        node = self._ids.get(table)
+        if node is None:
+            return [{"data": {"id": table, "label": table.split(".")[-1], "full_name": table,
+                              "layer": "center", "distance": 0}}]
+        up = self._closure(node, UPSTREAM, upstream_depth)
+        down = self._closure(node, DOWNSTREAM, downstream_depth)
+
+        elements = [self._node_element(node, "center", 0)]
+        elements += [self._node_element(i, "source", -d) for i, d in up.items() if i not in down]
+        elements += [self._node_element(i, "target", d) for i, d in down.items()]
+
+        # Связи, по которым прошёл обход: к узлу ближе на один шаг
+        edges = []
+        for i, d in up.items():
+            edges += [(i, j) for j in self._targets[i] if j == node or up.get(j) == d - 1]
+        for i, d in down.items():
+            edges += [(j, i) for j in self._sources[i] if j == node or down.get(j) == d - 1]
+        elements += [self._edge_element(src, tgt) for src, tgt in dict.fromkeys(edges)]
+        return elements
+
+    def graph_elements(self, layer=None):
+        """Граф целиком; layer(имя таблицы) задаёт слой узла (по умолчанию "other")."""
+        key = ("graph", layer)
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None:
+                self._cache.move_to_end(key)
+                return cached
+            elements = [
+                self._node_element(node, layer(name) if layer else "other")
+                for node, name in enumerate(self._names)
+            ]
+            elements += [self._edge_element(src, tgt) for src, tgt in self._edges]
+            self._remember(key, elements)
+            return elements
@@ -0,0 +1,194 @@
+"""
+Метрики задержек колбэков Dash в формате Prometheus.
+
+instrument_app(app) оборачивает все серверные колбэки приложения (из
+app.callback и dash.callback страниц) и HTTP-обработчики Flask, а также
+добавляет endpoint /metrics. Для каждого колбэка собираются гистограммы:
+    dqt_callback_duration_seconds       -- полное время обработки;
+    dqt_callback_serialize_seconds      -- сериализация ответа в JSON;
+    dqt_callback_response_bytes         -- размер ответа;
+и счётчики вызовов/ошибок по id триггера.
+
+Включается переменной окружения DQT_METRICS=1. В выключенном состоянии
+колбэки не оборачиваются и накладных расходов нет. Метрики собираются в
+памяти процесса -- при нескольких worker'ах gunicorn каждый отдаёт свои.
+"""
+import bisect
+import os
+import threading
+import time
+from collections import defaultdict
+
+import dash
+from dash import _callback as dash_callback
+from flask import Response, g, request
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (1_000, 10_000, 100_000, 1_000_000, 10_000_000)
+
+
+def metrics_enabled():
+    return os.environ.get("DQT_METRICS", "") in ("1", "true", "yes")
+
+
+class Histogram:
+    """Гистограмма с фиксированными границами корзин (как в Prometheus)."""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class MetricsRegistry:
+    """Гистограммы и счётчики с метками; вывод в текстовом формате Prometheus."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # имя -> (тип, описание, границы)
+        self._meta = {}
+        # имя -> {метки: Histogram или число}
+        self._series = defaultdict(dict)
+
+    def histogram(self, name, help_text, buckets=DURATION_BUCKETS):
+        self._meta[name] = ("histogram", help_text, buckets)
+
+    def counter(self, name, help_text):
+        self._meta[name] = ("counter", help_text, None)
+
+    def observe(self, name, value, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._series[name]
+            hist = series.get(key)
+            if hist is None:
+                hist = series[key] = Histogram(self._meta[name][2])
+            hist.observe(value)
+
+    def inc(self, name, value=1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._series[name]
+            series[key] = series.get(key, 0) + value
+
+    def render(self):
+        """Текстовый формат экспозиции Prometheus."""
+        lines = []
+        with self._lock:
+            for name, (kind, help_text, buckets) in self._meta.items():
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+                for key, value in sorted(self._series.get(name, {}).items()):
+                    labels = ",".join(f'{k}="{_escape(v)}"' for k, v in key)
+                    if kind == "counter":
+                        lines.append(f"{name}{{{labels}}} {value}")
+                        continue
+                    cumulative = 0
+                    for bound, count in zip(buckets + (float("inf"),), value.counts):
+                        cumulative += count
+                        le = "+Inf" if bound == float("inf") else repr(bound)
+                        sep = "," if labels else ""
+                        lines.append(f'{name}_bucket{{{labels}{sep}le="{le}"}} {cumulative}')
+                    lines.append(f"{name}_sum{{{labels}}} {value.sum}")
+                    lines.append(f"{name}_count{{{labels}}} {value.count}")
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+METRICS = MetricsRegistry()
+METRICS.histogram("dqt_callback_duration_seconds", "Полное время обработки колбэка")
+METRICS.histogram("dqt_callback_serialize_seconds", "Время сериализации ответа колбэка")
+METRICS.histogram("dqt_callback_response_bytes", "Размер ответа колбэка", SIZE_BUCKETS)
+METRICS.counter("dqt_callback_calls_total", "Вызовы колбэков по триггеру")
+METRICS.counter("dqt_callback_errors_total", "Ошибки колбэков")
+METRICS.histogram("dqt_http_request_duration_seconds", "Время обработки HTTP-запросов Flask")
+
+# Время сериализации текущего вызова колбэка (на поток)
+_serialize = threading.local()
+
+
+def _timed_to_json(to_json):
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return to_json(*args, **kwargs)
+        finally:
+            _serialize.seconds = getattr(_serialize, "seconds", 0.0) + time.perf_counter() - start
+    return wrapper
+
+
+def _trigger_label(callback_ctx):
+    """id компонента-триггера (pattern-matching id остаётся JSON-строкой)."""
+    triggered = (callback_ctx or {}).get("triggered_inputs") or []
+    if not triggered:
+        return "initial"
+    return triggered[0]["prop_id"].rsplit(".", 1)[0]
+
+
+def _instrument_callback(name, func):
+    def wrapper(*args, **kwargs):
+        _serialize.seconds = 0.0
+        # Контекст Dash передаёт в обёртку колбэка через kwargs
+        trigger = _trigger_label(kwargs.get("callback_context"))
+        start = time.perf_counter()
+        try:
+            response = func(*args, **kwargs)
+        except dash.exceptions.PreventUpdate:
+            METRICS.inc("dqt_callback_calls_total", callback=name, trigger=trigger)
+            raise
+        except Exception:
+            METRICS.inc("dqt_callback_errors_total", callback=name)
+            raise
+        METRICS.observe("dqt_callback_duration_seconds", time.perf_counter() - start, callback=name)
+        METRICS.observe("dqt_callback_serialize_seconds", _serialize.seconds, callback=name)
+        if isinstance(response, (str, bytes)):
+            METRICS.observe("dqt_callback_response_bytes", len(response), callback=name)
+        METRICS.inc("dqt_callback_calls_total", callback=name, trigger=trigger)
+        return response
+
+    wrapper.__wrapped__ = func
+    return wrapper
+
+
+def instrument_app(app):
+    """Подключение метрик к приложению (если включены DQT_METRICS)."""
+    if not metrics_enabled():
+        return False
+
+    dash_callback.to_json = _timed_to_json(dash_callback.to_json)
+    for callback_map in (dash_callback.GLOBAL_CALLBACK_MAP, app.callback_map):
+        for entry in callback_map.values():
+            func = entry.get("callback")
+            if func is None:  # clientside-колбэк
+                continue
+            name = f"{getattr(func, '__module__', '')}.{getattr(func, '__name__', 'callback')}"
+            entry["callback"] = _instrument_callback(name, func)
+
+    server = app.server
+
+    @server.before_request
+    def _start_timer():
+        g.dqt_request_start = time.perf_counter()
+
+    @server.after_request
+    def _record_request(response):
+        start = getattr(g, "dqt_request_start", None)
+        if start is not None:
+            METRICS.observe("dqt_http_request_duration_seconds", time.perf_counter() - start,
+                            endpoint=request.endpoint or "unknown")
+        return response
+
+    @server.route("/metrics")
+    def metrics():
+        return Response(METRICS.render(), mimetype="text/plain; version=0.0.4; charset=utf-8")
+
+    return True
@@ -0,0 +1,366 @@
+"""
+Отправка оповещений по правилам алертов (Telegram, email).
+
+Оповещения не отправляются в потоке, который их создал: enqueue только
+кладёт сообщение в очередь asyncio-цикла в отдельном потоке. Цикл копит
+сообщения BATCH_WINDOW секунд после первого и отправляет их пачками по
+получателю и каналу: одно сообщение уходит как есть, несколько -- одним
+дайджестом (не больше max_batch алертов: тема и текст каждого, тексты
+укорачиваются, чтобы дайджест уместился в max_text канала). Массовое падение
+сотен проверок даёт несколько дайджестов на получателя, а не сотни писем.
+
+Каждый канал отправляет не чаще rate сообщений в секунду (token bucket с
+запасом burst). Ошибка отправки повторяется с экспоненциальной задержкой
+(до MAX_RETRIES раз); ответ Telegram 429 -- через указанный retry_after.
+Сама отправка (urllib / smtplib) выполняется в пуле потоков цикла.
+
+Настройки через переменные окружения (канал без настроек не используется):
+    DQT_TELEGRAM_TOKEN, DQT_TELEGRAM_API -- бот и адрес Bot API
+        (по умолчанию https://api.telegram.org; для заглушки -- http://localhost:PORT);
+    DQT_SMTP_HOST, DQT_SMTP_PORT, DQT_SMTP_FROM, DQT_SMTP_USER, DQT_SMTP_PASSWORD,
+    DQT_SMTP_STARTTLS=1 -- SMTP-сервер для email;
+    DQT_NOTIFY_BATCH_SEC -- окно накопления дайджеста, сек.
+"""
+import asyncio
+import json
+import os
+import random
+import re
+import smtplib
+import threading
+import urllib.error
+import urllib.request
+from email.message import EmailMessage
+
+import pandas as pd
+
+TELEGRAM_MAX_TEXT = 4096
+
+# Канал -> лимит отправки (сообщений в секунду), запас, размер и предел длины дайджеста
+CHANNEL_LIMITS = {
+    "telegram": {"rate": 1.0, "burst": 5, "max_batch": 50, "max_text": TELEGRAM_MAX_TEXT},
+    "email": {"rate": 2.0, "burst": 10, "max_batch": 200},
+}
+
+BATCH_WINDOW = float(os.environ.get("DQT_NOTIFY_BATCH_SEC", 10))
+MAX_RETRIES = 5
+BACKOFF = 1.0
+
+# События движка алертов, по которым отправляются оповещения
+NOTIFY_EVENTS = ("opened", "flapping")
+
+
+class RetryAfter(Exception):
+    """Канал просит повторить не раньше чем через seconds секунд."""
+
+    def __init__(self, seconds):
+        super().__init__(f"retry after {seconds} s")
+        self.seconds = seconds
+
+
+class PermanentError(Exception):
+    """Ошибка, которую повтор не исправит (неверный получатель и т.п.)."""
+
+
+# ============================================================
+# Каналы
+# ============================================================
+class TelegramSender:
+    channel = "telegram"
+
+    def __init__(self, token, api_url="https://api.telegram.org", timeout=10):
+        self._url = f"{api_url.rstrip('/')}/bot{token}/sendMessage"
+        self._timeout = timeout
+
+    def send(self, recipient, subject, body):
+        text = f"{subject}\n\n{body}"[:TELEGRAM_MAX_TEXT]
+        request = urllib.request.Request(
+            self._url, data=json.dumps({"chat_id": recipient, "text": text}).encode(),
+            headers={"Content-Type": "application/json"},
+        )
+        try:
+            with urllib.request.urlopen(request, timeout=self._timeout) as response:
+                response.read()
+        except urllib.error.HTTPError as e:
+            if e.code == 429:
+                try:
+                    retry_after = json.loads(e.read())["parameters"]["retry_after"]
+                except (ValueError, KeyError, TypeError):
+                    retry_after = BACKOFF
+                raise RetryAfter(float(retry_after)) from e
+            if 400 <= e.code < 500:
+                raise PermanentError(f"Telegram {e.code}: {recipient}") from e
+            raise
+
+
+class EmailSender:
+    channel = "email"
+
+    def __init__(self, host, port=25, sender="dqt@localhost", user=None, password=None, starttls=False, timeout=10):
+        self._host, self._port = host, port
+        self._sender = sender
+        self._user, self._password = user, password
+        self._starttls = starttls
+        self._timeout = timeout
+
+    def send(self, recipient, subject, body):
+        message = EmailMessage()
+        message["From"] = self._sender
+        message["To"] = recipient
+        message["Subject"] = subject
+        message.set_content(body)
+        try:
+            with smtplib.SMTP(self._host, self._port, timeout=self._timeout) as smtp:
+                if self._starttls:
+                    smtp.starttls()
+                if self._user:
+                    smtp.login(self._user, self._password)
+                smtp.send_message(message)
+        except smtplib.SMTPRecipientsRefused as e:
+            raise PermanentError(f"SMTP: получатель отклонён: {recipient}") from e
+
+
+def senders_from_env():
+    senders = []
+    if os.environ.get("DQT_TELEGRAM_TOKEN"):
+        senders.append(TelegramSender(os.environ["DQT_TELEGRAM_TOKEN"],
+                                      os.environ.get("DQT_TELEGRAM_API", "https://api.telegram.org")))
+    if os.environ.get("DQT_SMTP_HOST"):
+        senders.append(EmailSender(
+            os.environ["DQT_SMTP_HOST"], int(os.environ.get("DQT_SMTP_PORT", 25)),
+            os.environ.get("DQT_SMTP_FROM", "dqt@localhost"),
+            os.environ.get("DQT_SMTP_USER"), os.environ.get("DQT_SMTP_PASSWORD"),
+            os.environ.get("DQT_SMTP_STARTTLS") == "1",
+        ))
+    return senders
+
+
+# ============================================================
+# Диспетчер
+# ============================================================
+class _TokenBucket:
+    def __init__(self, rate, burst):
+        self._rate, self._burst = rate, burst
+        self._tokens = float(burst)
+        self._updated = None
+
+    async def acquire(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            now = loop.time()
+            if self._updated is not None:
+                self._tokens = min(self._burst, self._tokens + (now - self._updated) * self._rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return
+            await asyncio.sleep((1 - self._tokens) / self._rate)
+
+
+def digest(items, max_text=None):
+    """(тема, текст) для пачки сообщений одному получателю.
+
+    max_text -- предел длины «тема + текст» канала: каждый алерт дайджеста
+    укорачивается до равной доли, чтобы ни один не пропал целиком.
+    """
+    if len(items) == 1:
+        return items[0]
+    subject = f"[DQT] Алертов: {len(items)}"
+    header = f"Новые алерты ({len(items)}):"
+    blocks = [f"• {item_subject}\n{body}" if body else f"• {item_subject}" for item_subject, body in items]
+    if max_text is not None:
+        # Тема и текст отправляются через пустую строку, блоки разделены пустой строкой
+        share = (max_text - len(subject) - len(header) - 2) // len(items) - 2
+        blocks = [block if len(block) <= share else block[:max(share - 1, 0)] + "…" for block in blocks]
+    return subject, "\n\n".join([header, *blocks])
+
+
+class NotificationDispatcher:
+    """Очередь оповещений с дайджестами, лимитами каналов и повторами."""
+
+    def __init__(self, senders, limits=CHANNEL_LIMITS, batch_window=BATCH_WINDOW, max_retries=MAX_RETRIES,
+                 backoff=BACKOFF):
+        self._senders = {sender.channel: sender for sender in senders}
+        self._limits = limits
+        self.batch_window = batch_window
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self._lock = threading.Lock()
+        self._thread = None
+        self._started = threading.Event()
+        self._loop = None
+        self._queue = None
+        self._buckets = {}
+        # Сообщений в очереди и в отправке
+        self._outstanding = 0
+        self._idle = threading.Condition(self._lock)
+        self._stats = {
+            channel: dict.fromkeys(("queued", "sent", "messages", "digests", "retries", "failed"), 0)
+            for channel in self._senders
+        }
+
+    @classmethod
+    def from_env(cls, **kwargs):
+        return cls(senders_from_env(), **kwargs)
+
+    @property
+    def channels(self):
+        return tuple(self._senders)
+
+    def enqueue(self, channel, recipient, subject, body):
+        """Постановка сообщения в очередь (без ожидания). False -- канал не настроен."""
+        if channel not in self._senders:
+            return False
+        self._start()
+        with self._lock:
+            self._outstanding += 1
+            self._stats[channel]["queued"] += 1
+        self._loop.call_soon_threadsafe(self._queue.put_nowait, (channel, recipient, subject, body))
+        return True
+
+    def wait_idle(self, timeout=None):
+        """Ожидание отправки всех поставленных сообщений. True -- очередь пуста."""
+        with self._idle:
+            return self._idle.wait_for(lambda: self._outstanding == 0, timeout)
+
+    def stats(self):
+        with self._lock:
+            return {channel: dict(stats) for channel, stats in self._stats.items()}
+
+    # ------------------------------------------------------------
+    # Цикл отправки
+    # ------------------------------------------------------------
+    def _start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="dqt-notify", daemon=True)
+                self._thread.start()
+        self._started.wait()
+
+    def _run(self):
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        self._queue = asyncio.Queue()
+        self._buckets = {
+            channel: _TokenBucket(self._limits[channel]["rate"], self._limits[channel]["burst"])
+            for channel in self._senders
+        }
+        self._loop = loop
+        loop.create_task(self._collect())
+        self._started.set()
+        loop.run_forever()
+
+    async def _collect(self):
+        """Накопление сообщений за окно и отправка пачками по (канал, получатель)."""
+        loop = asyncio.get_running_loop()
+        while True:
+            pending = {}
+            item = await self._queue.get()
+            deadline = loop.time() + self.batch_window
+            while True:
+                channel, recipient, subject, body = item
+                pending.setdefault((channel, recipient), []).append((subject, body))
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), remaining)
+                except asyncio.TimeoutError:
+                    break
+            for (channel, recipient), items in pending.items():
+                size = self._limits[channel]["max_batch"]
+                for i in range(0, len(items), size):
+                    loop.create_task(self._deliver(channel, recipient, items[i:i + size]))
+
+    async def _deliver(self, channel, recipient, items):
+        subject, body = digest(items, self._limits[channel].get("max_text"))
+        stats = self._stats[channel]
+        delivered = False
+        for attempt in range(self.max_retries + 1):
+            await self._buckets[channel].acquire()
+            try:
+                await asyncio.to_thread(self._senders[channel].send, recipient, subject, body)
+                delivered = True
+                break
+            except PermanentError:
+                break
+            except RetryAfter as e:
+                delay = e.seconds
+            except Exception:
+                delay = self.backoff * 2 ** attempt * (1 + random.random() / 10)
+            if attempt < self.max_retries:
+                with self._lock:
+                    stats["retries"] += 1
+                await asyncio.sleep(delay)
+        with self._idle:
+            if delivered:
+                stats["sent"] += len(items)
+                stats["messages"] += 1
+                stats["digests"] += len(items) > 1
+            else:
+                stats["failed"] += len(items)
+            self._outstanding -= len(items)
+            self._idle.notify_all()
+
+
+# ============================================================
+# Правила алертов
+# ============================================================
+_EMAIL = re.compile(r"^[^@\s]+@[^@\s]+\.[^@\s]+$")
+_TELEGRAM = re.compile(r"^(@\w+|-?\d+)$")
+
+
+def parse_recipients(text, channel):
+    """[(канал, получатель)] из строки «@user1, user@company.com» для канала правила (или both)."""
+    recipients = []
+    for recipient in re.split(r"[,;\s]+", text or ""):
+        if _EMAIL.match(recipient) and channel in ("email", "both"):
+            recipients.append(("email", recipient))
+        elif _TELEGRAM.match(recipient) and channel in ("telegram", "both"):
+            recipients.append(("telegram", recipient))
+    return recipients
+
+
+def alert_values(incident, check=None):
+    """Значения переменных шаблона для инцидента (строки)."""
+    threshold = check.get("threshold") if check else None
+    return {
+        "check_name": incident["check_name"] or "",
+        "table_name": incident["table_name"] or "",
+        "status": incident["check_status"],
+        "run_time": pd.Timestamp(incident["last_seen"]).strftime("%Y-%m-%d %H:%M"),
+        "rows_checked": f"{incident['rows_checked']:,}",
+        "rows_failed": f"{incident['rows_failed']:,}",
+        "domain": incident["domain"] or "",
+        "owner": incident["owner"] or "",
+        "error_message": incident.get("error_message") or "",
+        "threshold": f"{threshold:.2%}" if threshold is not None else "",
+    }
+
+
+def notify_alert_events(dispatcher, rules, events, lookup=None):
+    """Оповещения по событиям движка алертов для подходящих правил (RuleSet). Возвращает число сообщений."""
+    # rule_id -> (правило, виды событий, значения): шаблоны правила подставляются пачкой
+    batches = {}
+    for kind, incident in events:
+        if kind not in NOTIFY_EVENTS:
+            continue
+        matched = rules.match_incident(incident)
+        if not matched:
+            continue
+        values = alert_values(incident, lookup(incident["check_id"]) if lookup else None)
+        for rule in matched:
+            _, kinds, values_list = batches.setdefault(rule["rule_id"], (rule, [], []))
+            kinds.append(kind)
+            values_list.append(values)
+
+    count = 0
+    for rule, kinds, values_list in batches.values():
+        subjects = rule["subject_template"].render_many(values_list)
+        bodies = rule["body_template"].render_many(values_list)
+        for kind, subject, body in zip(kinds, subjects, bodies):
+            if kind == "flapping":
+                subject += " (нестабильна)"
+            for channel, recipient in rule.get("recipients", ()):
+                count += dispatcher.enqueue(channel, recipient, subject, body)
+    return count
@@ -0,0 +1,300 @@
+"""
+Пулы подключений к источникам данных (по пулу на подключение из CONNECTIONS).
+
+Пул держит не больше max_size подключений -- это и ограничение числа
+одновременных запросов к источнику: остальные ждут освобождения
+подключения (не дольше acquire_timeout). Свободные подключения
+переиспользуются (последнее освобождённое -- первым); простаивающие
+дольше max_idle закрываются, пока в пуле больше min_size подключений.
+min_size подключений открываются заранее и восполняются после закрытия:
+это, как и закрытие простаивающих, делает поток обслуживания пулов раз в
+DQT_POOL_MAINTAIN_INTERVAL секунд (по умолчанию 30; сразу -- при
+создании пула).
+Перед выдачей подключение, которое не проверялось дольше
+health_interval, проверяется запросом SELECT 1; после ошибки запроса --
+сразу при возврате. Неисправные подключения закрываются и заменяются.
+
+Размеры пулов по умолчанию заданы в CONNECTIONS (ключ "pool") и
+переопределяются переменными окружения DQT_POOL_<ИМЯ>_MIN / _MAX.
+stats() отдаёт занятые/свободные подключения, ожидающих и время
+ожидания -- для вкладки «Подключения» страницы настроек.
+"""
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from services.connections import CONNECTIONS, connect
+
+DEFAULT_POOL = {"min_size": 0, "max_size": 5, "max_idle": 300, "health_interval": 30, "acquire_timeout": 30}
+
+# Период обслуживания пулов (закрытие простаивающих, добор до min_size), сек
+MAINTAIN_INTERVAL = float(os.environ.get("DQT_POOL_MAINTAIN_INTERVAL", 30))
+
+
+class PoolTimeout(Exception):
+    """Нет свободного подключения за acquire_timeout."""
+
+
+class _Entry:
+    __slots__ = ("conn", "dialect", "released", "checked")
+
+    def __init__(self, conn, dialect):
+        self.conn, self.dialect = conn, dialect
+        self.released = self.checked = time.monotonic()
+
+
+class ConnectionPool:
+    """Пул подключений одного источника."""
+
+    def __init__(self, name, factory, min_size=0, max_size=5, max_idle=300, health_interval=30,
+                 acquire_timeout=30):
+        self.name = name
+        self._factory = factory
+        self.min_size, self.max_size = min_size, max_size
+        self.max_idle, self.health_interval = max_idle, health_interval
+        self.acquire_timeout = acquire_timeout
+        self._cond = threading.Condition()
+        self._idle = deque()
+        # Подключений всего (включая открываемые прямо сейчас)
+        self._size = 0
+        self._in_use = 0
+        self._waiting = 0
+        self._counters = dict.fromkeys(
+            ("acquired", "created", "closed_idle", "closed_broken", "timeouts"), 0)
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    # ------------------------------------------------------------
+    # Выдача и возврат
+    # ------------------------------------------------------------
+    def acquire(self, timeout=None):
+        """Подключение из пула: _Entry с полями conn и dialect."""
+        timeout = self.acquire_timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        # Ожидание учитывается один раз на acquire, даже если неисправное подключение заменялось
+        waited = 0.0
+        while True:
+            entry, wait = self._take(deadline, timeout)
+            waited += wait
+            if entry is None:
+                break
+            # Проверка выполняется вне блокировки: остальные потоки не ждут запроса к БД
+            if time.monotonic() - entry.checked < self.health_interval or self._healthy(entry):
+                self._record_wait(waited)
+                return entry
+            with self._cond:
+                self._in_use -= 1
+                self._counters["acquired"] -= 1
+                self._close(entry, "closed_broken")
+        self._record_wait(waited)
+        try:
+            entry = _Entry(*self._factory())
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._in_use -= 1
+                self._cond.notify()
+            raise
+        with self._cond:
+            self._counters["created"] += 1
+        return entry
+
+    def _take(self, deadline, timeout):
+        """(свободное подключение или None, если зарезервировано место под новое; время ожидания)."""
+        started = time.monotonic()
+        with self._cond:
+            self._evict_idle()
+            self._waiting += 1
+            try:
+                while not self._idle and self._size >= self.max_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._counters["timeouts"] += 1
+                        raise PoolTimeout(f"Нет свободного подключения к {self.name} за {timeout} с")
+                    self._cond.wait(remaining)
+            finally:
+                self._waiting -= 1
+            if self._idle:
+                entry = self._idle.pop()
+            else:
+                entry = None
+                self._size += 1
+            self._in_use += 1
+            self._counters["acquired"] += 1
+            return entry, time.monotonic() - started
+
+    def _record_wait(self, waited):
+        with self._cond:
+            self._wait_total += waited
+            self._wait_max = max(self._wait_max, waited)
+
+    def release(self, entry, failed=False):
+        """Возврат подключения; после ошибки запроса оно сначала проверяется."""
+        broken = False
+        if failed:
+            if entry.dialect != "sqlite":
+                try:
+                    entry.conn.rollback()
+                except Exception:
+                    pass
+            broken = not self._healthy(entry)
+        with self._cond:
+            self._in_use -= 1
+            if broken:
+                self._close(entry, "closed_broken")
+            else:
+                entry.released = time.monotonic()
+                self._idle.append(entry)
+            self._cond.notify()
+        if broken:
+            self._fill()
+
+    @contextmanager
+    def connection(self, timeout=None):
+        """with pool.connection() as (conn, dialect): ..."""
+        entry = self.acquire(timeout)
+        failed = False
+        try:
+            yield entry.conn, entry.dialect
+        except Exception:
+            failed = True
+            raise
+        finally:
+            self.release(entry, failed=failed)
+
+    # ------------------------------------------------------------
+    # Обслуживание
+    # ------------------------------------------------------------
+    def _healthy(self, entry):
+        try:
+            cur = entry.conn.cursor()
+            cur.execute("SELECT 1")
+            cur.fetchall()
+            entry.checked = time.monotonic()
+            return True
+        except Exception:
+            return False
+
+    def _close(self, entry, counter):
+        self._size -= 1
+        self._counters[counter] += 1
+        try:
+            entry.conn.close()
+        except Exception:
+            pass
+
+    def _evict_idle(self):
+        """Закрытие подключений, простаивающих дольше max_idle (сверх min_size)."""
+        now = time.monotonic()
+        # Слева -- дольше всех простаивающие
+        while self._idle and self._size > self.min_size and now - self._idle[0].released > self.max_idle:
+            self._close(self._idle.popleft(), "closed_idle")
+
+    def _fill(self):
+        """Открытие подключений до min_size (при ошибке -- повтор при следующем обслуживании)."""
+        while True:
+            with self._cond:
+                if self._size >= self.min_size:
+                    return
+                self._size += 1
+            try:
+                entry = _Entry(*self._factory())
+            except Exception:
+                with self._cond:
+                    self._size -= 1
+                    self._cond.notify()
+                return
+            with self._cond:
+                self._counters["created"] += 1
+                self._idle.append(entry)
+                self._cond.notify()
+
+    def maintain(self):
+        """Обслуживание: закрытие простаивающих сверх min_size и добор до min_size."""
+        with self._cond:
+            self._evict_idle()
+        self._fill()
+
+    def close_all(self):
+        """Закрытие свободных подключений (занятые закроются при возврате сверх лимита)."""
+        with self._cond:
+            while self._idle:
+                self._close(self._idle.popleft(), "closed_idle")
+
+    def stats(self):
+        with self._cond:
+            self._evict_idle()
+            acquired = self._counters["acquired"]
+            return {
+                "name": self.name,
+                "min_size": self.min_size,
+                "max_size": self.max_size,
+                "size": self._size,
+                "in_use": self._in_use,
+                "idle": len(self._idle),
+                "waiting": self._waiting,
+                **self._counters,
+                "wait_avg_ms": round(1000 * self._wait_total / acquired, 2) if acquired else 0.0,
+                "wait_max_ms": round(1000 * self._wait_max, 2),
+            }
+
+
+def _pool_config(name):
+    config = {**DEFAULT_POOL, **CONNECTIONS[name].get("pool", {})}
+    prefix = f"DQT_POOL_{name.upper()}_"
+    for key, env in (("min_size", "MIN"), ("max_size", "MAX")):
+        if os.environ.get(prefix + env):
+            config[key] = int(os.environ[prefix + env])
+    return config
+
+
+class PoolRegistry:
+    """Пулы по имени подключения (создаются при первом обращении) и поток их обслуживания."""
+
+    def __init__(self, factory=connect, maintain_interval=MAINTAIN_INTERVAL):
+        self._factory = factory
+        self._lock = threading.Lock()
+        self._pools = {}
+        self.maintain_interval = maintain_interval
+        self._wake = threading.Event()
+        self._maintainer_pid = None
+
+    def get(self, name):
+        with self._lock:
+            pool = self._pools.get(name)
+            if pool is None:
+                if name not in CONNECTIONS:
+                    raise ValueError(f"Неизвестное подключение: {name}")
+                pool = self._pools[name] = ConnectionPool(
+                    name, lambda: self._factory(name), **_pool_config(name))
+                # Новый пул добирается до min_size в потоке обслуживания, не в запросе
+                self._wake.set()
+            self._start_maintainer()
+            return pool
+
+    def _start_maintainer(self):
+        # Поток не переживает fork: у каждого worker'а gunicorn свой
+        if self._maintainer_pid != os.getpid():
+            self._maintainer_pid = os.getpid()
+            threading.Thread(target=self._maintain_loop, name="dqt-pool-maintenance", daemon=True).start()
+
+    def _maintain_loop(self):
+        while True:
+            self._wake.wait(self.maintain_interval)
+            self._wake.clear()
+            with self._lock:
+                pools = list(self._pools.values())
+            for pool in pools:
+                pool.maintain()
+
+    def connection(self, name, timeout=None):
+        return self.get(name).connection(timeout)
+
+    def stats(self):
+        """Статистика всех подключений из CONNECTIONS (у ещё не открытых пулов -- нули)."""
+        return {name: self.get(name).stats() for name in CONNECTIONS}
+
+
+CONNECTION_POOLS = PoolRegistry()
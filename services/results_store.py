@@ -0,0 +1,334 @@
+"""
+Колоночное хранилище результатов проверок.
+
+Измерения (проверка, таблица, домен, владелец, статус...) хранятся как
+категории -- целочисленные коды плюс небольшой словарь значений, время
+запуска -- как int64 (наносекунды), метрики -- числовыми колонками.
+Фильтры по равенству сравнивают коды, а не строки.
+
+Основной API:
+    store.mask(...)                 -- булева маска по фильтрам страницы
+    store.positions(mask)           -- номера строк по маске
+    store.sort_positions(pos, ...)  -- сортировка номеров строк
+    store.take(pos)                 -- декодированный DataFrame для вывода
+    store.count_by(mask, columns)   -- количество строк по измерениям
+    store.append(df)                -- добавление новых результатов
+"""
+import hashlib
+import threading
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+# Измерения, хранимые как категории
+DIMENSIONS = [
+    "check_name", "table_name", "check_type_name",
+    "domain", "owner", "check_status_name", "error_message",
+]
+
+# Числовые колонки и их типы
+NUMERIC_COLUMNS = {
+    "result_id": np.int64,
+    "check_id": np.int32,
+    "run_ts": np.int64,
+    "execution_time_sec": np.float32,
+    "rows_checked": np.int64,
+    "rows_failed": np.int64,
+}
+
+# Порядок колонок декодированного DataFrame (как у generate_results)
+OUTPUT_COLUMNS = [
+    "result_id", "check_id", "check_name", "table_name", "check_type_name",
+    "run_date", "run_datetime", "check_status_name", "execution_time_sec",
+    "rows_checked", "rows_failed", "error_message", "owner", "domain",
+]
+
+NS_PER_DAY = 86_400 * 10**9
+
+
+def to_ns(value):
+    """Перевод datetime/date/Timestamp в int64 наносекунды (naive local time)."""
+    return int(pd.Timestamp(value).value)
+
+
+def day_number(value):
+    """Номер дня от эпохи для даты или datetime."""
+    return to_ns(pd.Timestamp(value).normalize()) // NS_PER_DAY
+
+
+class ResultsStore:
+    """Хранилище результатов с категориальными измерениями и int64-временем."""
+
+    def __init__(self, categories=None):
+        # Фиксированные словари измерений (например, статусы) задают порядок кодов
+        self._fixed = {col: list(vals) for col, vals in (categories or {}).items()}
+        self._df = self._empty_frame()
+        self._lock = threading.Lock()
+        self._listeners = []
+        self._version = 0
+        self._digest = ""
+
+    @classmethod
+    def from_frame(cls, df, categories=None):
+        """Создание хранилища из DataFrame в формате generate_results."""
+        store = cls(categories=categories)
+        store.append(df)
+        return store
+
+    # ------------------------------------------------------------
+    # Запись
+    # ------------------------------------------------------------
+    def _empty_frame(self):
+        data = {col: np.empty(0, dtype=dt) for col, dt in NUMERIC_COLUMNS.items()}
+        for col in DIMENSIONS:
+            data[col] = pd.Categorical([], categories=self._fixed.get(col, []))
+        return pd.DataFrame(data)
+
+    def _encode(self, df):
+        """Приведение входного DataFrame к колоночному формату хранилища."""
+        if "run_ts" in df.columns:
+            run_ts = df["run_ts"].to_numpy(dtype=np.int64)
+        else:
+            run_ts = pd.to_datetime(df["run_datetime"]).to_numpy(dtype="datetime64[ns]").view(np.int64)
+        data = {
+            "result_id": df["result_id"].to_numpy(dtype=np.int64),
+            "check_id": df["check_id"].to_numpy(dtype=np.int32),
+            "run_ts": run_ts,
+            "execution_time_sec": df["execution_time_sec"].to_numpy(dtype=np.float32),
+            "rows_checked": df["rows_checked"].to_numpy(dtype=np.int64),
+            "rows_failed": df["rows_failed"].to_numpy(dtype=np.int64),
+        }
+        for col in DIMENSIONS:
+            if col not in df.columns:
+                data[col] = None
+            elif isinstance(df[col].dtype, pd.CategoricalDtype):
+                # Категории пришли готовыми -- не разворачиваем их в строки
+                data[col] = df[col].array
+            else:
+                data[col] = df[col].to_numpy()
+        return data
+
+    def append(self, df):
+        """Добавление результатов. Возвращает диапазон (start, stop) новых строк."""
+        if df is None or len(df) == 0:
+            return len(self), len(self)
+        data = self._encode(df)
+        with self._lock:
+            current = self._df
+            chunk = {col: data[col] for col in NUMERIC_COLUMNS}
+            merged_dims = {}
+            for col in DIMENSIONS:
+                existing = current[col].cat.categories
+                values = data[col] if data[col] is not None else np.full(len(df), None, dtype=object)
+                incoming = pd.Categorical(values)
+                new_values = incoming.categories.difference(existing, sort=False)
+                categories = existing.append(new_values) if len(new_values) else existing
+                merged_dims[col] = current[col].cat.set_categories(categories)
+                chunk[col] = incoming.set_categories(categories)
+            chunk_df = pd.DataFrame(chunk)
+            base = current.assign(**merged_dims)
+            start = len(base)
+            self._df = pd.concat([base, chunk_df], ignore_index=True) if start else chunk_df
+            self._version += 1
+            self._digest = self._chain_digest(self._digest, chunk)
+            stop = len(self._df)
+        for listener in list(self._listeners):
+            listener(self, start, stop)
+        return start, stop
+
+    def subscribe(self, listener):
+        """Подписка на добавление строк: listener(store, start, stop)."""
+        self._listeners.append(listener)
+
+    @staticmethod
+    def _chain_digest(digest, chunk):
+        h = hashlib.blake2b(digest.encode("ascii"), digest_size=16)
+        for col in NUMERIC_COLUMNS:
+            h.update(np.ascontiguousarray(chunk[col], dtype=NUMERIC_COLUMNS[col]).tobytes())
+        return h.hexdigest()
+
+    @property
+    def version(self):
+        """Версия данных -- увеличивается при каждом добавлении (счётчик своего процесса)."""
+        return self._version
+
+    @property
+    def content_version(self):
+        """Версия содержимого: хэш всех добавленных пачек по цепочке.
+
+        В отличие от version одинакова в процессах с одинаковыми данными и различается
+        при разных -- для ключей кэша, общего для worker'ов.
+        """
+        return self._digest
+
+    def __len__(self):
+        return len(self._df)
+
+    # ------------------------------------------------------------
+    # Чтение колонок и словарей
+    # ------------------------------------------------------------
+    def column(self, name):
+        """Колонка как numpy-массив (для измерений -- массив кодов)."""
+        if name in DIMENSIONS:
+            return self._df[name].cat.codes.to_numpy()
+        if name == "run_day":
+            return (self._df["run_ts"].to_numpy() // NS_PER_DAY).astype(np.int32)
+        return self._df[name].to_numpy()
+
+    def categories(self, name):
+        """Словарь значений измерения (индекс = код)."""
+        return self._df[name].cat.categories
+
+    def code_of(self, name, value):
+        """Код значения измерения или -1, если значения нет в словаре."""
+        cats = self.categories(name)
+        return int(cats.get_loc(value)) if value in cats else -1
+
+    def categories_mask(self, name, predicate, n=None):
+        """Маска строк, у которых значение измерения удовлетворяет predicate.
+
+        predicate получает pd.Index значений словаря и возвращает булев массив,
+        поэтому строковые операции выполняются только над словарём.
+        n -- длина маски (по умолчанию текущее число строк).
+        """
+        codes = self.column(name)[:n]
+        cats = self.categories(name)
+        if len(cats) == 0:
+            return np.zeros(len(codes), dtype=bool)
+        matched = np.flatnonzero(np.asarray(predicate(cats), dtype=bool))
+        return np.isin(codes, matched)
+
+    def _equals_mask(self, name, value, n=None):
+        codes = self.column(name)[:n]
+        if isinstance(value, (list, tuple, set)):
+            wanted = [self.code_of(name, v) for v in value]
+            return np.isin(codes, [c for c in wanted if c >= 0])
+        return codes == self.code_of(name, value)
+
+    # ------------------------------------------------------------
+    # Запросы
+    # ------------------------------------------------------------
+    def mask(self, period_days=None, status=None, domain=None, schema=None, table=None,
+             search=None, check_id=None, table_name=None):
+        """Булева маска по фильтрам.
+
+        period_days -- результаты с даты (сегодня - N дней) включительно;
+        status      -- статус или список статусов;
+        domain      -- домен;
+        schema/table -- схема и (опционально) таблица без схемы;
+        table_name  -- полное имя таблицы;
+        search      -- подстрока в названии проверки или таблицы (без учёта регистра);
+        check_id    -- ID проверки или список ID.
+        """
+        # Хранилище только дополняется, поэтому все колонки режем по длине
+        # на момент начала запроса -- параллельный append не сломает маску
+        n = len(self)
+        mask = np.ones(n, dtype=bool)
+        if period_days is not None:
+            cutoff = day_number((datetime.now() - timedelta(days=int(period_days))).date())
+            mask &= self.column("run_ts")[:n] >= cutoff * NS_PER_DAY
+        if status:
+            mask &= self._equals_mask("check_status_name", status, n)
+        if domain:
+            mask &= self._equals_mask("domain", domain, n)
+        if schema and table:
+            mask &= self._equals_mask("table_name", f"{schema}.{table}", n)
+        elif schema:
+            mask &= self.categories_mask("table_name", lambda c: c.str.startswith(f"{schema}."), n)
+        if table_name:
+            mask &= self._equals_mask("table_name", table_name, n)
+        if check_id is not None:
+            ids = check_id if isinstance(check_id, (list, tuple, set, np.ndarray)) else [check_id]
+            mask &= np.isin(self.column("check_id")[:n], np.asarray(list(ids), dtype=np.int64))
+        if search:
+            search = search.lower()
+            contains = lambda c: c.str.lower().str.contains(search, regex=False)
+            mask &= (
+                self.categories_mask("check_name", contains, n) |
+                self.categories_mask("table_name", contains, n)
+            )
+        return mask
+
+    @staticmethod
+    def positions(mask):
+        """Номера строк по маске."""
+        return np.flatnonzero(mask)
+
+    def sort_positions(self, positions, by="run_ts", ascending=False):
+        """Сортировка номеров строк по одной или нескольким колонкам.
+
+        Измерения сортируются по значению (алфавитно), а не по коду.
+        """
+        by = [by] if isinstance(by, str) else list(by)
+        ascending = [ascending] * len(by) if isinstance(ascending, bool) else list(ascending)
+        keys = []
+        for col, asc in zip(by, ascending):
+            if col == "run_datetime" or col == "run_date":
+                col = "run_ts"
+            if col in DIMENSIONS:
+                cats = self.categories(col)
+                rank = np.empty(len(cats) + 1, dtype=np.int64)
+                rank[:-1] = np.argsort(np.argsort(np.asarray(cats, dtype=str), kind="stable"))
+                rank[-1] = -1  # NULL (код -1) -- в начало
+                values = rank[self.column(col)[positions]]
+            else:
+                values = self.column(col)[positions]
+            keys.append(values if asc else -values)
+        # np.lexsort сортирует по последнему ключу в первую очередь
+        order = np.lexsort(keys[::-1]) if keys else np.arange(len(positions))
+        return positions[order]
+
+    def latest_positions(self, key="check_id", mask=None):
+        """Номера строк с последним запуском для каждого значения key."""
+        n = len(self) if mask is None else len(mask)
+        positions = np.arange(n) if mask is None else np.flatnonzero(mask)
+        run_ts = self.column("run_ts")[positions]
+        keys = self.column(key)[positions]
+        order = np.lexsort((run_ts, keys))
+        sorted_keys = keys[order]
+        is_last = np.r_[sorted_keys[1:] != sorted_keys[:-1], True] if len(order) else np.zeros(0, dtype=bool)
+        return positions[order[is_last]]
+
+    def newest_positions(self, limit=10, mask=None):
+        """Номера limit самых свежих строк (по убыванию времени запуска)."""
+        n = len(self) if mask is None else len(mask)
+        positions = np.arange(n) if mask is None else np.flatnonzero(mask)
+        run_ts = self.column("run_ts")[positions]
+        if len(positions) > limit:
+            top = np.argpartition(run_ts, len(run_ts) - limit)[-limit:]
+            positions, run_ts = positions[top], run_ts[top]
+        return positions[np.argsort(-run_ts, kind="stable")]
+
+    def take(self, positions=None, columns=None):
+        """Декодированный DataFrame для вывода (run_date, run_datetime -- datetime64)."""
+        df = self._df if positions is None else self._df.iloc[positions]
+        run_ts = df["run_ts"].to_numpy()
+        out = df.drop(columns="run_ts").assign(
+            run_datetime=run_ts.view("datetime64[ns]"),
+            run_date=(run_ts // NS_PER_DAY).astype("datetime64[D]").astype("datetime64[ns]"),
+            # float32 -> float64 с округлением, чтобы в JSON не попадали хвосты вида 21.700000762939453
+            execution_time_sec=df["execution_time_sec"].to_numpy(dtype=np.float64).round(2),
+        )
+        out = out[OUTPUT_COLUMNS].reset_index(drop=True)
+        return out[columns] if columns else out
+
+    def count_by(self, mask=None, columns=("check_status_name",)):
+        """Количество строк по сочетаниям измерений (и/или run_date)."""
+        columns = list(columns)
+        data = {}
+        for col in columns:
+            source = "run_day" if col == "run_date" else col
+            values = self.column(source)
+            data[col] = values if mask is None else values[:len(mask)][mask]
+        counts = pd.DataFrame(data).value_counts(sort=False).reset_index(name="count")
+        for col in columns:
+            if col == "run_date":
+                counts[col] = counts[col].to_numpy().astype("datetime64[D]").astype("datetime64[ns]")
+            elif col in DIMENSIONS:
+                counts[col] = pd.Categorical.from_codes(counts[col].to_numpy(), self.categories(col))
+        return counts.sort_values(columns).reset_index(drop=True)
+
+    def memory_usage(self):
+        """Объём памяти хранилища в байтах."""
+        return int(self._df.memory_usage(deep=True).sum())
@@ -0,0 +1,143 @@
+"""
+Правила оповещений, скомпилированные в словарь по области и статусу.
+
+Правило (диалог «Создать правило» страницы алертов) задаёт условие
+(FAIL / ERROR / FAIL_OR_ERROR / THRESHOLD) и область: все проверки,
+домен, группу проверок (check_type_name) или одну проверку. При
+компиляции правило раскладывается по ключам (область, значение, статус)
+-- по одному на каждый статус условия. Подбор правил для результата --
+четыре обращения к словарю (all, домен, группа, проверка), то есть
+O(подходящих правил), а не O(всех правил).
+
+При компиляции правила разбираются и его шаблоны темы и текста
+(services.templates) -- ошибка в шаблоне не даёт сохранить правило.
+
+Изменение правил (add / update / remove / replace) пересобирает словарь
+целиком и подменяет его одним присваиванием: подбор идёт без блокировок
+и всегда видит согласованный набор правил, перезапуск не нужен.
+"""
+import itertools
+import threading
+
+from services.templates import compile_template
+
+# Условие правила -> статусы результата, на которые оно срабатывает.
+# THRESHOLD -- превышение порога, результат такой проверки -- FAIL
+CONDITION_STATUSES = {
+    "FAIL": ("FAIL",),
+    "ERROR": ("ERROR",),
+    "FAIL_OR_ERROR": ("FAIL", "ERROR"),
+    "THRESHOLD": ("FAIL",),
+}
+DEFAULT_CONDITION = "FAIL_OR_ERROR"
+
+SCOPES = ("all", "domain", "check_type", "check")
+
+
+def _scope_key(scope, target):
+    if scope == "all":
+        return "all", None
+    if scope == "check":
+        return "check", int(target)
+    return scope, str(target)
+
+
+class RuleSet:
+    """Набор правил оповещений с подбором по (область, статус)."""
+
+    def __init__(self, rules=()):
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        # rule_id -> правило
+        self._rules = {}
+        # (область, значение, статус) -> кортеж правил
+        self._index = {}
+        # Растёт при каждой пересборке
+        self.version = 0
+        if rules:
+            self.replace(rules)
+
+    # ------------------------------------------------------------
+    # Изменение правил
+    # ------------------------------------------------------------
+    def add(self, rule):
+        """Добавление правила. Возвращает его rule_id."""
+        with self._lock:
+            rule = self._compile(next(self._ids), rule)
+            self._rules[rule["rule_id"]] = rule
+            self._rebuild()
+            return rule["rule_id"]
+
+    def update(self, rule_id, rule):
+        with self._lock:
+            if rule_id not in self._rules:
+                raise KeyError(rule_id)
+            self._rules[rule_id] = self._compile(rule_id, rule)
+            self._rebuild()
+
+    def remove(self, rule_id):
+        with self._lock:
+            if self._rules.pop(rule_id, None) is not None:
+                self._rebuild()
+
+    def replace(self, rules):
+        """Замена всего набора (перезагрузка правил из хранилища)."""
+        with self._lock:
+            compiled = {}
+            for rule in rules:
+                rule = self._compile(rule.get("rule_id") or next(self._ids), rule)
+                compiled[rule["rule_id"]] = rule
+            # Ошибка в любом правиле оставляет прежний набор
+            self._rules = compiled
+            self._ids = itertools.count(max(compiled, default=0) + 1)
+            self._rebuild()
+
+    @staticmethod
+    def _compile(rule_id, rule):
+        condition = rule.get("condition") or DEFAULT_CONDITION
+        scope = rule.get("scope") or "all"
+        if condition not in CONDITION_STATUSES:
+            raise ValueError(f"Неизвестное условие правила: {condition}")
+        if scope not in SCOPES:
+            raise ValueError(f"Неизвестная область правила: {scope}")
+        if scope != "all" and rule.get("target") in (None, ""):
+            raise ValueError(f"Не задан объект области {scope}")
+        return {
+            **rule, "rule_id": rule_id, "condition": condition, "scope": scope,
+            "subject_template": compile_template(rule.get("subject")),
+            "body_template": compile_template(rule.get("body")),
+        }
+
+    def _rebuild(self):
+        index = {}
+        for rule in self._rules.values():
+            scope, value = _scope_key(rule["scope"], rule.get("target"))
+            for status in CONDITION_STATUSES[rule["condition"]]:
+                index.setdefault((scope, value, status), []).append(rule)
+        self._index = {key: tuple(rules) for key, rules in index.items()}
+        self.version += 1
+
+    # ------------------------------------------------------------
+    # Подбор
+    # ------------------------------------------------------------
+    def match(self, status, domain=None, check_type=None, check_id=None):
+        """Правила, срабатывающие на результат со статусом status."""
+        index = self._index
+        matched = index.get(("all", None, status), ())
+        if domain is not None:
+            matched += index.get(("domain", domain, status), ())
+        if check_type is not None:
+            matched += index.get(("check_type", check_type, status), ())
+        if check_id is not None:
+            matched += index.get(("check", check_id, status), ())
+        return matched
+
+    def match_incident(self, incident):
+        return self.match(incident["check_status"], incident["domain"], incident["check_type_name"],
+                          int(incident["check_id"]))
+
+    def __len__(self):
+        return len(self._rules)
+
+    def __iter__(self):
+        return iter(list(self._rules.values()))
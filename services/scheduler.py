@@ -0,0 +1,273 @@
+"""
+Планировщик проверок по расписанию (schedule_main_value).
+
+Время следующего запуска каждой проверки лежит в куче (heapq): постановка
+и выбор ближайшего запуска -- O(log n) на проверку. Запуски внутри
+периода расписания сдвинуты на детерминированный jitter по check_id
+(не больше JITTER_WINDOWS), поэтому ежедневные проверки не стартуют все
+разом в полночь, а время запуска проверки не меняется между рестартами.
+
+Наступившие запуски переходят во вторую кучу -- очередь готовых,
+упорядоченную по priority (HIGH раньше LOW), затем по времени. Из неё
+в исполнитель уходит не больше свободных мест: max_in_flight минус
+проверки, уже стоящие в очереди исполнителя. Остальные ждут следующего
+тика (backpressure), новые запуски за них не создаются.
+
+Активность проверки на дату запуска: последнее окно «включить/выключить
+на период», в которое попадает дата, иначе is_active. Изменения
+каталога подхватываются по ревизиям KeyRevisions на каждом тике.
+
+Фоновый поток запускается только при DQT_SCHEDULER=1 и только в одном
+процессе: start_as_leader захватывает файловую блокировку (flock,
+DQT_SCHEDULER_LOCK), остальные процессы планировщик не запускают. Потоки
+не переживают fork, поэтому под gunicorn --preload поток запускается не
+при импорте в master-процессе, а в worker'е -- из хука post_fork
+(gunicorn.conf.py). Если worker с планировщиком завершится, блокировку
+захватит worker, запущенный ему на замену.
+"""
+import heapq
+import itertools
+import os
+import tempfile
+import threading
+import traceback
+import zlib
+from datetime import date, datetime, timedelta
+
+try:
+    import fcntl
+except ImportError:  # Windows -- без межпроцессной блокировки (один процесс)
+    fcntl = None
+
+SCHEDULE_PERIODS = {
+    "hourly": timedelta(hours=1),
+    "daily": timedelta(days=1),
+    "weekly": timedelta(weeks=1),
+}
+
+# Окно jitter от начала периода, сек
+JITTER_WINDOWS = {
+    "hourly": 15 * 60,
+    "daily": 4 * 3600,
+    "weekly": 6 * 3600,
+    "monthly": 6 * 3600,
+}
+
+PRIORITY_RANKS = {"HIGH": 0, "MEDIUM": 1, "LOW": 2}
+
+# Интервал тика фонового потока, сек
+POLL_INTERVAL = 1.0
+
+# Блокировка процесса, в котором работает фоновый поток планировщика
+LEADER_LOCK = os.environ.get("DQT_SCHEDULER_LOCK", os.path.join(tempfile.gettempdir(), "dqt-scheduler.lock"))
+
+
+def _period_start(schedule, moment):
+    """Начало периода расписания, в который попадает moment."""
+    if schedule == "hourly":
+        return moment.replace(minute=0, second=0, microsecond=0)
+    day = datetime(moment.year, moment.month, moment.day)
+    if schedule == "weekly":
+        return day - timedelta(days=day.weekday())
+    if schedule == "monthly":
+        return day.replace(day=1)
+    return day
+
+
+def _next_period(schedule, start):
+    if schedule == "monthly":
+        return start.replace(year=start.year + start.month // 12, month=start.month % 12 + 1)
+    return start + SCHEDULE_PERIODS.get(schedule, SCHEDULE_PERIODS["daily"])
+
+
+def _jitter(check_id, schedule):
+    """Сдвиг запуска от начала периода: детерминированный по check_id."""
+    window = JITTER_WINDOWS.get(schedule, JITTER_WINDOWS["daily"])
+    return timedelta(seconds=window * zlib.crc32(str(check_id).encode()) / 2 ** 32)
+
+
+def next_run(check_id, schedule, after):
+    """Ближайший запуск проверки строго позже after."""
+    start = _period_start(schedule, after)
+    offset = _jitter(check_id, schedule)
+    while start + offset <= after:
+        start = _next_period(schedule, start)
+    return start + offset
+
+
+class CheckScheduler:
+    """Запуск проверок по расписанию через CheckExecutor."""
+
+    def __init__(self, executor, lookup, revisions=None, max_in_flight=None, clock=datetime.now,
+                 poll_interval=POLL_INTERVAL):
+        self._executor = executor
+        # lookup(check_id) -> строка каталога (словарь) или None, если проверки нет
+        self._lookup = lookup
+        self._revisions = revisions
+        self._revision = revisions.revision if revisions is not None else 0
+        self.max_in_flight = max_in_flight or 2 * executor.max_workers
+        self._clock = clock
+        self._poll_interval = poll_interval
+        self._lock = threading.Lock()
+        self._seq = itertools.count()
+        # (время запуска, seq, check_id)
+        self._heap = []
+        # (ранг priority, время запуска, seq, check_id) -- наступившие запуски
+        self._ready = []
+        # check_id -> (seq актуальной записи, schedule, ранг priority); записи куч
+        # с другим seq устарели и пропускаются при извлечении
+        self._scheduled = {}
+        # check_id -> [(начало, конец, активна)] окна «на период»
+        self._windows = {}
+        self._counters = dict.fromkeys(("dispatched", "skipped", "deferred"), 0)
+        self._stop = threading.Event()
+        self._thread = None
+        # Открытый файл блокировки ведущего процесса (держится до выхода процесса)
+        self._leader = None
+
+    # ------------------------------------------------------------
+    # Очередь
+    # ------------------------------------------------------------
+    def load(self, checks):
+        """Постановка всех проверок каталога (DataFrame)."""
+        now = self._clock()
+        with self._lock:
+            for check_id, schedule, priority in zip(
+                checks["check_id"].tolist(), checks["schedule_main_value"].tolist(), checks["priority"].tolist()
+            ):
+                self._schedule(check_id, schedule, priority, now)
+
+    def _schedule(self, check_id, schedule, priority, after):
+        seq = next(self._seq)
+        self._scheduled[check_id] = (seq, schedule, PRIORITY_RANKS.get(priority, len(PRIORITY_RANKS)))
+        heapq.heappush(self._heap, (next_run(check_id, schedule, after).timestamp(), seq, check_id))
+
+    def _valid(self, check_id, seq):
+        entry = self._scheduled.get(check_id)
+        return entry is not None and entry[0] == seq
+
+    def _sync_catalog(self, now):
+        """Перепостановка проверок, у которых изменилось расписание или priority."""
+        if self._revisions is None or self._revisions.revision == self._revision:
+            return
+        revision = self._revisions.revision
+        for check_id in self._revisions.changed_since(self._revision):
+            check = self._lookup(check_id)
+            if check is None:
+                self._scheduled.pop(check_id, None)
+                continue
+            entry = self._scheduled.get(check_id)
+            rank = PRIORITY_RANKS.get(check["priority"], len(PRIORITY_RANKS))
+            if entry is None or entry[1:] != (check["schedule_main_value"], rank):
+                self._schedule(check_id, check["schedule_main_value"], check["priority"], now)
+        self._revision = revision
+
+    # ------------------------------------------------------------
+    # Окна «включить/выключить на период»
+    # ------------------------------------------------------------
+    def set_window(self, check_ids, start, end, active):
+        """Проверки активны (active=True) или выключены с start по end включительно."""
+        today = date.today()
+        with self._lock:
+            for check_id in check_ids:
+                windows = [w for w in self._windows.get(check_id, []) if w[1] >= today]
+                windows.append((start, end, active))
+                self._windows[check_id] = windows
+
+    def is_active(self, check, day):
+        """Активность проверки на дату: по последнему окну, в которое попадает day, иначе is_active."""
+        for start, end, active in reversed(self._windows.get(check["check_id"], ())):
+            if start <= day <= end:
+                return active
+        return bool(check["is_active"])
+
+    # ------------------------------------------------------------
+    # Тик
+    # ------------------------------------------------------------
+    def tick(self):
+        """Перенос наступивших запусков в очередь готовых и отправка в исполнитель.
+
+        Возвращает число отправленных проверок.
+        """
+        now = self._clock()
+        batch = []
+        with self._lock:
+            self._sync_catalog(now)
+            now_ts = now.timestamp()
+            # seq запусков, ставших готовыми на этом тике: отложенным запуск считается
+            # один раз -- на тике, где он стал готовым и не поместился
+            fresh = set()
+            while self._heap and self._heap[0][0] <= now_ts:
+                run_at, seq, check_id = heapq.heappop(self._heap)
+                if self._valid(check_id, seq):
+                    heapq.heappush(self._ready, (self._scheduled[check_id][2], run_at, seq, check_id))
+                    fresh.add(seq)
+
+            capacity = self.max_in_flight - self._executor.in_flight
+            while self._ready and len(batch) < capacity:
+                _, _, seq, check_id = heapq.heappop(self._ready)
+                fresh.discard(seq)
+                if not self._valid(check_id, seq):
+                    continue
+                check = self._lookup(check_id)
+                if check is None:
+                    del self._scheduled[check_id]
+                    continue
+                self._schedule(check_id, check["schedule_main_value"], check["priority"], now)
+                if self.is_active(check, now.date()):
+                    batch.append(check)
+                else:
+                    self._counters["skipped"] += 1
+            self._counters["deferred"] += len(fresh)
+            self._counters["dispatched"] += len(batch)
+        if batch:
+            self._executor.submit(batch)
+        return len(batch)
+
+    def stats(self):
+        with self._lock:
+            upcoming = [entry for entry in self._heap if self._valid(entry[2], entry[1])]
+            return {
+                "scheduled": len(self._scheduled),
+                "ready": len(self._ready),
+                "next_run": datetime.fromtimestamp(min(upcoming)[0]) if upcoming else None,
+                **self._counters,
+            }
+
+    # ------------------------------------------------------------
+    # Фоновый поток
+    # ------------------------------------------------------------
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="dqt-scheduler", daemon=True)
+        self._thread.start()
+
+    def start_as_leader(self, lock_path=LEADER_LOCK):
+        """Запуск фонового потока, если этот процесс захватил блокировку lock_path.
+
+        Вызывать после fork (в worker'е). Возвращает True, если поток запущен.
+        """
+        if self._leader is None:
+            lock_file = open(lock_path, "a")
+            if fcntl is not None:
+                try:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except OSError:
+                    lock_file.close()
+                    return False
+            self._leader = lock_file
+        self.start()
+        return True
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(self._poll_interval):
+            try:
+                self.tick()
+            except Exception:
+                # Ошибка одного тика не должна останавливать планировщик
+                traceback.print_exc()
@@ -0,0 +1,90 @@
+"""
+Триграммный индекс для поиска подстрок без учёта регистра.
+
+Каждый документ (проверка, алерт) -- id и несколько текстовых полей.
+Индекс хранит для каждой триграммы множество id документов, где она
+встречается. Поиск пересекает множества триграмм запроса (начиная с
+самого короткого) и проверяет кандидатов точным вхождением подстроки,
+поэтому результат совпадает с str.contains, но без полного прохода.
+Запросы короче трёх символов проверяются по словарю текстов документов.
+"""
+import threading
+from collections import defaultdict
+
+import numpy as np
+
+GRAM_SIZE = 3
+
+
+def _grams(text):
+    return {text[i:i + GRAM_SIZE] for i in range(len(text) - GRAM_SIZE + 1)}
+
+
+class TrigramIndex:
+    """Инкрементальный триграммный индекс: id документа -> тексты полей."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._texts = {}
+        self._postings = defaultdict(set)
+
+    @classmethod
+    def from_frame(cls, df, id_column, text_columns):
+        """Индекс по колонкам text_columns DataFrame с ключом id_column."""
+        index = cls()
+        index.update_frame(df, id_column, text_columns)
+        return index
+
+    def update_frame(self, df, id_column, text_columns):
+        """Добавление/обновление документов из строк DataFrame."""
+        columns = [df[col].astype(object).where(df[col].notna(), "").astype(str) for col in text_columns]
+        for doc_id, *texts in zip(df[id_column].tolist(), *(col.tolist() for col in columns)):
+            self.add(doc_id, *texts)
+
+    def add(self, doc_id, *texts):
+        """Добавление документа (существующий документ с тем же id заменяется)."""
+        lowered = tuple(str(t).lower() for t in texts if t)
+        with self._lock:
+            self._remove(doc_id)
+            self._texts[doc_id] = lowered
+            for gram in set().union(*map(_grams, lowered)):
+                self._postings[gram].add(doc_id)
+
+    def remove(self, doc_id):
+        with self._lock:
+            self._remove(doc_id)
+
+    def _remove(self, doc_id):
+        texts = self._texts.pop(doc_id, None)
+        if texts is None:
+            return
+        for gram in set().union(*map(_grams, texts)):
+            posting = self._postings.get(gram)
+            if posting is not None:
+                posting.discard(doc_id)
+                if not posting:
+                    del self._postings[gram]
+
+    def search(self, query):
+        """Отсортированный массив id документов, содержащих подстроку query."""
+        query = query.lower()
+        with self._lock:
+            if len(query) < GRAM_SIZE:
+                candidates = self._texts.keys()
+            else:
+                postings = []
+                for gram in _grams(query):
+                    posting = self._postings.get(gram)
+                    if not posting:
+                        return np.empty(0, dtype=np.int64)
+                    postings.append(posting)
+                if len(query) == GRAM_SIZE:
+                    # Запрос из одной триграммы -- список документов уже точный
+                    return np.sort(np.fromiter(postings[0], dtype=np.int64, count=len(postings[0])))
+                postings.sort(key=len)
+                candidates = postings[0].intersection(*postings[1:])
+            ids = [doc_id for doc_id in candidates if any(query in text for text in self._texts[doc_id])]
+        return np.sort(np.asarray(ids, dtype=np.int64))
+
+    def __len__(self):
+        return len(self._texts)
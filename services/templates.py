@@ -0,0 +1,74 @@
+"""
+Шаблоны сообщений оповещений: разбор один раз, подстановка без разбора.
+
+Шаблон темы/текста правила ({check_name}, {status}, ...) разбирается при
+сохранении правила: неизвестные переменные -- ошибка TemplateError, а
+сам шаблон превращается в строку формата str.format (литеральные скобки
+экранированы), которая подставляется через format_map без повторного
+разбора. Скомпилированные шаблоны кэшируются по тексту, так что правила
+с одинаковыми шаблонами делят один объект; правило хранит свои шаблоны
+при себе. Предпросмотр диалога правила и отправка используют один и тот
+же CompiledTemplate, поэтому результат у них не расходится.
+"""
+import re
+from functools import lru_cache
+
+# Переменные шаблона (значки «Доступные переменные» диалога правила)
+TEMPLATE_VARIABLES = (
+    "check_name", "table_name", "status", "run_time", "rows_checked", "rows_failed",
+    "domain", "owner", "error_message", "threshold",
+)
+
+_PLACEHOLDER = re.compile(r"\{(\w+)\}")
+
+
+class TemplateError(ValueError):
+    """Шаблон ссылается на неизвестные переменные."""
+
+
+class _Values(dict):
+    # Отсутствующая переменная подставляется пустой строкой
+    def __missing__(self, key):
+        return ""
+
+
+class CompiledTemplate:
+    __slots__ = ("source", "variables", "_format")
+
+    def __init__(self, source):
+        self.source = source
+        names = _PLACEHOLDER.findall(source)
+        unknown = sorted(set(names) - set(TEMPLATE_VARIABLES))
+        if unknown:
+            raise TemplateError("Неизвестные переменные шаблона: " + ", ".join("{" + n + "}" for n in unknown))
+        self.variables = tuple(dict.fromkeys(names))
+        parts = _PLACEHOLDER.split(source)
+        # Чётные части -- текст, нечётные -- имена переменных
+        self._format = "".join(
+            part.replace("{", "{{").replace("}", "}}") if i % 2 == 0 else "{" + part + "}"
+            for i, part in enumerate(parts)
+        )
+
+    def render(self, values):
+        """Текст для словаря значений (строк); отсутствующие переменные -- пустые."""
+        try:
+            return self._format.format_map(values)
+        except KeyError:
+            return self._format.format_map(_Values(values))
+
+    def render_many(self, values_list):
+        """Тексты для пачки алертов (дайджест) за один вызов."""
+        render = self._format.format_map
+        try:
+            return [render(values) for values in values_list]
+        except KeyError:
+            return [render(_Values(values)) for values in values_list]
+
+    def __repr__(self):
+        return f"CompiledTemplate({self.source!r})"
+
+
+@lru_cache(maxsize=1024)
+def compile_template(source):
+    """Скомпилированный шаблон (из кэша по тексту). TemplateError -- неизвестные переменные."""
+    return CompiledTemplate(source or "")
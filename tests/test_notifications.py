@@ -0,0 +1,166 @@
+"""
+Диспетчер оповещений против локальных заглушек Telegram Bot API (HTTP) и SMTP.
+
+    python -m pytest tests
+"""
+import json
+import os
+import socketserver
+import sys
+import threading
+from email import message_from_bytes
+from email import policy
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.notifications import (  # noqa: E402
+    TELEGRAM_MAX_TEXT, EmailSender, NotificationDispatcher, TelegramSender,
+)
+
+# Без ожидания лимитов: проверяется группировка, а не темп отправки
+FAST_LIMITS = {
+    "telegram": {"rate": 1000.0, "burst": 1000, "max_batch": 50, "max_text": TELEGRAM_MAX_TEXT},
+    "email": {"rate": 1000.0, "burst": 1000, "max_batch": 200},
+}
+
+
+# ============================================================
+# Заглушки
+# ============================================================
+class _BotHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        payload = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        with self.server.lock:
+            self.server.requests.append((self.path, payload))
+            throttle = self.server.throttle > 0
+            self.server.throttle -= throttle
+        if throttle:
+            body, code = {"ok": False, "parameters": {"retry_after": 0.1}}, 429
+        else:
+            body, code = {"ok": True}, 200
+        data = json.dumps(body).encode()
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+class _SMTPHandler(socketserver.StreamRequestHandler):
+    """Минимальный SMTP: принимает любые команды, письма копит в server.messages."""
+
+    def handle(self):
+        self.wfile.write(b"220 dqt-standin\r\n")
+        data = None
+        for line in self.rfile:
+            if data is not None:
+                if line == b".\r\n":
+                    self.server.messages.append(message_from_bytes(b"".join(data), policy=policy.default))
+                    data = None
+                    self.wfile.write(b"250 OK\r\n")
+                else:
+                    data.append(line[1:] if line.startswith(b"..") else line)
+                continue
+            command = line[:4].upper()
+            if command == b"DATA":
+                data = []
+                self.wfile.write(b"354 End data with <CR><LF>.<CR><LF>\r\n")
+            elif command == b"QUIT":
+                self.wfile.write(b"221 Bye\r\n")
+                return
+            else:
+                self.wfile.write(b"250 OK\r\n")
+
+
+class _SMTPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+def _serve(server):
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+@pytest.fixture
+def bot_api():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _BotHandler)
+    server.requests, server.lock, server.throttle = [], threading.Lock(), 0
+    yield _serve(server)
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def smtp_server():
+    server = _SMTPServer(("127.0.0.1", 0), _SMTPHandler)
+    server.messages = []
+    yield _serve(server)
+    server.shutdown()
+    server.server_close()
+
+
+def _telegram(server):
+    return TelegramSender("TOKEN", f"http://127.0.0.1:{server.server_address[1]}")
+
+
+# ============================================================
+# Тесты
+# ============================================================
+def test_mass_failure_goes_out_as_digests(bot_api):
+    dispatcher = NotificationDispatcher([_telegram(bot_api)], limits=FAST_LIMITS, batch_window=0.5)
+    for i in range(500):
+        dispatcher.enqueue("telegram", "@dq_team", f"[DQT] FAIL: check_{i}",
+                           f"Проверка check_{i} (dwh.orders) завершилась со статусом FAIL.")
+    assert dispatcher.wait_idle(timeout=30)
+
+    assert len(bot_api.requests) == 10
+    stats = dispatcher.stats()["telegram"]
+    assert (stats["sent"], stats["messages"], stats["digests"], stats["failed"]) == (500, 10, 10, 0)
+    texts = [payload["text"] for _, payload in bot_api.requests]
+    assert all(path == "/botTOKEN/sendMessage" for path, _ in bot_api.requests)
+    assert all(len(text) <= TELEGRAM_MAX_TEXT for text in texts)
+    # В дайджесте есть и тема, и текст каждого алерта
+    joined = "\n".join(texts)
+    for i in range(500):
+        assert f"• [DQT] FAIL: check_{i}\nПроверка check_{i} " in joined
+
+
+def test_single_message_is_sent_as_is(bot_api):
+    dispatcher = NotificationDispatcher([_telegram(bot_api)], limits=FAST_LIMITS, batch_window=0.1)
+    dispatcher.enqueue("telegram", "-100200", "[DQT] ERROR: check_1", "Ошибка выполнения")
+    assert dispatcher.wait_idle(timeout=10)
+    assert [payload for _, payload in bot_api.requests] == [
+        {"chat_id": "-100200", "text": "[DQT] ERROR: check_1\n\nОшибка выполнения"}]
+
+
+def test_telegram_429_is_retried_after_retry_after(bot_api):
+    bot_api.throttle = 1
+    dispatcher = NotificationDispatcher([_telegram(bot_api)], limits=FAST_LIMITS, batch_window=0.1)
+    dispatcher.enqueue("telegram", "@dq_team", "[DQT] FAIL: check_1", "текст")
+    assert dispatcher.wait_idle(timeout=10)
+    stats = dispatcher.stats()["telegram"]
+    assert (len(bot_api.requests), stats["retries"], stats["sent"]) == (2, 1, 1)
+
+
+def test_email_digest_per_recipient(smtp_server):
+    sender = EmailSender("127.0.0.1", smtp_server.server_address[1])
+    dispatcher = NotificationDispatcher([sender], limits=FAST_LIMITS, batch_window=0.5)
+    for i in range(3):
+        dispatcher.enqueue("email", "dq@company.com", f"[DQT] FAIL: check_{i}", f"Текст алерта {i}")
+    dispatcher.enqueue("email", "owner@company.com", "[DQT] FAIL: check_9", "Текст алерта 9")
+    assert dispatcher.wait_idle(timeout=10)
+
+    by_recipient = {message["To"]: message for message in smtp_server.messages}
+    assert len(smtp_server.messages) == 2
+    digest = by_recipient["dq@company.com"]
+    assert digest["Subject"] == "[DQT] Алертов: 3"
+    body = digest.get_content().replace("\r\n", "\n")
+    assert all(f"[DQT] FAIL: check_{i}\nТекст алерта {i}" in body for i in range(3))
+    assert by_recipient["owner@company.com"]["Subject"] == "[DQT] FAIL: check_9"